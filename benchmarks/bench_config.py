@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the time it takes to load config files with many groups using the
+pure python YAML loader and the libyaml based one.
+
+Usage: python benchmarks/bench_config.py [groups ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unameit import configuration
+
+GROUP = '''
+"show {0}":
+    input: "/media/incoming/show{0}/"
+    output: "/media/library/Show {0}/"
+    format: "{{show}} - S{{season:02}}E{{episode:02}}{{ext}}"
+    use_defaults: true
+    include: ["avi", "mkv", "mp4"]
+    regexp:
+        - |
+          ^(?P<show>show{0})[._ ]   # The show name
+          s(?P<season>\\d+)         # The season
+          e(?P<episode>\\d+)        # The episode
+'''
+
+
+def make_config(groups):
+    """Writes a config file with *groups* groups, returning its path"""
+    handle, path = tempfile.mkstemp(suffix=".cfg")
+    with os.fdopen(handle, "w") as config:
+        config.write('"default":\n    language: "en"\n')
+        for number in range(groups):
+            config.write(GROUP.format(number))
+    return path
+
+
+def measure(path, loader, repeat=5):
+    """Returns the best time of loading *path* using *loader*"""
+    original = configuration._Loader
+    configuration._Loader = loader
+    try:
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            configuration._read_file(path)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    finally:
+        configuration._Loader = original
+
+
+def main(sizes=(100, 500, 1000)):
+    """Runs the benchmark"""
+    loaders = [("SafeLoader", yaml.SafeLoader)]
+    if hasattr(yaml, "CSafeLoader"):
+        loaders.append(("CSafeLoader", yaml.CSafeLoader))
+    else:
+        print("libyaml is not available, only the pure loader is measured")
+
+    for size in sizes:
+        path = make_config(size)
+        try:
+            for name, loader in loaders:
+                print("{0:>5} groups {1:<12} {2:>8.3f} s".format(
+                    size, name, measure(path, loader)))
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or (100, 500, 1000))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares looking up episode titles one at a time with looking them up in a
+pool of threads under an adaptive limit, against the stand-in metadata
+server in :mod:`metadata_server`. The concurrent lookups are run once
+against a server answering any number of requests and once against one
+rate limiting requests beyond its capacity. Finally the episodes are
+grouped by season and each season is looked up once, as in
+:func:`unameit.planner.enrich_all`.
+
+Usage: python benchmarks/bench_lookup.py [latency in ms] [workers] [files]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from metadata_server import HTTPBackend, MetadataServer, show_name
+from unameit.lookup import Limiter, Lookup, MetadataError
+from unameit.pipeline import Pipeline, Stage
+
+
+def episodes(files, shows=10):
+    """Returns the show, season and episode of *files* files"""
+    return [(show_name(number % shows), number // 240 + 1,
+             number // shows % 24 + 1) for number in range(files)]
+
+
+def by_episode(lookup):
+    """Returns a stage looking up each episode on its own"""
+    def find(item):
+        """Looks up an item, dropping it if that fails"""
+        try:
+            return lookup.episode(*item)
+        except MetadataError:
+            return None
+    return find
+
+
+def by_season(lookup):
+    """Returns a batched stage looking up each season once"""
+    def find(items):
+        """Looks up the seasons of a batch of items"""
+        seasons = dict()
+        for show, season, episode in items:
+            seasons.setdefault((show, season), []).append(episode)
+
+        found = list()
+        for (show, season), episodes in seasons.items():
+            try:
+                table = lookup.season(show, season, len(episodes))
+            except MetadataError:
+                continue
+            found.extend(table["titles"].get(episode) for episode in episodes)
+        return found
+    return find
+
+
+def measure(name, server, items, workers, stage=by_episode):
+    """Looks up the items with an empty cache, printing the throughput"""
+    limiter = Limiter(workers) if workers > 1 else None
+    lookup = Lookup(HTTPBackend(server.url), limiter=limiter)
+
+    pipeline = Pipeline([Stage("lookup", stage(lookup), workers,
+                               batch=64 if stage is by_season else None)])
+    start = time.time()
+    found = sum(1 for _ in pipeline.run(items))
+    elapsed = time.time() - start
+
+    print("{0:<28} {1:>8.1f} files/s {2:>5} found {3:>5} requests "
+          "{4:>4} shared {5:>4} retried {6:>4} saved".format(
+              name, len(items) / elapsed, found, lookup.stats["requests"],
+              lookup.stats["shared"], lookup.stats["retried"],
+              lookup.stats["saved"]))
+    if limiter is not None:
+        print("{0:<28} limit {1:.1f}, lowest {2}".format(
+            "", limiter.limit, limiter.stats["lowest"]))
+
+
+def main(latency=20, workers=16, files=480):
+    """Runs the benchmark"""
+    items = episodes(files)
+    print("{0} files, {1} ms per request".format(files, latency))
+
+    for capacity in (None, workers // 2):
+        server = MetadataServer(latency=latency / 1000.0,
+                                capacity=capacity).start()
+        try:
+            if capacity is None:
+                measure("one at a time", server, items, 1)
+            measure("{0} workers, capacity {1}".format(
+                workers, capacity or "unlimited"), server, items, workers)
+            if capacity is None:
+                measure("{0} workers, by season".format(workers), server,
+                        items, workers, by_season)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the throughput of :func:`unameit.filesystem.move` and
+:func:`shutil.move` when moving a large file between two directories.
+
+Moves are only interesting between file systems, by default the file is
+moved between the temporary directory and /dev/shm. If both are on the
+same device, the copy functions are compared as well.
+
+Usage: python benchmarks/bench_move.py [size in MiB] [first dir] [second dir]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unameit import filesystem
+
+
+def measure(name, function, first, second, size, rounds=5):
+    """Moves a file back and forth, printing the throughput"""
+    source = os.path.join(first, "bench.avi")
+    target = os.path.join(second, "bench.avi")
+
+    start = time.time()
+    for _ in range(rounds):
+        function(source, target)
+        function(target, source)
+    elapsed = time.time() - start
+
+    print("{0:<32} {1:>10.1f} MiB/s".format(name,
+                                            2 * rounds * size / elapsed))
+
+
+def copied(function):
+    """Turns a copy function into a move, removing the source"""
+    def _move(source, target):
+        function(source, target)
+        os.unlink(source)
+    return _move
+
+
+def main(size=256, first=None, second=None):
+    """Runs the benchmark"""
+    first = tempfile.mkdtemp(dir=first)
+    if second is None and os.path.isdir("/dev/shm"):
+        second = "/dev/shm"
+    second = tempfile.mkdtemp(dir=second)
+
+    try:
+        with open(os.path.join(first, "bench.avi"), "wb") as stream:
+            for _ in range(int(size)):
+                stream.write(os.urandom(1024 * 1024))
+
+        same = os.stat(first).st_dev == os.stat(second).st_dev
+        print("Moving {0:g} MiB between {1} and {2}{3}".format(
+            size, first, second, " (same device)" if same else ""))
+        print("Copy methods: {0}".format(", ".join(
+            name for name, _ in filesystem._METHODS)))
+
+        measure("unameit.filesystem.move", filesystem.move, first, second,
+                size)
+        measure("shutil.move", shutil.move, first, second, size)
+
+        #Copying through Python buffers, as done without kernel support
+        methods = filesystem._METHODS
+        filesystem._METHODS = [("chunked", filesystem._chunked)]
+        try:
+            measure("unameit.filesystem.move chunked", filesystem.move,
+                    first, second, size)
+        finally:
+            filesystem._METHODS = methods
+
+        if same:
+            measure("unameit.filesystem.copy", copied(filesystem.copy),
+                    first, second, size)
+            measure("shutil.copy2", copied(shutil.copy2), first, second,
+                    size)
+    finally:
+        shutil.rmtree(first)
+        shutil.rmtree(second)
+
+
+if __name__ == "__main__":
+    main(*[float(arg) for arg in sys.argv[1:2]] + sys.argv[2:4])
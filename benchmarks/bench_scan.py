@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the serial and the parallel directory scanners on a file system
+with an artificial latency added to each directory listing, mimicking a
+network mount.
+
+Usage: python benchmarks/bench_scan.py [latency in ms] [workers]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unameit.scanner import scan, parallel_scan, scandir
+
+
+class LatencyFS(object):
+    """A scandir replacement sleeping for *latency* seconds per listing"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.listings = 0
+
+    def __call__(self, path):
+        self.listings += 1
+        time.sleep(self.latency)
+        return list(scandir(path))
+
+
+def make_tree(root, shows=20, seasons=5, episodes=12):
+    """Creates a tree of empty media files below *root*"""
+    for show in range(shows):
+        for season in range(1, seasons + 1):
+            directory = os.path.join(root, "show{0}".format(show),
+                                     "season{0}".format(season))
+            os.makedirs(directory)
+            for episode in range(1, episodes + 1):
+                name = "show{0}.s{1:02}e{2:02}.avi".format(show, season,
+                                                           episode)
+                open(os.path.join(directory, name), "w").close()
+
+
+def measure(name, function):
+    """Runs *function* and prints the time taken and files found"""
+    start = time.time()
+    count = sum(1 for _ in function())
+    print("{0:<24} {1:>6} files {2:>8.3f} s".format(name, count,
+                                                   time.time() - start))
+
+
+def main(latency=5.0, workers=16):
+    """Runs the benchmark"""
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        listdir = LatencyFS(latency / 1000.0)
+
+        print("Latency {0} ms per listing, {1} workers".format(latency,
+                                                               workers))
+        measure("scan", lambda: scan(root, listdir=listdir))
+        measure("parallel_scan", lambda: parallel_scan(
+            root, workers=workers, listdir=listdir))
+        measure("parallel_scan ordered", lambda: parallel_scan(
+            root, workers=workers, ordered=True, listdir=listdir))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(*[float(arg) for arg in sys.argv[1:2]] +
+         [int(arg) for arg in sys.argv[2:3]])
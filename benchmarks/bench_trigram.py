@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the time it takes to build, load and search a
+:class:`unameit.trigram.TrigramIndex` of generated show names.
+
+Usage: python benchmarks/bench_trigram.py [names] [searches]
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unameit.trigram import TrigramIndex
+
+#Words common in show names, the other words are made up
+COMMON = ("the", "of", "and", "a", "in", "new", "show", "life", "man", "us")
+
+
+def show_names(count, seed=1):
+    """Returns *count* distinct generated show names"""
+    generator = random.Random(seed)
+    words = ["".join(generator.choice("abcdefghijklmnoprstuvwy")
+                     for _ in range(generator.randint(3, 9)))
+             for _ in range(count // 2)]
+
+    found = set()
+    while len(found) < count:
+        name = [generator.choice(words)
+                for _ in range(generator.randint(1, 3))]
+        if generator.random() < 0.5:
+            name.insert(generator.randrange(len(name)),
+                        generator.choice(COMMON))
+        name = " ".join(name).title()
+        if generator.random() < 0.3:
+            name += " ({0})".format(generator.randint(1960, 2020))
+        found.add(name)
+    return sorted(found)
+
+
+def misspell(name, generator):
+    """Drops a random character of a lower cased name"""
+    name = name.lower()
+    index = generator.randrange(len(name))
+    return name[:index] + name[index + 1:]
+
+
+def main(count=20000, searches=2000):
+    """Runs the benchmark"""
+    names = show_names(count)
+    index = TrigramIndex()
+
+    start = time.time()
+    index.update(names)
+    print("Indexed {0} names in {1:.3f} s".format(len(index),
+                                                  time.time() - start))
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "cache.trigrams")
+        index.save(path)
+        start = time.time()
+        TrigramIndex.load(path)
+        print("Loaded the index in {0:.3f} s".format(time.time() - start))
+    finally:
+        shutil.rmtree(directory)
+
+    generator = random.Random(2)
+    queries = [misspell(generator.choice(names), generator)
+               for _ in range(searches)]
+    start = time.time()
+    for query in queries:
+        index.search(query)
+    print("{0:.1f} us per search".format(
+        (time.time() - start) / searches * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
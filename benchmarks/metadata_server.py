@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A stand-in for an online metadata service, answering show and episode
+lookups from generated data after an artificial latency. Requests beyond
+the capacity of the server are answered with 429 Too Many Requests, like a
+rate limited service.
+
+The server answers
+
+* ``/series?name=<name>`` with the *id* and *name* of a show
+* ``/episode/<id>/<season>/<episode>`` with the *title* of an episode
+* ``/season/<id>/<season>`` with the *episode* and *title* of each
+  episode of a season
+
+and 404 for shows and episodes it does not know. :class:`HTTPBackend` is a
+lookup backend using it, see :class:`unameit.lookup.Lookup`.
+
+Usage: python benchmarks/metadata_server.py [port] [latency in ms] [capacity]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, quote, urlparse
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unameit.lookup import Backend, MetadataError, RateLimited
+
+
+def show_name(number):
+    """Returns the name of the generated show *number*"""
+    return "Show {0}".format(number)
+
+
+def episode_title(number, episode):
+    """Returns the title of an episode of the generated show *number*"""
+    return "Episode {0} of {1}".format(episode, show_name(number))
+
+
+class MetadataServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves *shows* shows with *seasons* seasons of *episodes* episodes.
+
+    :param port: The port to listen on, 0 picks a free one
+    :param latency: The number of seconds each request takes
+    :param capacity: The number of requests answered concurrently, further
+                     requests are rate limited. None for no limit
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, capacity=None, shows=100,
+                 seasons=10, episodes=24):
+        HTTPServer.__init__(self, ("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.capacity = capacity
+        self.shows = shows
+        self.seasons = seasons
+        self.episodes = episodes
+        #: The number of requests answered and rate limited
+        self.stats = {"answered": 0, "limited": 0}
+        self.active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        """The address of the server"""
+        return "http://127.0.0.1:{0}".format(self.server_address[1])
+
+    def start(self):
+        """Serves requests in a background thread"""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def answer(self, path):
+        """Returns the status and the document answering *path*"""
+        url = urlparse(path)
+        parts = url.path.strip("/").split("/")
+
+        if parts == ["series"]:
+            name = parse_qs(url.query).get("name", [""])[0].lower()
+            for number in range(self.shows):
+                if show_name(number).lower() == name:
+                    return 200, {"id": number, "name": show_name(number)}
+            return 404, None
+
+        if len(parts) == 4 and parts[0] == "episode":
+            series, season, episode = [int(part) for part in parts[1:]]
+            if series < self.shows and 0 < season <= self.seasons and \
+                    0 < episode <= self.episodes:
+                return 200, {"title": episode_title(series, episode)}
+            return 404, None
+
+        if len(parts) == 3 and parts[0] == "season":
+            series, season = [int(part) for part in parts[1:]]
+            if series < self.shows and 0 < season <= self.seasons:
+                return 200, [{"episode": episode,
+                              "title": episode_title(series, episode)}
+                             for episode in range(1, self.episodes + 1)]
+            return 404, None
+
+        return 400, None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answers a request after the latency of the server"""
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Handles a GET request"""
+        server = self.server
+        with server.lock:
+            limited = server.capacity is not None and \
+                server.active >= server.capacity
+            if limited:
+                server.stats["limited"] += 1
+            else:
+                server.active += 1
+                server.stats["answered"] += 1
+
+        if limited:
+            self.send_response(429)
+            self.end_headers()
+            return
+
+        try:
+            time.sleep(server.latency)
+            status, document = server.answer(self.path)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+        body = json.dumps(document).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        """Keeps the requests out of the output"""
+
+
+class HTTPBackend(Backend):
+    """
+    A lookup backend using a :class:`MetadataServer`.
+
+    :param url: The address of the server
+    :param timeout: The number of seconds to wait for an answer
+    """
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def series(self, name):
+        """Looks up the show *name*"""
+        return self._get("/series?name={0}".format(quote(name)))
+
+    def episode(self, series, season, episode):
+        """Looks up an episode of the show with the id *series*"""
+        return self._get("/episode/{0}/{1}/{2}".format(series, season,
+                                                       episode))
+
+    def season(self, series, season):
+        """Looks up all episodes of a season of the show with the id
+        *series*"""
+        return self._get("/season/{0}/{1}".format(series, season))
+
+    def _get(self, path):
+        """Returns the decoded answer, or None if it was not found"""
+        try:
+            response = urlopen(self.url + path, timeout=self.timeout)
+            try:
+                return json.loads(response.read().decode("utf-8"))
+            finally:
+                response.close()
+        except HTTPError as error:
+            if error.code == 404:
+                return None
+            if error.code == 429:
+                retry = error.headers.get("Retry-After")
+                raise RateLimited("Rate limited", retry_after=float(retry)
+                                  if retry else None)
+            raise MetadataError("Lookup failed: {0}".format(error))
+        except URLError as error:
+            raise MetadataError("Lookup failed: {0}".format(error))
+
+
+def main(port=8080, latency=50, capacity=None):
+    """Runs the server until interrupted"""
+    server = MetadataServer(int(port), float(latency) / 1000,
+                            int(capacity) if capacity else None)
+    print("Serving on {0}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
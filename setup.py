@@ -38,6 +38,7 @@ setup(
     author_email=__EMAIL__,
     license="GPLv3",
     platforms=["any"],
+    python_requires=">=3.7",
     install_requires=["pytvdbapi", "PyYAML"],
     packages=find_packages(),
     test_suite='unameit.tests',
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for caching metadata lookups on disk.
+
+Entries are stored in a sqlite database, each with its own expiry time.
+Lookups that found nothing are cached as well, for a shorter time, so shows
+that do not exist are not looked up over and over. The least recently used
+entries are evicted once the cache grows beyond its size.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+__all__ = ['MetadataCache', 'MISS', 'key']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#: Returned by :meth:`MetadataCache.get` for keys not in the cache
+MISS = object()
+
+#Bumped whenever the layout of the database changes
+_SCHEMA_VERSION = 1
+
+#The number of accesses kept in memory before they are written
+_TOUCH_BATCH = 512
+
+#The number of entries stored between checks of the size of the cache
+_EVICT_EVERY = 256
+
+_DAY = 24 * 60 * 60
+
+
+def key(*parts):
+    """
+    :param parts: The parts of the key, like a kind, a show and a season
+    :return: The key as a string
+
+    >>> key("episode", "dexter", 1, 2)
+    'episode|dexter|1|2'
+    """
+    return "|".join(str(part) for part in parts)
+
+
+class MetadataCache(object):
+    """
+    A persistent cache of metadata.
+
+    :param path: The path of the database, by default the cache only lives
+                 in memory
+    :param ttl: The number of seconds entries are kept
+    :param negative_ttl: The number of seconds lookups that found nothing
+                         are kept
+    :param size: The maximum number of entries
+    :param clock: A function returning the current time in seconds
+
+    Values are stored as JSON. The cache can be used from several threads.
+    """
+
+    def __init__(self, path=":memory:", ttl=30 * _DAY, negative_ttl=_DAY,
+                 size=100000, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.size = size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._touched = dict()
+        self._stored = 0
+
+        #: Counts lookups of values, of cached misses, of keys not found and
+        #: of expired entries, which are also counted as misses
+        self.stats = {"hits": 0, "negative": 0, "misses": 0, "expired": 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        _prepare(self._db)
+
+    def get(self, name):
+        """
+        :param name: The key, see :func:`key`
+        :return: The cached value, None if it was cached that nothing was
+                 found or :data:`MISS` if the key is not cached
+        """
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM entries "
+                                   "WHERE key = ?", (name,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return MISS
+
+            value, expires = row
+            if expires <= now:
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return MISS
+
+            #Updating the access time is delayed to keep reads cheap
+            self._touched[name] = now
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._flush()
+
+            if value is None:
+                self.stats["negative"] += 1
+                return None
+
+            self.stats["hits"] += 1
+            return json.loads(value)
+
+    def set(self, name, value, ttl=None):
+        """
+        :param name: The key, see :func:`key`
+        :param value: A value that can be stored as JSON, or None if
+                      nothing was found
+        :param ttl: The number of seconds to keep the entry, by default
+                    *ttl* or *negative_ttl* of the cache
+        """
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+
+        now = self._clock()
+        data = json.dumps(value) if value is not None else None
+        with self._lock:
+            self._touched.pop(name, None)
+            self._db.execute("INSERT OR REPLACE INTO entries (key, value, "
+                             "expires, used) VALUES (?, ?, ?, ?)",
+                             (name, data, now + ttl, now))
+            self._stored += 1
+            if self._stored >= _EVICT_EVERY:
+                self._evict()
+            self._db.commit()
+
+    def values(self, prefix=""):
+        """
+        :param prefix: The start of the keys, see :func:`key`
+        :return: A list of the values of the entries with keys starting
+                 with *prefix* that have not expired, leaving out entries
+                 caching that nothing was found
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT value FROM entries WHERE key >= ? "
+                                    "AND key < ? AND expires > ? AND value "
+                                    "IS NOT NULL", (prefix, prefix + u"\uffff",
+                                                    self._clock())).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").\
+                fetchone()[0]
+
+    def hit_rate(self):
+        """
+        :return: The share of lookups answered by the cache, between 0 and 1
+        """
+        answered = self.stats["hits"] + self.stats["negative"]
+        total = answered + self.stats["misses"]
+        return answered / float(total) if total else 0.0
+
+    def log_stats(self):
+        """Logs the hit rate of the cache"""
+        logger.info("Metadata cache hit rate {0:.1%}: {hits} hits, "
+                    "{negative} cached misses, {misses} misses of which "
+                    "{expired} expired".format(self.hit_rate(), **self.stats))
+
+    def close(self):
+        """Writes pending access times and closes the database"""
+        with self._lock:
+            self._flush()
+            self._evict()
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def _flush(self):
+        """Writes the delayed access times"""
+        if self._touched:
+            self._db.executemany("UPDATE entries SET used = ? WHERE key = ?",
+                                 [(used, name) for name, used in
+                                  self._touched.items()])
+            self._db.commit()
+            self._touched = dict()
+
+    def _evict(self):
+        """Removes expired entries and, if the cache is still too large,
+        the least recently used ones"""
+        self._stored = 0
+        self._flush()
+        self._db.execute("DELETE FROM entries WHERE expires <= ?",
+                         (self._clock(),))
+
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.size:
+            self._db.execute("DELETE FROM entries WHERE key IN (SELECT key "
+                             "FROM entries ORDER BY used LIMIT ?)",
+                             (count - self.size,))
+            logger.debug("Evicted {0} entries from the metadata cache".
+            format(count - self.size))
+
+
+def _prepare(db):
+    """Creates the tables of a new database, or recreates them if the
+    database was created by another version"""
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version != _SCHEMA_VERSION:
+        db.execute("DROP TABLE IF EXISTS entries")
+        db.execute("PRAGMA user_version = {0:d}".format(_SCHEMA_VERSION))
+
+    db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, "
+               "value TEXT, expires REAL, used REAL)")
+    db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+    db.commit()
@@ -21,15 +21,48 @@ Provides functionality to read and merge the config files and to validate the
  correctness of the configurations.
 """
 
+import hashlib
+import json
 import logging
 import os
-import sys
+import re
+import tempfile
+import threading
+import time
 import yaml
 
-__all__ = ['Group', 'read', 'validate', 'ConfigError']
+from collections.abc import Mapping, Sequence
+
+#Use the much faster libyaml based loader when it is available
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+from unameit.filesystem import MODES
+from unameit.formatter import DEFAULT_FORMAT, Renderer
+from unameit.lookup import BACKENDS
+from unameit.matcher import Matcher
+from unameit.planner import COLLISIONS
+from unameit.router import Router
+from unameit.scanner import extension_filter
+
+__all__ = ['Group', 'Groups', 'Configuration', 'read', 'validate',
+           'ConfigError', 'REGEXP_FLAGS']
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
+#: The flags used when compiling the regexps of a group
+REGEXP_FLAGS = re.VERBOSE | re.IGNORECASE
+
+#Bumped whenever the content of the configuration cache changes
+_CACHE_VERSION = 4
+
+#Group fields resolved once and stored as attributes of the group
+_FIELDS = ("input", "output", "format", "language", "regexp")
+
+_MISSING = object()
+
 
 class ConfigError(Exception):
     """Raised if there were errors reading a configuration file"""
@@ -39,26 +72,116 @@ class ConfigError(Exception):
 class Group(object):
     """
     Holds data for a configuration group
+
+    The most frequently used fields are resolved once when the group is
+    created and stored as plain attributes. Other fields are looked up in
+    the group data on access. The compiled regexps of the group are
+    available as *patterns* and the compiled format, see
+    :class:`unameit.formatter.Renderer`, as *renderer*. The filter of file
+    names built from the *include* and *exclude* lists, see
+    :func:`unameit.scanner.extension_filter`, is available as *accepts*.
+    How files are placed in the output directory is available as
+    *placement*, see :data:`unameit.filesystem.MODES`, and how existing
+    files in the output directory are handled as *collision*, see
+    :data:`unameit.planner.COLLISIONS`. The metadata backend of the group,
+    if any, is available as *lookup*, see :data:`unameit.lookup.BACKENDS`.
     """
 
+    __slots__ = ("name", "_data", "patterns", "renderer", "accepts",
+                 "placement", "collision", "lookup") + _FIELDS
+
     def __init__(self, name, data):
-        self._name = name
+        self.name = name
         self._data = data
+        self.patterns = _compile(name, data.get("regexp"))
+        self.renderer = _renderer(name, data.get("format"))
+        self.placement = _choice(name, "placement", data.get("placement"),
+                                 sorted(MODES), "move")
+        self.collision = _choice(name, "collision", data.get("collision"),
+                                 COLLISIONS, "skip")
+        self.lookup = _choice(name, "lookup", data.get("lookup"), BACKENDS,
+                              None)
+
+        for field in _FIELDS:
+            value = data.get(field, _MISSING)
+            if value is not _MISSING:
+                setattr(self, field, value)
+
+        self.accepts = extension_filter(self)
 
     def __getattr__(self, item):
-        try:
-            return self._data[item]
-        except KeyError:
+        #Only called for fields not resolved when the group was created
+        if item.startswith("_"):
+            raise AttributeError(item)
+
+        value = self._data.get(item, _MISSING)
+        if value is _MISSING:
             raise AttributeError("Group has no attribute {0}".format(item))
+        return value
+
+    def __getstate__(self):
+        return self.name, self._data
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return "<Group {0}>".format(self.name)
+
+
+class Groups(Sequence):
+    """
+    An immutable, ordered collection of :class:`Group` objects.
+
+    Groups are accessed by position or by name, both in constant time::
+
+        groups[0]
+        groups["dexter"]
+
+    A :class:`unameit.matcher.Matcher` and a :class:`unameit.router.Router`
+    for all groups are built when the collection is created and are
+    available as *matcher* and *router*.
+    """
+
+    def __init__(self, groups=()):
+        self._groups = tuple(groups)
+        self._names = dict((group.name, group) for group in self._groups)
+        self.matcher = Matcher(self._groups)
+        self.router = Router(self._groups)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._groups[key]
+        return self._names[key]
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __contains__(self, item):
+        if isinstance(item, Group):
+            return self._names.get(item.name) is item
+        return item in self._names
+
+    def get(self, name, default=None):
+        """Returns the group called *name* or *default*"""
+        return self._names.get(name, default)
+
+    def names(self):
+        """Returns the names of the groups in order"""
+        return [group.name for group in self._groups]
 
     def __repr__(self):
-        return "<Group {0}>".format(self._name)
+        return "<Groups {0}>".format(self.names())
 
 
-def read(files):
+def read(files, cache=None):
     """
     :param files: A path or an iterable of paths to read
-    :return: A list of :class:`Group` objects. Could be empty
+    :param cache: Optional path to a file used to cache the parsed files
+    :return: A :class:`Groups` collection. Could be empty
 
     Takes a string or a list/tuple of strings to be file paths.
 
@@ -69,56 +192,300 @@ def read(files):
     list of default locations to look in and any files not found are
     automatically ignored.
 
-    The function returns a list of :class:`Group` objects. The default
+    The function returns a collection of :class:`Group` objects. The default
     section of a file will not be included in the result. If selected in the
     config file, the group will be merged with the default section before
     returning.
+
+    If *cache* is given, the parsed content of the files is stored in that
+    file. As long as none of the files has been changed,
+    added or removed, later calls load the content from the cache instead
+    of parsing the files again.
+    """
+
+    layers = _layers(_paths(files), cache)
+    return _build([layer for layer in layers if layer is not None])
+
+
+class Configuration(object):
+    """
+    Keeps a list of config files loaded and reloads them as they change.
+
+    :param files: A path or an iterable of paths to read, see :func:`read`
+    :param cache: Optional path to a file used to cache the parsed files,
+                  see :func:`read`. It is updated whenever the files are
+                  reloaded
+    :raise: :class:`ConfigError`
+
+    The parsed content of each file is kept separately. When files change,
+    only those files are parsed again and merged with the content kept for
+    the others. The new :class:`Groups` collection then replaces the
+    current one in a single step, so code still holding the previous
+    collection is not affected.
     """
 
+    def __init__(self, files, cache=None):
+        self._paths = _paths(files)
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._states = dict((path, _state(path)) for path in self._paths)
+        self._layers = dict(zip(self._paths, _layers(self._paths, cache)))
+        self._groups = self._build()
+
+    @property
+    def groups(self):
+        """The current :class:`Groups` collection"""
+        return self._groups
+
+    def changed(self):
+        """
+        :return: A list with the paths of the files changed since they were
+                 last read, including files created or removed
+        """
+        return [path for path in sorted(self._states)
+                if _state(path) != self._states[path]]
+
+    def reload(self):
+        """
+        :return: True if the groups were replaced
+
+        Reads the changed files, if any, and replaces the groups. If a file
+        can not be parsed, the current groups are kept and the file is
+        tried again on the next call.
+        """
+        with self._lock:
+            changed = self.changed()
+            if not changed:
+                return False
+
+            start = time.time()
+            states = dict(self._states)
+            layers = dict(self._layers)
+            #The key is taken first, so a file changing while it is read
+            #can not leave stale content in the cache
+            key = _cache_key(self._paths) if self._cache else None
+            try:
+                for path in changed:
+                    states[path] = _state(path)
+                    layers[path] = _read_layer(path)
+                groups = self._build(layers)
+            except ConfigError as error:
+                logger.error("Keeping the current configuration: {0}".
+                format(error))
+                return False
+
+            self._states = states
+            self._layers = layers
+            self._groups = groups
+            if self._cache:
+                _store_cache(self._cache, key,
+                             [layers[path] for path in self._paths])
+
+        logger.info("Reloaded {0} in {1:.1f} ms".format(
+            ", ".join(changed), (time.time() - start) * 1000))
+        return True
+
+    def _build(self, layers=None):
+        """Builds the groups from the parsed files, in order"""
+        if layers is None:
+            layers = self._layers
+        return _build([layers[path] for path in self._paths
+                       if layers[path] is not None])
+
+
+def _paths(files):
+    """Turns a path or an iterable of paths into a list of absolute paths"""
     #Make sure that we have an iterable containing at least 1 file
     #TODO: There should be a more pythonic way to do this
-    if sys.version_info < (3, 0):
-        strings = (str, unicode)
-    else:
-        strings = (str, )
-
-    if type(files) in strings:
+    if isinstance(files, str):
         files = [files]
 
     logger.debug("Processing {0} files".format(len(files)))
 
-    #Parse all files in the order provided and merge into 1 dict holding the
-    #merged content
-    file_data = dict()
-    for path in files:
-        if not os.path.isabs(path):
-            _old = path
-            path = os.path.abspath(os.path.join(os.getcwd(), path))
-            logger.debug("Making {0} absolute => {1}".format(_old, path))
+    return [_absolute(path) for path in files]
 
-        path = os.path.normpath(path)
 
-        if os.path.isfile(path):
-            data = _read_file(path)
-            file_data = _merge(file_data, data)
-        else:
-            logger.info("{0} not found. Was ignored.".format(path))
+def _state(path):
+    """Returns the size, modification time and inode of a file, or None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    mtime = getattr(stat, "st_mtime_ns", stat.st_mtime)
+    return stat.st_size, mtime, stat.st_ino
+
+
+def _build(layers):
+    """
+    :param layers: A list of parsed files
+    :return: A :class:`Groups` collection
+    :raise: :class:`ConfigError`
+
+    Merges the parsed files and creates the groups.
+    """
+    #The files are merged lazily, none of the parsed data is modified
+    file_data = _Layered(layers)
 
     #process all groups and merge with default data if required
     default = file_data.get("default", dict())
-    #filter out the default section
-    data = dict((k, v) for k, v in file_data.items() if k != "default")
 
     groups = list()
-    for name, data in data.items():
+    for name in file_data:
+        #filter out the default section
+        if name == "default":
+            continue
+
+        data = file_data[name]
         merge = data.get("use_defaults", False)
 
         if merge:
-            groups.append(Group(name, _merge(data, default)))
+            groups.append(Group(name, _Layered([data, default])))
         else:
             groups.append(Group(name, data))
 
-    return groups
+    return Groups(groups)
+
+
+def _absolute(path):
+    """Makes *path* absolute and normalized"""
+    if not os.path.isabs(path):
+        _old = path
+        path = os.path.abspath(os.path.join(os.getcwd(), path))
+        logger.debug("Making {0} absolute => {1}".format(_old, path))
+
+    return os.path.normpath(path)
+
+
+def _layers(paths, cache=None):
+    """
+    :param paths: A list of absolute paths
+    :param cache: Optional path to a file used to cache the parsed files
+    :return: A list with the content of each file, None for missing and
+             empty files
+    :raise: :class:`ConfigError`
+
+    Parses all files in the order provided. If *cache* is given, the content
+    is loaded from it as long as none of the files changed, otherwise the
+    parsed content is stored in it.
+    """
+    key = None
+    if cache is not None:
+        key = _cache_key(paths)
+        layers = _load_cache(cache, key)
+        if layers is not None and len(layers) == len(paths):
+            return layers
+
+    layers = [_read_layer(path) for path in paths]
+    if cache is not None:
+        _store_cache(cache, key, layers)
+    return layers
+
+
+def _read_layer(path):
+    """
+    :param path: An absolute path
+    :return: A dictionary or None
+    :raise: :class:`ConfigError`
+
+    Parses a single file, returns None if the file is missing or empty.
+    """
+    if not os.path.isfile(path):
+        logger.info("{0} not found. Was ignored.".format(path))
+        return None
+
+    data = _read_file(path)
+    if data is None:
+        logger.debug("{0} is empty".format(path))
+    elif not isinstance(data, Mapping):
+        logger.error("{0} does not contain any groups".format(path))
+        raise ConfigError("Error parsing {0}".format(path))
+
+    return data
+
+
+def _cache_key(paths):
+    """
+    :param paths: A list of absolute paths
+    :return: A list identifying the current content of the files
+
+    The key holds the path, size, modification time and a hash of the
+    content of each file. Missing files are part of the key as well so the
+    key changes if they are created.
+    """
+    key = [_CACHE_VERSION]
+    for path in paths:
+        try:
+            with open(path, "rb") as config:
+                stat = os.fstat(config.fileno())
+                digest = hashlib.sha1(config.read()).hexdigest()
+        except (IOError, OSError):
+            key.append([path, None])
+            continue
+
+        mtime = getattr(stat, "st_mtime_ns", stat.st_mtime)
+        key.append([path, stat.st_size, mtime, digest])
+
+    return key
+
+
+def _load_cache(cache, key):
+    """
+    :param cache: The path of the cache file
+    :param key: The key of the files, see :func:`_cache_key`
+    :return: The cached list of parsed files or None
+
+    Returns None if the cache is missing, unreadable or was created for a
+    different key. The cache is plain JSON, so loading it never runs any
+    code.
+    """
+    try:
+        with open(cache, "rt") as stream:
+            cached_key, data = json.load(stream)
+    except Exception as error:  # pylint: disable=W0703
+        logger.debug("Unable to load cache {0}: {1}".format(cache, error))
+        return None
+
+    if cached_key != key:
+        logger.debug("Cache {0} is out of date".format(cache))
+        return None
+
+    logger.debug("Loaded configuration from cache {0}".format(cache))
+    return data
+
+
+def _store_cache(cache, key, data):
+    """
+    :param cache: The path of the cache file
+    :param key: The key of the files, see :func:`_cache_key`
+    :param data: The data to store
+
+    Writes the cache through a temporary file which is then renamed, so
+    readers never see a partially written cache. Data that does not survive
+    a round trip through JSON unchanged, like dates or keys that are not
+    strings, is not cached. Failures are logged but otherwise ignored.
+    """
+    try:
+        text = json.dumps([key, data])
+        if json.loads(text) != [key, data]:
+            raise ValueError("data can not be stored as JSON")
+    except (TypeError, ValueError) as error:
+        logger.debug("Unable to cache configuration: {0}".format(error))
+        return
+
+    directory = os.path.dirname(os.path.abspath(cache))
+    temporary = None
+    try:
+        handle, temporary = tempfile.mkstemp(dir=directory)
+        with os.fdopen(handle, "wt") as stream:
+            stream.write(text)
+        os.replace(temporary, cache)
+    except (IOError, OSError) as error:
+        logger.warning("Unable to write cache {0}: {1}".format(cache, error))
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+        return
+
+    logger.debug("Stored configuration in cache {0}".format(cache))
 
 
 #def validate(required, data):
@@ -141,7 +508,7 @@ def _read_file(path):
 
     try:
         with open(path, "rt") as config:
-            data = yaml.safe_load(config)
+            data = yaml.load(config, Loader=_Loader)
     except IOError:
         logger.error("Unable to read {0}".format(path))
         raise ConfigError("Unable to read {0}".format(path))
@@ -159,6 +526,72 @@ def _read_file(path):
     return data
 
 
+def _compile(name, regexps):
+    """
+    :param name: The name of the group the regexps belong to
+    :param regexps: A regexp or a list of regexps, could be None
+    :return: A tuple of compiled regexps
+    :raise: :class:`ConfigError`
+
+    Compiles the regexps of a group using :data:`REGEXP_FLAGS`.
+    """
+    if not regexps:
+        return tuple()
+
+    if not isinstance(regexps, list):
+        regexps = [regexps]
+
+    patterns = []
+    for regexp in regexps:
+        try:
+            patterns.append(re.compile(regexp, REGEXP_FLAGS))
+        except (re.error, TypeError) as error:
+            logger.error("Invalid regexp in group {0}: {1}".format(
+                name, error))
+            raise ConfigError("Invalid regexp in group {0}".format(name))
+
+    return tuple(patterns)
+
+
+def _renderer(name, template):
+    """
+    :param name: The name of the group the format belongs to
+    :param template: The format, could be None or empty
+    :return: A :class:`unameit.formatter.Renderer`
+    :raise: :class:`ConfigError`
+
+    Compiles the format of a group, using
+    :data:`unameit.formatter.DEFAULT_FORMAT` if none is given.
+    """
+    try:
+        return Renderer(template or DEFAULT_FORMAT)
+    except (ValueError, TypeError) as error:
+        logger.error("Invalid format in group {0}: {1}".format(name, error))
+        raise ConfigError("Invalid format in group {0}".format(name))
+
+
+def _choice(name, field, value, choices, default):
+    """
+    :param name: The name of the group the value belongs to
+    :param field: The name of the field
+    :param value: The value, could be None
+    :param choices: A sequence of the valid values
+    :param default: The value used if *value* is None
+    :return: The value
+    :raise: :class:`ConfigError`
+    """
+    if value is None:
+        return default
+
+    #Checked against a sequence since the value might not be hashable
+    if value not in choices:
+        logger.error("Invalid {0} in group {1}: {2}, should be one of {3}".
+        format(field, name, value, ", ".join(choices)))
+        raise ConfigError("Invalid {0} in group {1}".format(field, name))
+
+    return value
+
+
 def _merge(left, right):
     """
     :param left: Left hand side
@@ -166,20 +599,110 @@ def _merge(left, right):
     :return:
 
     Merges the left and right argument. Dictionaries are merged recursively,
-    lists are extended and made unique.
+    lists are extended and made unique, keeping the order of the items.
+    Neither argument is modified, values only found on one side are shared
+    with the result rather than copied.
 
     .. Note: In case of a conflict, values in *right* will overwrite values
     in *left*.
     """
+    return _materialize(_combine([left, right]))
+
+
+class _Layered(Mapping):
+    """
+    A read only mapping merging a list of dictionaries, or layers, on access.
+
+    Works much like a ChainMap with the last layer taking precedence, except
+    that values found in several layers are merged the same way as done by
+    :func:`_merge`. The layers are never modified, so they can be shared
+    freely, and values are only merged once they are accessed.
+    """
+
+    def __init__(self, layers):
+        self._layers = tuple(layers)
+        self._resolved = dict()
+
+    def __getitem__(self, key):
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
 
-    if isinstance(left, dict) and isinstance(right, dict):
-        for key, value in list(left.items()):
-            if key not in right:
-                right[key] = value
-            else:
-                right[key] = _merge(value, right[key])
-    elif isinstance(left, list) and isinstance(right, list):
-        right.extend(left)
-        right = list(set(right))
+        values = [layer[key] for layer in self._layers if key in layer]
+        if not values:
+            raise KeyError(key)
 
-    return right
+        value = self._resolved[key] = _combine(values)
+        return value
+
+    def __iter__(self):
+        seen = set()
+        for layer in self._layers:
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self._layers))
+
+    def __repr__(self):
+        return "<_Layered {0}>".format(dict(_materialize(self)))
+
+
+def _combine(values):
+    """
+    :param values: The values of the same key in each layer, in order
+    :return: The merged value
+
+    Dictionaries and lists at the end of *values* are merged, a value of any
+    other kind overrides everything before it.
+    """
+    last = values[-1]
+    if isinstance(last, Mapping):
+        kind = Mapping
+    elif isinstance(last, list):
+        kind = list
+    else:
+        return last
+
+    run = []
+    for value in reversed(values):
+        if not isinstance(value, kind):
+            break
+        run.append(value)
+
+    if len(run) == 1:
+        return last
+
+    run.reverse()
+    if kind is list:
+        return _unique(item for value in run for item in value)
+    return _Layered(run)
+
+
+def _unique(items):
+    """Returns the unique items as a list, keeping the order"""
+    result = []
+    seen = set()
+
+    for item in items:
+        try:
+            if item in seen:
+                continue
+            seen.add(item)
+        except TypeError:
+            #Unhashable items are compared one by one
+            if item in result:
+                continue
+        result.append(item)
+
+    return result
+
+
+def _materialize(value):
+    """Converts :class:`_Layered` values into plain dictionaries"""
+    if isinstance(value, _Layered):
+        return dict((key, _materialize(value[key])) for key in value)
+    return value
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for moving files into place, also between file systems.
+
+Files on the same file system are simply renamed. Files on another file
+system are copied in the kernel where possible, using ``copy_file_range``
+or ``sendfile``, so the data never passes through Python buffers.
+
+Files can also be placed while keeping the original, as a hard link, a
+reflink sharing the data of the original or a symbolic link.
+
+Existing files are never replaced. On Linux this is checked atomically by
+the kernel through ``renameat2``, a file in the way makes any of the
+functions raise an OSError with errno EEXIST.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # pylint: disable=C0103
+
+__all__ = ['place', 'move', 'copy', 'hardlink', 'reflink', 'symlink',
+           'rename', 'MODES', 'CHUNK_SIZE']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#: The number of bytes copied by each system call
+CHUNK_SIZE = 8 * 1024 * 1024
+
+#Errors meaning that a copy method is not supported for a pair of files
+_UNSUPPORTED = set([errno.ENOSYS, errno.EINVAL, errno.EXDEV, errno.EBADF,
+                    errno.ENOTSUP, errno.EOPNOTSUPP])
+
+#From <linux/fs.h>, clones the data of one file into another
+_FICLONE = 0x40049409
+
+#Errors meaning that a file system does not support a type of link
+_NO_LINKS = set([errno.EPERM, errno.ENOTTY, errno.EMLINK])
+
+#From <linux/fs.h> and <fcntl.h>
+_RENAME_NOREPLACE = 1
+_AT_FDCWD = -100
+
+
+def _load_renameat2():
+    """Returns the renameat2 function of the C library, or None"""
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+    except OSError:
+        return None
+
+    function = getattr(libc, "renameat2", None)
+    if function is not None:
+        function.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int,
+                             ctypes.c_char_p, ctypes.c_uint]
+        function.restype = ctypes.c_int
+    return function
+
+_renameat2 = _load_renameat2()  # pylint: disable=C0103
+
+
+def rename(source, target):
+    """
+    :param source: The path of the file to rename
+    :param target: The new path of the file
+    :raise OSError: With errno EEXIST if *target* exists, or if the file
+                    could not be renamed
+
+    Renames a file without ever replacing an existing file. Uses
+    ``renameat2`` with RENAME_NOREPLACE where the kernel and the file system
+    support it, otherwise a hard link to the new path followed by removing
+    the old one. As a last resort the target is checked before renaming,
+    which is not atomic.
+    """
+    global _renameat2  # pylint: disable=W0603
+
+    if _renameat2 is not None:
+        result = _renameat2(_AT_FDCWD, os.fsencode(source), _AT_FDCWD,
+                            os.fsencode(target), _RENAME_NOREPLACE)
+        if result == 0:
+            return
+
+        number = ctypes.get_errno()
+        if number == errno.ENOSYS:
+            logger.debug("renameat2 is not supported by the kernel")
+            _renameat2 = None
+        elif number != errno.EINVAL:
+            raise OSError(number, os.strerror(number), source)
+
+    #Linking a symbolic link could link the file it points to instead
+    if not os.path.islink(source):
+        try:
+            os.link(source, target)
+        except OSError as error:
+            if error.errno not in _NO_LINKS and \
+               error.errno not in _UNSUPPORTED:
+                raise
+        else:
+            os.unlink(source)
+            return
+
+    if os.path.lexists(target):
+        raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), target)
+    os.rename(source, target)
+
+_rename = rename  # pylint: disable=C0103
+
+
+def place(source, target, mode="move"):
+    """
+    :param source: The path of the file to place
+    :param target: The path to place the file at
+    :param mode: One of :data:`MODES`
+    :return: The mode used, "copy" if the file had to be copied instead
+    :raise OSError: If the file could not be placed
+
+    Places the file at *target* by moving or linking it. The modes other
+    than *move* keep the original file. If the file system does not support
+    the link type, for instance if *target* is on another file system, the
+    file is copied instead.
+    """
+    if mode == "move":
+        move(source, target)
+        return mode
+
+    try:
+        MODES[mode](source, target)
+        return mode
+    except OSError as error:
+        if error.errno not in _UNSUPPORTED and error.errno not in _NO_LINKS:
+            raise
+        logger.debug("Unable to {0} {1}: {2}, copying".format(mode, source,
+                                                             error))
+
+    copy(source, target)
+    return "copy"
+
+
+def move(source, target):
+    """
+    :param source: The path of the file to move
+    :param target: The new path of the file
+    :raise OSError: If the file could not be moved
+
+    Renames the file if *target* is on the same file system, otherwise the
+    file is copied with :func:`copy` and the source removed once the copy is
+    complete.
+    """
+    try:
+        _rename(source, target)
+        return
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+
+    logger.debug("{0} is on another device, copying".format(target))
+    copy(source, target)
+    os.unlink(source)
+
+
+def copy(source, target):
+    """
+    :param source: The path of the file to copy
+    :param target: The path of the copy
+    :return: The name of the copy method used
+    :raise OSError: If the file could not be copied
+
+    Copies the content, permissions, times and, if allowed, the owner of
+    the file. The copy is written to a temporary file next to *target* and
+    synced to disk before it is renamed into place, after making sure that
+    its size matches the source.
+    """
+    directory = os.path.dirname(os.path.abspath(target))
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix=".unameit-")
+
+    try:
+        with open(source, "rb") as stream:
+            status = os.fstat(stream.fileno())
+            method, copied = _copy(stream.fileno(), handle, status.st_size)
+            os.fsync(handle)
+
+        if copied != status.st_size or os.fstat(handle).st_size != copied:
+            raise OSError(errno.EIO, "Copied {0} of {1} bytes of {2}".
+            format(copied, status.st_size, source))
+
+        os.close(handle)
+        handle = None
+
+        _copystat(source, temporary)
+        _rename(temporary, target)
+    except BaseException:
+        if handle is not None:
+            os.close(handle)
+        os.unlink(temporary)
+        raise
+
+    logger.debug("Copied {0} bytes to {1} using {2}".format(copied, target,
+                                                            method))
+    return method
+
+
+def hardlink(source, target):
+    """
+    :param source: The path of an existing file
+    :param target: The path of the new link
+    :raise OSError: If the link could not be created
+
+    Creates a hard link, sharing both the data and the metadata of the
+    file.
+    """
+    os.link(source, target)
+
+
+def reflink(source, target):
+    """
+    :param source: The path of an existing file
+    :param target: The path of the copy
+    :raise OSError: If the file system does not support reflinks
+
+    Creates a copy sharing the data of the original until either is
+    modified, using the FICLONE ioctl supported by btrfs and xfs among
+    others. The metadata is copied as by :func:`copy`.
+    """
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOTSUP, "Reflinks are not supported")
+
+    directory = os.path.dirname(os.path.abspath(target))
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix=".unameit-")
+
+    try:
+        with open(source, "rb") as stream:
+            fcntl.ioctl(handle, _FICLONE, stream.fileno())
+        os.close(handle)
+        handle = None
+
+        _copystat(source, temporary)
+        _rename(temporary, target)
+    except BaseException:
+        if handle is not None:
+            os.close(handle)
+        os.unlink(temporary)
+        raise
+
+
+def symlink(source, target):
+    """
+    :param source: The path of an existing file
+    :param target: The path of the new link
+    :raise OSError: If the link could not be created
+
+    Creates a symbolic link to the absolute path of *source*.
+    """
+    os.symlink(os.path.abspath(source), target)
+
+
+def _copystat(source, target):
+    """Copies the permissions, times and, if allowed, the owner"""
+    shutil.copystat(source, target)
+    status = os.stat(source)
+    try:
+        os.chown(target, status.st_uid, status.st_gid)
+    except OSError:
+        pass
+
+
+def _copy(infd, outfd, size):
+    """
+    Copies *size* bytes using the first method supported for the files.
+    Returns the name of the method and the number of bytes copied
+    """
+    for name, function in _METHODS:
+        try:
+            return name, function(infd, outfd, size)
+        except OSError as error:
+            #Only fall back if nothing was written
+            if error.errno not in _UNSUPPORTED or \
+               os.lseek(outfd, 0, os.SEEK_CUR) != 0:
+                raise
+            logger.debug("Unable to copy using {0}: {1}".format(name, error))
+            os.lseek(infd, 0, os.SEEK_SET)
+
+    raise OSError(errno.ENOTSUP, "No copy method available")
+
+
+def _copy_file_range(infd, outfd, size):
+    """Copies using copy_file_range, within the kernel"""
+    offset = 0
+    while offset < size:
+        count = os.copy_file_range(infd, outfd, min(CHUNK_SIZE, size - offset))
+        if count == 0:
+            break
+        offset += count
+    return offset
+
+
+def _sendfile(infd, outfd, size):
+    """Copies using sendfile, within the kernel"""
+    offset = 0
+    while offset < size:
+        count = os.sendfile(outfd, infd, offset,
+                            min(CHUNK_SIZE, size - offset))
+        if count == 0:
+            break
+        offset += count
+    return offset
+
+
+def _chunked(infd, outfd, size):
+    """Copies by reading and writing chunks of the file"""
+    offset = 0
+    while offset < size:
+        data = os.read(infd, min(CHUNK_SIZE, size - offset))
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            written = os.write(outfd, view)
+            view = view[written:]
+        offset += len(data)
+    return offset
+
+
+def _methods():
+    """Returns the copy methods available, the fastest first"""
+    methods = list()
+    if hasattr(os, "copy_file_range"):
+        methods.append(("copy_file_range", _copy_file_range))
+    #Only Linux supports sendfile to a regular file
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        methods.append(("sendfile", _sendfile))
+    methods.append(("chunked", _chunked))
+    return methods
+
+_METHODS = _methods()
+
+#: The ways files can be placed, by name
+MODES = {"move": move, "hardlink": hardlink, "reflink": reflink,
+         "symlink": symlink}
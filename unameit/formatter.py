@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for rendering the new name of a file from the *format* of a group.
+
+Formats use the same syntax as :meth:`str.format`, for example::
+
+    {show}/Season {season}/{show} - S{season:02}E{episode:02} - {title}{ext}
+
+The available fields are:
+
+* *show*: The name of the show, cleaned and capitalized. If the canonical
+  name of the show has been looked up, see :mod:`unameit.lookup`, that
+  name is used as is instead
+* *season*, *episode*: The season and episode numbers. The format
+  specification applies to the number, so ``{season:02}`` pads it with
+  zeros. Files with several episodes render all of them joined by ``-``
+* *title*: The title of the episode, empty if not known
+* *ext*: The extension of the original file, including the dot
+
+Formats are compiled once into a :class:`Renderer`, which is rejected with a
+:class:`ValueError` if it refers to unknown fields or uses invalid format
+specifications. Field values are stripped of characters not allowed in file
+names, while path separators in the format itself are kept, so formats can
+create directories.
+"""
+
+import re
+import string
+
+from unameit import names
+
+__all__ = ['DEFAULT_FORMAT', 'FIELDS', 'Renderer']
+
+#: The format used by groups not specifying one
+DEFAULT_FORMAT = "{show} - S{season:02}E{episode:02}{ext}"
+
+#: The fields available in a format
+FIELDS = ("show", "season", "episode", "title", "ext")
+
+#Characters not allowed in file names on common file systems
+_UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+#Values used to validate formats when they are compiled
+_SAMPLE = {"show": "Show", "season": "1", "episode": "2", "title": "Title",
+           "ext": ".avi"}
+
+
+class Renderer(object):
+    """
+    A compiled format.
+
+    :param template: The format to compile
+    :raise: ValueError if the format is invalid
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self._parts = []
+
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as error:
+            raise ValueError("Invalid format {0!r}: {1}".format(template,
+                                                               error))
+
+        for literal, field, spec, conversion in parsed:
+            if field is None:
+                self._parts.append((literal, None))
+                continue
+
+            if field not in FIELDS:
+                raise ValueError("Unknown field {0!r} in format {1!r}".
+                format(field, template))
+            if conversion:
+                raise ValueError("Conversions are not supported in format "
+                                 "{0!r}".format(template))
+
+            self._parts.append((literal, _GETTERS[field](field, spec or "")))
+
+        try:
+            self.render(_SAMPLE)
+        except ValueError as error:
+            raise ValueError("Invalid format {0!r}: {1}".format(template,
+                                                               error))
+
+    def render(self, fields):
+        """
+        :param fields: A dictionary with the values of the fields
+        :return: The rendered name
+        :raise: KeyError if a required field is missing, ValueError if a
+                value is invalid for its field or a number was not found,
+                TypeError if a value is of the wrong type
+        """
+        result = []
+        for literal, getter in self._parts:
+            result.append(literal)
+            if getter is not None:
+                result.append(getter(fields))
+        return "".join(result)
+
+    def __repr__(self):
+        return "<Renderer {0!r}>".format(self.template)
+
+
+def sanitize(value):
+    """
+    :param value: The string to sanitize
+    :return: *value* without characters not allowed in file names
+
+    >>> sanitize('What? A "Title": Part 1/2')
+    'What A Title Part 12'
+    """
+    return _UNSAFE.sub("", value).strip()
+
+
+def _show(field, spec):
+    """Renders the canonical or the cleaned and capitalized show name"""
+    def _getter(fields):
+        if fields.get("series"):
+            return format(sanitize(fields["series"]), spec)
+        #Files of the same show share the cached normalized name
+        return format(sanitize(names.normalize_cached(fields[field])), spec)
+    return _getter
+
+
+def _number(field, spec):
+    """Renders a number, or several joined by -, using *spec*. Values that
+    were not found, like optional regexp groups that did not match, are
+    left out"""
+    def _getter(fields):
+        values = [value for value in fields.get(field + "s") or
+                  (fields[field],) if value is not None]
+        if not values:
+            raise ValueError("No {0} found".format(field))
+        return "-".join(format(int(value), spec) for value in values)
+    return _getter
+
+
+def _text(field, spec):
+    """Renders a sanitized, possibly empty, string"""
+    def _getter(fields):
+        return format(sanitize(fields.get(field) or ""), spec)
+    return _getter
+
+
+def _extension(field, spec):
+    """Renders the extension as is"""
+    def _getter(fields):
+        return format(fields.get(field) or "", spec)
+    return _getter
+
+
+_GETTERS = {"show": _show, "season": _number, "episode": _number,
+            "title": _text, "ext": _extension}
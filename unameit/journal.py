@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for journaling renames so they can be resumed and undone.
+
+The journal is an append only file with one JSON record per line. Before a
+batch of files is renamed, the planned renames are written and synced to
+disk in one go. Completed renames are written to the file as they happen
+but are only synced with the next batch, since a rename that was not
+recorded is still detected by looking at the file system.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+
+from unameit.planner import Plan, targets
+
+__all__ = ['Journal', 'BATCH_SIZE']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#: The default number of renames recorded with a single sync
+BATCH_SIZE = 256
+
+
+class _Run(object):
+    """The renames of a single run, as read from the journal"""
+
+    __slots__ = ("name", "renames", "inodes", "done", "undone", "ended",
+                 "reverted")
+
+    def __init__(self, name):
+        self.name = name
+        self.renames = dict()
+        #The device and inode of the source of each rename when planned
+        self.inodes = dict()
+        self.done = list()
+        self.undone = set()
+        self.ended = False
+        self.reverted = False
+
+    def pending(self):
+        """Returns the ids of the planned renames not known to be done"""
+        done = set(self.done)
+        return sorted(id_ for id_ in self.renames if id_ not in done)
+
+
+class Journal(object):
+    """
+    A write ahead journal of renames.
+
+    :param path: The path of the journal file, created if missing
+    :param batch: The number of renames recorded with a single sync
+
+    Each call to :meth:`begin` starts a new run, unless the last run was
+    interrupted in which case that run is resumed. :meth:`undo` reverses
+    the last run. :meth:`record` can be called from several threads at once.
+    """
+
+    def __init__(self, path, batch=BATCH_SIZE):
+        self.path = path
+        self.batch = batch
+        self._runs = _read(path)
+        self._run = None
+        self._stream = open(path, "a")
+        if _torn(path):
+            #Keep the next record off the line left by a crash
+            self._stream.write("\n")
+            self._stream.flush()
+        #Batches can be recorded from several threads at once
+        self._lock = threading.RLock()
+
+    def begin(self, execute):
+        """
+        :param execute: A function carrying out a :class:`Plan`, returning
+                        True on success
+
+        Starts a run. If the last run was interrupted it is resumed
+        instead: renames that were planned but not recorded as done are
+        checked against the file system and carried out if needed.
+        """
+        last = self._last()
+        if last is not None and not last.ended and not last.reverted:
+            logger.info("Resuming interrupted run {0}".format(last.name))
+            self._run = last
+            self._recover(execute)
+            return
+
+        self._run = _Run(uuid.uuid4().hex)
+        self._runs.append(self._run)
+        self._write({"op": "begin", "run": self._run.name})
+
+    def record(self, plans, execute):
+        """
+        :param plans: An iterable of :class:`Plan` objects
+        :param execute: A function carrying out a :class:`Plan`, returning
+                        True on success
+        :return: The number of files renamed
+
+        Journals and carries out the renames, one batch at a time.
+        """
+        count = 0
+        batch = list()
+        for rename in plans:
+            batch.append(rename)
+            if len(batch) >= self.batch:
+                count += self._record(batch, execute)
+                batch = list()
+
+        if batch:
+            count += self._record(batch, execute)
+
+        return count
+
+    def end(self):
+        """Marks the current run as completed"""
+        if self._run is not None:
+            self._run.ended = True
+            self._write({"op": "end", "run": self._run.name})
+            self._run = None
+        self.sync()
+
+    def undo(self, execute):
+        """
+        :param execute: A function carrying out a :class:`Plan`, returning
+                        True on success
+        :return: The number of files renamed back
+
+        Reverses the renames of the last run that has not been undone
+        already, most recent rename first. An interrupted undo, or one
+        where some files could not be renamed back, is resumed by calling
+        this again.
+        """
+        run = self._last()
+        if run is None:
+            logger.info("There is nothing to undo in {0}".format(self.path))
+            return 0
+
+        #Find out what an interrupted run got done
+        self._run = run
+        self._recover(None)
+
+        count = 0
+        complete = True
+        for id_ in reversed(run.done):
+            if id_ in run.undone:
+                continue
+
+            reverted = _revert(run.renames[id_], run.inodes.get(id_),
+                               execute)
+            if reverted is None:
+                complete = False
+                continue
+            count += reverted
+
+            run.undone.add(id_)
+            self._write({"op": "undo", "run": run.name, "id": id_})
+
+        #Leave the run in place so failed renames can be retried
+        if complete:
+            run.reverted = True
+            self._write({"op": "reverted", "run": run.name})
+        self._run = None
+        self.sync()
+
+        logger.info("Undid {0} renames of run {1}".format(count, run.name))
+        return count
+
+    def sync(self):
+        """Forces all records written so far to disk"""
+        with self._lock:
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+
+    def close(self):
+        """Syncs and closes the journal"""
+        if not self._stream.closed:
+            self.sync()
+            self._stream.close()
+
+    def _record(self, batch, execute):
+        """Journals and carries out a single batch of renames"""
+        run = self._run
+        ids = list()
+        with self._lock:
+            for rename in batch:
+                id_ = len(run.renames)
+                run.renames[id_] = rename
+                run.inodes[id_] = _inode(rename.source)
+                ids.append(id_)
+                self._write({"op": "plan", "run": run.name, "id": id_,
+                             "source": rename.source,
+                             "target": rename.target, "mode": rename.mode,
+                             "collision": rename.collision,
+                             "inode": run.inodes[id_]})
+
+            #The plans must be on disk before any file is renamed
+            self.sync()
+
+        count = 0
+        for id_, rename in zip(ids, batch):
+            if self._execute(id_, rename, execute):
+                count += 1
+
+        return count
+
+    def _recover(self, execute):
+        """
+        Resolves the planned renames of the current run that are not
+        recorded as done. If *execute* is given, renames that did not
+        happen are carried out.
+        """
+        run = self._run
+        for id_ in run.pending():
+            rename = run.renames[id_]
+            target = _placed(rename, run.inodes.get(id_))
+            if target is not None:
+                changed = target != rename.target
+                rename.target = target
+                self._done(id_, target if changed else None)
+            elif execute is not None and os.path.lexists(rename.source):
+                self._execute(id_, rename, execute)
+        self.sync()
+
+    def _execute(self, id_, rename, execute):
+        """Carries out a planned rename, recording it if successful"""
+        target, mode = rename.target, rename.mode
+        if not execute(rename):
+            return False
+
+        #The target differs if the planned one was taken and the mode if
+        #the file had to be copied
+        self._done(id_, rename.target if rename.target != target else None,
+                   rename.mode if rename.mode != mode else None)
+        return True
+
+    def _done(self, id_, target=None, mode=None):
+        """Records a completed rename, with its target and mode if they
+        changed"""
+        record = {"op": "done", "run": self._run.name, "id": id_}
+        if target is not None:
+            record["target"] = target
+        if mode is not None:
+            record["mode"] = mode
+
+        with self._lock:
+            self._run.done.append(id_)
+            self._write(record)
+            self._stream.flush()
+
+    def _write(self, record):
+        """Appends a record to the journal"""
+        self._stream.write(json.dumps(record, sort_keys=True) + "\n")
+
+    def _last(self):
+        """Returns the last run that has not been undone, or None"""
+        for run in reversed(self._runs):
+            if not run.reverted:
+                return run
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+
+def _torn(path):
+    """Checks if the journal at *path* ends in a partially written record"""
+    with open(path, "rb") as stream:
+        stream.seek(0, os.SEEK_END)
+        if stream.tell() == 0:
+            return False
+        stream.seek(-1, os.SEEK_END)
+        return stream.read(1) != b"\n"
+
+
+def _inode(path):
+    """Returns the device and inode of *path*, or None if it is missing"""
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return None
+    return [status.st_dev, status.st_ino]
+
+
+def _ours(rename, inode, target=None):
+    """
+    Checks if *target*, by default the target of the rename, is the file
+    placed by the rename: the moved file or a hard link with the inode of
+    the source, or a symbolic link to the source. Copies, including files
+    moved to another file system, can not be told apart from other files
+    """
+    target = target or rename.target
+    if rename.mode in ("move", "hardlink"):
+        return inode is not None and _inode(target) == list(inode)
+    if rename.mode == "symlink":
+        try:
+            return os.readlink(target) == os.path.abspath(rename.source)
+        except OSError:
+            return False
+    return False
+
+
+def _placed(rename, inode):
+    """
+    Returns the path the file of a planned rename was placed at, or None
+    if it can not be told that it was. Targets that existed before may have
+    been skipped as taken, so only targets with the placed file count. The
+    suffixed names are tried for renames adding a suffix to taken names
+    """
+    for target in targets(rename.target, rename.collision == "suffix"):
+        if not os.path.lexists(target):
+            return None
+        if _ours(rename, inode, target):
+            return target
+    return None
+
+
+def _revert(rename, inode, execute):
+    """
+    Reverses a rename that was carried out. Returns the number of files
+    changed, or None if the rename could not be reversed
+    """
+    source, target = rename.source, rename.target
+    if not os.path.lexists(target):
+        if os.path.lexists(source):
+            #Reverted already
+            return 0
+        logger.warning("{0} is missing, unable to undo".format(target))
+        return None
+
+    #A file moved within a file system keeps its inode
+    moved = rename.mode == "move" and inode is not None and \
+        _inode(target)[0] == inode[0]
+    if (moved or rename.mode in ("hardlink", "symlink")) and \
+            not _ours(rename, inode):
+        logger.warning("{0} is not the placed file, unable to undo".format(
+            target))
+        return None
+
+    if rename.mode != "move" and os.path.lexists(source):
+        #The original was kept, the link or copy can just be removed
+        try:
+            os.unlink(target)
+        except OSError as error:
+            logger.error("Unable to remove {0}: {1}".format(target, error))
+            return None
+        logger.info("Removed {0}".format(target))
+        return 1
+
+    if rename.mode == "symlink":
+        logger.warning("{0} is missing, unable to undo".format(source))
+        return None
+
+    if not execute(Plan(target, source, None, None)):
+        return None
+    return 1
+
+
+def _read(path):
+    """
+    :param path: The path of a journal
+    :return: A list of runs, in the order they were started
+
+    A missing journal has no runs. A torn record at the end of the journal,
+    left by a crash, is ignored.
+    """
+    runs = list()
+    if not os.path.exists(path):
+        return runs
+
+    by_name = dict()
+    with open(path) as stream:
+        for number, line in enumerate(stream, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning("Ignoring broken record on line {0} of {1}".
+                format(number, path))
+                continue
+
+            op = record.get("op")
+            if op == "begin":
+                run = _Run(record["run"])
+                by_name[run.name] = run
+                runs.append(run)
+                continue
+
+            run = by_name.get(record.get("run"))
+            if run is None:
+                continue
+
+            if op == "plan":
+                run.renames[record["id"]] = Plan(
+                    record["source"], record["target"], None, None,
+                    record.get("mode", "move"),
+                    record.get("collision", "skip"))
+                run.inodes[record["id"]] = record.get("inode")
+            elif op == "done":
+                run.done.append(record["id"])
+                if "target" in record:
+                    run.renames[record["id"]].target = record["target"]
+                if "mode" in record:
+                    run.renames[record["id"]].mode = record["mode"]
+            elif op == "undo":
+                run.undone.add(record["id"])
+            elif op == "end":
+                run.ended = True
+            elif op == "reverted":
+                run.reverted = True
+
+    return runs
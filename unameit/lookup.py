@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for looking up the canonical names of shows and the titles of
+episodes.
+
+Lookups go through a :class:`Lookup`, which keeps the results in a
+:class:`unameit.cache.MetadataCache` so each show and episode is only
+looked up once in a while. The lookups themselves are done by a
+:class:`Backend`, either :class:`TVDB`, using thetvdb.com through
+pytvdbapi, or :class:`unameit.offline.OfflineBackend`, using a local copy
+of the metadata.
+
+A :class:`Lookup` can be used from several threads at once. Threads asking
+for the same show or episode share a single request, and a
+:class:`Limiter` adapts the number of concurrent requests to how well the
+service keeps up.
+"""
+
+import logging
+import threading
+import time
+
+try:
+    from pytvdbapi import api as tvdb_api
+    from pytvdbapi import error as tvdb_error
+except ImportError:
+    tvdb_api = tvdb_error = None  # pylint: disable=C0103
+
+from unameit import names
+from unameit.cache import MISS, MetadataCache, key
+
+__all__ = ['Lookup', 'Limiter', 'Backend', 'TVDB', 'MetadataError',
+           'RateLimited', 'create', 'normalize', 'BACKENDS']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#: The names of the lookup backends a group can use
+BACKENDS = ("tvdb", "offline")
+
+
+class MetadataError(Exception):
+    """Raised if a lookup could not be done, for instance if the service is
+    unreachable. Lookups that failed are not cached"""
+
+
+class RateLimited(MetadataError):
+    """
+    Raised by backends if the service asks for fewer requests. The lookup
+    is tried again after a while.
+
+    :param message: The error message
+    :param retry_after: The number of seconds the service asked to wait,
+                        if it said
+    """
+
+    def __init__(self, message, retry_after=None):
+        super(RateLimited, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class Limiter(object):
+    """
+    An adaptive limit on the number of concurrent requests.
+
+    :param maximum: The largest number of concurrent requests
+    :param minimum: The smallest number of concurrent requests
+    :param backoff: The number of seconds no requests are started when
+                    the limit is lowered a second time without a success
+                    in between, doubled for each further time
+    :param max_backoff: The longest time no requests are started
+
+    The limit starts at *maximum*. It grows by one for each *limit*
+    requests that succeed and is halved when a request fails or is rate
+    limited, at most once for all the requests started before the failure.
+    A delay asked for by the service is always waited out.
+    """
+
+    def __init__(self, maximum=8, minimum=1, backoff=0.5, max_backoff=30.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limit = float(maximum)
+
+        #: The number of requests started, failed and rate limited and the
+        #: lowest limit reached
+        self.stats = {"started": 0, "failed": 0, "limited": 0,
+                      "lowest": maximum}
+        self._active = 0
+        self._failures = 0
+        self._resume = 0.0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Waits until a request can be started.
+
+        :return: A token to pass to :meth:`release`
+        """
+        with self._condition:
+            while True:
+                delay = self._resume - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                elif self._active >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    break
+
+            self._active += 1
+            self.stats["started"] += 1
+            return self._generation
+
+    def release(self, token, error=None):
+        """
+        Records the outcome of a request.
+
+        :param token: The token returned by :meth:`acquire`
+        :param error: The exception raised by the request, if it failed
+        """
+        with self._condition:
+            self._active -= 1
+            if error is None:
+                self._failures = 0
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            else:
+                self._failed(token, error)
+            self._condition.notify_all()
+
+    def _failed(self, token, error):
+        """Lowers the limit and pauses after a failure"""
+        self.stats["limited" if isinstance(error, RateLimited)
+                   else "failed"] += 1
+
+        #Requests started before the limit was lowered were started under
+        #the old limit, their failures do not lower it again
+        if token != self._generation:
+            return
+
+        self._generation += 1
+        self._failures += 1
+        self.limit = max(self.minimum, self.limit / 2)
+        self.stats["lowest"] = min(self.stats["lowest"], int(self.limit))
+
+        #Lowering the limit is enough for an occasional failure, the service
+        #is given a break if it keeps failing
+        delay = 0
+        if self._failures > 1:
+            delay = min(self.max_backoff,
+                        self.backoff * 2 ** (self._failures - 2))
+        delay = max(delay, getattr(error, "retry_after", None) or 0)
+        self._resume = max(self._resume, time.time() + delay)
+        logger.debug("Lookup failed, limiting to {0} requests for {1:.1f} "
+                     "s: {2}".format(int(self.limit), delay, error))
+
+
+class _Pending(object):
+    """A request that threads asking for the same entry wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Backend(object):
+    """
+    The interface of the backends doing the lookups of a :class:`Lookup`.
+
+    Backends raise :class:`MetadataError` if a lookup could not be done and
+    :class:`RateLimited` if the service asks for fewer requests. Their
+    results must be serializable as JSON, so they can be cached.
+    """
+
+    def series(self, name):
+        """
+        :param name: The name of a show
+        :return: A dictionary with the *id* and the canonical *name* of the
+                 best matching show, or None if there is none
+        :raise: :class:`MetadataError`
+        """
+        raise NotImplementedError
+
+    def season(self, series, season):
+        """
+        :param series: The id of a show, see :meth:`series`
+        :param season: The season number
+        :return: A list of dictionaries with the *episode* number and the
+                 *title* of each episode of the season, or None if there
+                 is no such season
+        :raise: :class:`MetadataError`
+        """
+        raise NotImplementedError
+
+    def episode(self, series, season, episode):
+        """
+        :param series: The id of a show, see :meth:`series`
+        :param season: The season number
+        :param episode: The episode number
+        :return: A dictionary with the *title* of the episode, or None if
+                 there is no such episode
+        :raise: :class:`MetadataError`
+
+        By default the episode is found in its season, see :meth:`season`.
+        """
+        for item in self.season(series, season) or ():
+            if item["episode"] == episode:
+                return {"title": item["title"]}
+        return None
+
+    def names(self):
+        """
+        :return: The canonical names of all shows known to the backend, or
+                 an empty list if they can not be listed, like for online
+                 services
+        """
+        return []
+
+
+class TVDB(Backend):
+    """
+    Looks up shows and episodes on thetvdb.com.
+
+    :param api_key: The API key to use
+    :param language: The language of the names and titles
+    :raise: :class:`MetadataError` if pytvdbapi is not installed
+    """
+
+    def __init__(self, api_key, language="en"):
+        if tvdb_api is None:
+            raise MetadataError("pytvdbapi is required for TVDB lookups")
+
+        self.language = language
+        self._db = tvdb_api.TVDB(api_key)
+        self._shows = dict()
+        self._lock = threading.Lock()
+        self._loading = dict()
+
+    def series(self, name):
+        """
+        :param name: The name of a show
+        :return: A dictionary with the *id* and the canonical *name* of the
+                 best matching show, or None if there is none
+        :raise: :class:`MetadataError`
+        """
+        try:
+            result = self._db.search(name, self.language)
+            if not len(result):
+                return None
+            show = result[0]
+        except tvdb_error.PytvdbapiError as error:
+            raise MetadataError("Unable to search for {0}: {1}".format(
+                name, error))
+
+        self._shows[show.id] = show
+        return {"id": show.id, "name": show.SeriesName}
+
+    def episode(self, series, season, episode):
+        """
+        :param series: The id of a show, see :meth:`series`
+        :param season: The season number
+        :param episode: The episode number
+        :return: A dictionary with the *title* of the episode, or None if
+                 there is no such episode
+        :raise: :class:`MetadataError`
+        """
+        try:
+            return {"title": self._show(series)[season][episode].EpisodeName}
+        except tvdb_error.TVDBIndexError:
+            return None
+        except tvdb_error.PytvdbapiError as error:
+            raise MetadataError("Unable to look up {0} {1}x{2}: {3}".format(
+                series, season, episode, error))
+
+    def season(self, series, season):
+        """
+        :param series: The id of a show, see :meth:`series`
+        :param season: The season number
+        :return: A list of dictionaries with the *episode* number and the
+                 *title* of each episode of the season, or None if there
+                 is no such season
+        :raise: :class:`MetadataError`
+        """
+        try:
+            return [{"episode": item.EpisodeNumber, "title": item.EpisodeName}
+                    for item in self._show(series)[season]]
+        except tvdb_error.TVDBIndexError:
+            return None
+        except tvdb_error.PytvdbapiError as error:
+            raise MetadataError("Unable to look up season {0} of {1}: {2}".
+                                format(season, series, error))
+
+    def _show(self, series):
+        """Returns the show with the id *series*, loading it only once"""
+        with self._lock:
+            lock = self._loading.setdefault(series, threading.Lock())
+
+        #All the episodes of a show are loaded at once, so threads looking
+        #up episodes of the same show wait for the first one
+        with lock:
+            show = self._shows.get(series)
+            if show is None:
+                show = self._db.get_series(series, self.language)
+                self._shows[series] = show
+            return show
+
+
+class Lookup(object):
+    """
+    Looks up metadata through a backend, caching the results.
+
+    :param backend: The backend doing the lookups, like :class:`TVDB`
+    :param cache: A :class:`unameit.cache.MetadataCache`, by default one
+                  only kept in memory
+    :param namespace: Added to the cache keys, so several lookups can share
+                      a cache
+    :param limiter: A :class:`Limiter` for the requests to the backend
+    :param retries: The number of times a rate limited request is tried
+                    again
+    :param index: A :class:`unameit.trigram.TrigramIndex` of the canonical
+                  names of shows, used to find shows that are not found by
+                  the name in a file name
+
+    Shows are cached by their cleaned name, seasons by the cleaned name of
+    the show and the season number and episodes by the cleaned name of the
+    show and the season and episode numbers. Lookups that found
+    nothing are cached too. Threads looking up an entry that is already
+    being requested wait for that request instead of sending their own.
+
+    Shows found are added to the index. A show not found by its name is
+    looked up by the most similar names in the index, for instance
+    "Doctor Who (2005)" for "doctor who".
+    """
+
+    #: The number of similar names tried for a show that is not found
+    CANDIDATES = 3
+
+    def __init__(self, backend, cache=None, namespace="", limiter=None,
+                 retries=3, index=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else MetadataCache()
+        self.namespace = namespace
+        self.limiter = limiter
+        self.retries = retries
+        self.index = index
+
+        #: The number of requests sent to the backend, the number of lookups
+        #: that waited for a request of another thread, the number of
+        #: requests tried again and the number of episode lookups saved by
+        #: looking up whole seasons
+        self.stats = {"requests": 0, "shared": 0, "retried": 0, "saved": 0}
+        self._lock = threading.Lock()
+        self._pending = dict()
+
+    def series(self, name):
+        """
+        :param name: The name of a show, as found in a file name
+        :return: A dictionary with the *id* and canonical *name* of the
+                 show, or None if the show is not known
+        :raise: :class:`MetadataError`
+        """
+        result = self._fetch(key(self.namespace, "series", normalize(name)),
+                             self.backend.series, name)
+        if self.index is None:
+            return result
+        if result is not None:
+            self.index.add(result["name"])
+            return result
+
+        for candidate, score in self.index.search(name, self.CANDIDATES):
+            result = self._fetch(key(self.namespace, "series",
+                                     normalize(candidate)),
+                                 self.backend.series, candidate)
+            if result is not None:
+                logger.debug("Found {0} as {1}, similarity {2:.2f}".format(
+                    name, result["name"], score))
+                return result
+        return None
+
+    def fill_index(self):
+        """Adds the shows in the cache and the shows known to the backend to
+        the index, see :meth:`Backend.names`"""
+        if self.index is None:
+            return
+
+        prefix = key(self.namespace, "series", "")
+        self.index.update(value["name"] for value in
+                          self.cache.values(prefix))
+        self.index.update(self.backend.names())
+
+    def episode(self, name, season, episode):
+        """
+        :param name: The name of a show, as found in a file name
+        :param season: The season number
+        :param episode: The episode number
+        :return: A dictionary with the canonical name of the show as
+                 *series* and the *title* of the episode, or None if either
+                 is not known
+        :raise: :class:`MetadataError`
+        """
+        series = self.series(name)
+        if series is None:
+            return None
+
+        season, episode = int(season), int(episode)
+        result = self._fetch(key(self.namespace, "episode", normalize(name),
+                                 season, episode),
+                             self.backend.episode, series["id"], season,
+                             episode)
+
+        if result is None:
+            return None
+        return {"series": series["name"], "title": result["title"]}
+
+    def season(self, name, season, episodes=1):
+        """
+        :param name: The name of a show, as found in a file name
+        :param season: The season number
+        :param episodes: The number of episodes the season is looked up for,
+                         all but one are counted as saved lookups when the
+                         season is requested from the backend and found
+        :return: A dictionary with the canonical name of the show as
+                 *series* and the titles of the episodes by their numbers
+                 as *titles*, or None if either is not known
+        :raise: :class:`MetadataError`
+        """
+        series = self.series(name)
+        if series is None:
+            return None
+
+        def fetch(series, season):
+            """Requests the season, counting the episode lookups saved"""
+            result = self.backend.season(series, season)
+            if result is not None:
+                with self._lock:
+                    self.stats["saved"] += episodes - 1
+            return result
+
+        season = int(season)
+        result = self._fetch(key(self.namespace, "season", normalize(name),
+                                 season), fetch, series["id"], season)
+
+        if result is None:
+            return None
+        return {"series": series["name"],
+                "titles": dict((int(item["episode"]), item["title"])
+                               for item in result)}
+
+    def log_stats(self):
+        """Logs the number of requests sent and saved"""
+        logger.info("Sent {0} lookup requests, {1} shared, {2} retried, {3} "
+                    "saved by looking up whole seasons".format(
+                        self.stats["requests"], self.stats["shared"],
+                        self.stats["retried"], self.stats["saved"]))
+        if self.limiter is not None:
+            logger.info("Concurrent lookups limited to {0} at the lowest, "
+                        "{1} failed and {2} rate limited".format(
+                            self.limiter.stats["lowest"],
+                            self.limiter.stats["failed"],
+                            self.limiter.stats["limited"]))
+
+    def _fetch(self, name, function, *args):
+        """
+        Returns the entry *name* from the cache, calling *function* with
+        *args* and caching the result if it is missing. Concurrent fetches
+        of the same entry share one call
+        """
+        result = self.cache.get(name)
+        if result is not MISS:
+            return result
+
+        with self._lock:
+            pending = self._pending.get(name)
+            if pending is None:
+                pending = self._pending[name] = _Pending()
+                owner = True
+            else:
+                self.stats["shared"] += 1
+                owner = False
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            result = self._call(function, *args)
+            self.cache.set(name, result)
+            pending.result = result
+            return result
+        except MetadataError as error:
+            pending.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._pending[name]
+            pending.done.set()
+
+    def _call(self, function, *args):
+        """Calls the backend, within the limiter if there is one"""
+        attempt = 0
+        while True:
+            with self._lock:
+                self.stats["requests"] += 1
+            if self.limiter is None:
+                return function(*args)
+
+            token = self.limiter.acquire()
+            try:
+                result = function(*args)
+            except MetadataError as error:
+                self.limiter.release(token, error)
+                if not isinstance(error, RateLimited) or \
+                        attempt >= self.retries:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.stats["retried"] += 1
+            else:
+                self.limiter.release(token)
+                return result
+
+
+def create(name, cache=None, language="en", api_key=None, limiter=None,
+           database=None, index=None):
+    """
+    :param name: The name of the backend, one of :data:`BACKENDS`
+    :param cache: The :class:`unameit.cache.MetadataCache` to use
+    :param language: The language of the names and titles
+    :param api_key: The API key of the service, if needed
+    :param limiter: A :class:`Limiter` for the requests to the service
+    :param database: The path of the database of the offline backend
+    :param index: A :class:`unameit.trigram.TrigramIndex` of the names of
+                  shows, filled with the shows already known
+    :return: A :class:`Lookup`
+    :raise: :class:`MetadataError` if the backend can not be used
+    """
+    if name == "offline":
+        #Imported here, the offline backend builds on this module
+        from unameit.offline import OfflineBackend
+
+        if database is None:
+            raise MetadataError("Offline lookups require a database")
+
+        #Local lookups are as fast as the cache, they are neither cached
+        #between runs nor limited
+        found = Lookup(OfflineBackend(database), namespace=name, index=index)
+    elif name == "tvdb":
+        found = Lookup(TVDB(api_key, language), cache,
+                       "{0}:{1}".format(name, language), limiter, index=index)
+    else:
+        raise MetadataError("Unknown lookup backend {0}".format(name))
+
+    found.fill_index()
+    return found
+
+
+def normalize(name):
+    """
+    :param name: The name of a show
+    :return: The form of the name used in the cache keys
+
+    >>> normalize("the.big.bang.theory")
+    'the big bang theory'
+    """
+    return names.clean_name(name).lower()
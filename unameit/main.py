@@ -20,8 +20,17 @@ Main entry point for the package.
 """
 
 import logging
+import os
+import signal
 import sys
+import threading
+from unameit import configuration, lookup, names, planner, scanner, watch
+from unameit.cache import MetadataCache
+from unameit.journal import Journal
+from unameit.offline import OfflineBackend
 from unameit.options import Options
+from unameit.pipeline import Pipeline, Stage
+from unameit.trigram import TrigramIndex
 
 from unameit.parser import get_parser
 
@@ -53,7 +62,278 @@ def main():
     #Initialize the Borg structure with the options data
     Options(**options.__dict__)
 
+    names.set_engine(options.name_engine)
+
+    if options.import_metadata:
+        if not options.offline_db:
+            parser.error("--import-metadata requires --offline-db")
+
+        try:
+            backend = OfflineBackend(options.offline_db)
+            try:
+                backend.load(options.import_metadata)
+            finally:
+                backend.close()
+        except lookup.MetadataError as error:
+            logging.error("Import failed: {0}".format(error))
+            return 1
+        return 0
+
+    if options.undo:
+        if not options.journal:
+            parser.error("--undo requires --journal")
+
+        with Journal(options.journal) as journal:
+            journal.undo(planner.execute)
+        return 0
+
+    journal = None
+    if options.journal and not options.dry_run:
+        journal = Journal(options.journal)
+
+    day = 24 * 60 * 60
+    cache = MetadataCache(options.metadata_cache or ":memory:",
+                          ttl=options.cache_ttl * day,
+                          negative_ttl=options.negative_ttl * day,
+                          size=options.cache_size)
+    #The names of the shows are indexed for finding shows by similar names
+    index_path = None
+    if options.metadata_cache:
+        index_path = options.metadata_cache + ".trigrams"
+        index = TrigramIndex.load(index_path)
+    else:
+        index = TrigramIndex()
+
+    lookups = dict()
+    enrich = _enricher(options, cache, lookups, index)
+
+    try:
+        if journal is not None:
+            #Finish an interrupted run before looking for new files
+            journal.begin(planner.execute)
+
+        if options.daemon:
+            config = configuration.Configuration(options.configs,
+                                                 options.config_cache)
+            _daemon(config, options, journal, enrich)
+            groups = config.groups
+        else:
+            groups = configuration.read(options.configs,
+                                        options.config_cache)
+            _run(groups, options, journal, enrich)
+
+        if journal is not None:
+            journal.end()
+    except planner.CollisionError as error:
+        #The journal is left open ended so the run can be resumed
+        logging.error("Stopping: {0}".format(error))
+        return 1
+    finally:
+        if journal is not None:
+            journal.close()
+        for found in lookups.values():
+            if found is not None:
+                found.log_stats()
+        cache.log_stats()
+        cache.close()
+        if index_path is not None and index.changed:
+            index.save(index_path)
+
+    #Names matched in other processes are not counted
+    if not options.match_processes:
+        groups.matcher.log_stats()
+
     return 0
 
+
+def _execute(plans, journal=None):
+    """
+    Carries out the planned renames, through the journal if there is one.
+    Returns the plans carried out
+    """
+    if journal is None:
+        return [rename for rename in plans if planner.execute(rename)]
+
+    placed = list()
+
+    def execute(rename):
+        """Carries out a rename, keeping track of the successful ones"""
+        if planner.execute(rename):
+            placed.append(rename)
+            return True
+        return False
+
+    journal.record(plans, execute)
+    return placed
+
+
+def _dry_run(rename):
+    """Logs a planned rename without carrying it out"""
+    logging.info("Would rename {0} => {1}".format(rename.source,
+                                                  rename.target))
+
+
+def _paths(groups, options):
+    """
+    Yields the paths of all files in the input directories. Files are
+    placed while the scan goes on, so renamed files could otherwise show up
+    again later in the scan. The output directories are not scanned and
+    inputs within an output directory are listed in full before their
+    files are yielded.
+    """
+    outputs = [os.path.abspath(group.output) for group in groups
+               if getattr(group, "output", None)]
+
+    for root in groups.router.roots():
+        if not os.path.isdir(root):
+            logging.warning("Input {0} is not a directory".format(root))
+            continue
+
+        if options.scan_workers > 1:
+            entries = scanner.parallel_scan(root, workers=options.scan_workers,
+                                            skip=outputs)
+        else:
+            entries = scanner.scan(root, skip=outputs)
+
+        if any(_within(root, output) for output in outputs):
+            entries = list(entries)
+
+        for entry in entries:
+            yield entry.path
+
+
+def _within(path, directory):
+    """Checks if *path* is *directory* or found below it"""
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return path == directory or \
+        path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+def _enricher(options, cache, lookups, index=None):
+    """
+    Returns a function looking up the metadata of a list of planned renames
+    with the backends of their groups, see
+    :func:`unameit.planner.enrich_all`. The lookups are created when first
+    needed and kept in *lookups*. They share *index* for finding shows by
+    similar names
+    """
+    lock = threading.Lock()
+
+    def find(group):
+        """Returns the lookup of a group, or None if it does not use one"""
+        backend = group.lookup
+        if backend is None:
+            return None
+
+        language = getattr(group, "language", None) or "en"
+        with lock:
+            if (backend, language) not in lookups:
+                try:
+                    limiter = lookup.Limiter(options.lookup_workers)
+                    found = lookup.create(backend, cache, language,
+                                          options.tvdb_key, limiter,
+                                          options.offline_db, index)
+                except lookup.MetadataError as error:
+                    logging.error("Unable to use {0} lookups: {1}".format(
+                        backend, error))
+                    found = None
+                lookups[backend, language] = found
+            return lookups[backend, language]
+
+    return lambda renames: planner.enrich_all(renames, find)
+
+
+def _stages(groups, options, journal=None, enrich=None):
+    """
+    Creates the stages of a run: matching the file names, in processes if
+    requested, looking up metadata in threads if any group uses lookups and
+    placing the files
+    """
+    if options.match_processes > 0:
+        match = Stage("match", planner.plan_path, options.match_processes,
+                      processes=True, initializer=planner.init_process,
+                      initargs=(groups,))
+    else:
+        match = Stage("match", lambda path: planner.plan(groups, path))
+
+    if options.dry_run:
+        place = Stage("place", _dry_run)
+    elif journal is None:
+        place = Stage("place", _execute,
+                      options.place_workers, batch=1)
+    else:
+        #Renames are journaled in batches, with one sync for each batch
+        place = Stage("place", lambda plans: _execute(plans, journal),
+                      options.place_workers, batch=journal.batch)
+
+    if enrich is not None and any(group.lookup for group in groups):
+        #Files from the same season looked up together share one lookup
+        lookups = Stage("lookup", enrich, options.lookup_workers,
+                        batch=Stage.BATCH_SIZE)
+        return [match, lookups, place]
+
+    return [match, place]
+
+
+def _run(groups, options, journal=None, enrich=None):
+    """
+    Renames the files currently found in the input directories. The files
+    are scanned, matched and placed concurrently, see
+    :class:`unameit.pipeline.Pipeline`
+    """
+    pipeline = Pipeline(_stages(groups, options, journal, enrich),
+                        options.queue_size, fatal=(planner.CollisionError,))
+    count = sum(1 for _ in pipeline.run(_paths(groups, options)))
+
+    pipeline.log_stats()
+    logging.info("Renamed {0} files".format(count))
+
+
+def _daemon(config, options, journal=None, enrich=None):
+    """
+    Renames files as they show up in the input directories until
+    interrupted. The groups stay compiled between events and are replaced
+    whenever a config file changes.
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+
+    def handler(path):
+        """Handles a file with the groups current at the time"""
+        rename = planner.plan(config.groups, path)
+        if rename is None:
+            return False
+        if enrich is not None:
+            enrich([rename])
+        if options.dry_run:
+            _dry_run(rename)
+            return False
+        return len(_execute([rename], journal)) > 0
+
+    try:
+        while not stop.is_set():
+            roots = _roots(config.groups)
+            if not roots:
+                logging.error("There are no input directories to watch")
+                break
+
+            def tick(roots=roots):
+                """Start over if a reload changes the input directories"""
+                return config.reload() and _roots(config.groups) != roots
+
+            logging.info("Watching {0}".format(", ".join(roots)))
+            watch.watch(roots, handler, settle=options.settle,
+                        interval=options.interval, polling=options.polling,
+                        stop=stop, tick=tick)
+    except KeyboardInterrupt:
+        pass
+
+    logging.info("Stopped watching")
+
+
+def _roots(groups):
+    """Returns the existing input directories of the groups"""
+    return [root for root in groups.router.roots() if os.path.isdir(root)]
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for matching file names against the regexps of all configuration
+groups.
+
+Rather than trying each regexp of each group in turn, the regexps are
+combined into a single alternation that is evaluated in one pass. The
+alternatives are tried in the configured order, so the result is the same as
+trying the regexps one by one. Regexps that can not be safely combined, such
+as those using back references or inline flags, are evaluated on their own
+at their position in the order.
+
+Before any regexp is evaluated, a :class:`unameit.prefilter.Prefilter` rules
+out the regexps whose required literals are missing from the file name.
+
+Most file names follow a few well known conventions, which
+:mod:`unameit.tokenizer` recognizes without regexps. :meth:`Matcher.parse`
+uses it for groups without regexps of their own and to fill in the fields
+the regexp of a group did not capture. The regexps of a group always decide
+whether a name belongs to it.
+"""
+
+import logging
+import re
+import warnings
+from bisect import bisect_right
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse  # pylint: disable=F0401
+
+from unameit import tokenizer
+from unameit.prefilter import Prefilter
+
+__all__ = ['Match', 'Matcher']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#The maximum number of regexps combined into one. The cost of a failing
+#alternative grows with the number of groups in the regexp, so very large
+#combinations end up slower than evaluating the regexps one by one
+_SEGMENT_SIZE = 16
+
+#Named groups in a regexp, escaped characters are matched to be skipped
+_NAMED_GROUP = re.compile(r'\\.|\(\?P<(\w+)>', re.DOTALL)
+
+
+class Match(object):
+    """
+    The result of a successful match.
+
+    :ivar group: The :class:`unameit.configuration.Group` that matched
+    :ivar index: The index of the regexp within the group, None if the name
+                 was recognized by the tokenizer
+    :ivar fields: A dictionary with the named groups of the regexp
+    """
+
+    def __init__(self, group, index, fields):
+        self.group = group
+        self.index = index
+        self.fields = fields
+
+    @property
+    def show(self):
+        """The *show* group of the match, or None"""
+        return self.fields.get("show")
+
+    @property
+    def season(self):
+        """The *season* group of the match, or None"""
+        return self.fields.get("season")
+
+    @property
+    def episode(self):
+        """The *episode* group of the match, or None"""
+        return self.fields.get("episode")
+
+    @property
+    def episodes(self):
+        """A tuple with all episodes of the match"""
+        if "episodes" in self.fields:
+            return self.fields["episodes"]
+        if self.episode is not None:
+            return (self.episode,)
+        return tuple()
+
+    def __repr__(self):
+        return "<Match {0}[{1}] {2}>".format(self.group, self.index,
+                                             self.fields)
+
+
+class Matcher(object):
+    """
+    Matches file names against the regexps of a list of groups.
+
+    :param groups: An iterable of :class:`unameit.configuration.Group`
+    :param prefilter: If True, use a literal prefilter to skip regexps
+    :param fast_path: If True, use the tokenizer, see :meth:`parse`
+
+    The compiled regexps of all groups are combined when the matcher is
+    created. Regexps are matched from the start of the file name.
+    """
+
+    def __init__(self, groups, prefilter=True, fast_path=True):
+        patterns = [(group, index, pattern) for group in groups
+                    for index, pattern in enumerate(group.patterns)]
+
+        self._segments = list(_segments(patterns))
+        self._starts = [segment.start for segment in self._segments]
+        self._size = len(patterns)
+        self._prefilter = None
+        if prefilter and patterns:
+            self._prefilter = Prefilter([pattern for _, _, pattern in
+                                         patterns])
+
+        self._fast_path = fast_path
+
+        #: Counts the number of evaluations done, where a combined regexp
+        #: counts once for all the regexps in it, the number of regexps
+        #: skipped since the prefilter ruled them out and, for
+        #: :meth:`parse`, the number of names handled by the tokenizer, by
+        #: the regexps or not at all
+        self.stats = {"evaluations": 0, "skipped": 0, "fast": 0, "regexp": 0,
+                      "unmatched": 0}
+
+        logger.debug("Built matcher with {0} segments".format(
+            len(self._segments)))
+
+    def parse(self, name, group=None):
+        """
+        :param name: The file name to parse
+        :param group: The group the file belongs to, if known
+        :return: A :class:`Match` or None
+
+        Extracts the show, season and episode from *name*. If *group* is
+        given, only its own regexps are used, otherwise the regexps of all
+        groups are, see :meth:`match`. Fields the matching regexp did not
+        capture, like all the episodes of a file with several, are filled
+        in by the tokenizer.
+
+        A group without regexps accepts the names recognized by the
+        tokenizer. So does :meth:`parse` without a *group* when no regexp
+        matches, the group of the match is None then.
+        """
+        if group is None:
+            result = self.match(name)
+        else:
+            result = None
+            for index, pattern in enumerate(group.patterns):
+                self.stats["evaluations"] += 1
+                match = pattern.match(name)
+                if match is not None:
+                    result = Match(group, index, match.groupdict())
+                    break
+
+        if result is not None:
+            self.stats["regexp"] += 1
+            if self._fast_path:
+                _complete(result.fields, tokenizer.parse(name))
+            return result
+
+        if self._fast_path and (group is None or not group.patterns):
+            fields = tokenizer.parse(name)
+            if fields is not None:
+                self.stats["fast"] += 1
+                return Match(group, None, fields)
+
+        self.stats["unmatched"] += 1
+        return None
+
+    def log_stats(self):
+        """Logs the statistics gathered so far"""
+        logger.info("Parsed {fast} names with the tokenizer and {regexp} "
+                    "with regexps, {unmatched} were not recognized".
+        format(**self.stats))
+        logger.info("Ran {evaluations} regexp evaluations, the prefilter "
+                    "ruled out {skipped} regexps".format(**self.stats))
+
+    def match(self, name):
+        """
+        :param name: The file name to match
+        :return: A :class:`Match` or None
+
+        Returns the match for the first regexp, in group and then regexp
+        order, matching *name*.
+        """
+        if self._prefilter is None:
+            for segment in self._segments:
+                self.stats["evaluations"] += 1
+                result = segment.match(name)
+                if result is not None:
+                    return result
+            return None
+
+        viable = self._prefilter.viable(name)
+        segments = self._segments
+        covered = 0
+        position = 0
+
+        while position < len(viable):
+            #Jump straight to the segment holding the next viable regexp
+            index = bisect_right(self._starts, viable[position])
+            segment = segments[index - 1]
+
+            candidates = []
+            while position < len(viable) and viable[position] < segment.end:
+                candidates.append(viable[position])
+                position += 1
+
+            self.stats["skipped"] += segment.start - covered + \
+                segment.size - len(candidates)
+            self.stats["evaluations"] += 1
+            covered = segment.end
+
+            if len(candidates) == 1:
+                single = segment.singles[candidates[0] - segment.start]
+                result = single.match(name)
+            else:
+                result = segment.match(name)
+
+            if result is not None:
+                return result
+
+        self.stats["skipped"] += self._size - covered
+        return None
+
+
+def _complete(fields, parsed):
+    """
+    Fills in the *fields* of a regexp match that are missing or did not
+    match from the fields *parsed* by the tokenizer. The episodes found by
+    the tokenizer are only kept if they start with the episode of the match.
+    """
+    if parsed is None:
+        return
+
+    for field, value in parsed.items():
+        if fields.get(field) is None:
+            fields[field] = value
+
+    episodes = fields.get("episodes")
+    if episodes and episodes[0] != fields.get("episode"):
+        del fields["episodes"]
+
+
+class _Single(object):
+    """Wraps a regexp that is evaluated on its own"""
+
+    def __init__(self, group, index, pattern):
+        self.group = group
+        self.index = index
+        self._match = pattern.match
+
+    def match(self, name):
+        """Returns a :class:`Match` or None"""
+        match = self._match(name)
+        if match is None:
+            return None
+        return Match(self.group, self.index, match.groupdict())
+
+
+class _Segment(object):
+    """
+    A run of consecutive regexps, with global indexes from *start*, that are
+    evaluated as one combined regexp.
+    """
+
+    def __init__(self, start, singles, regexp=None, alternatives=None):
+        self.start = start
+        self.size = len(singles)
+        self.end = start + self.size
+        self.singles = singles
+        self._regexp = regexp
+        self._alternatives = alternatives
+
+    def match(self, name):
+        """Returns a :class:`Match` or None"""
+        if self._regexp is None:
+            return self.singles[0].match(name)
+
+        match = self._regexp.match(name)
+        if match is None:
+            return None
+
+        group, index, names = self._alternatives[match.lastgroup]
+        fields = dict((original, match.group(combined))
+                      for original, combined in names)
+        return Match(group, index, fields)
+
+
+def _segments(patterns):
+    """
+    Groups consecutive combinable patterns together, yielding a
+    :class:`_Segment` for each group. Patterns that can not be combined are
+    yielded in segments of their own.
+    """
+    pending = []
+    flags = None
+    start = 0
+
+    for number, (group, index, pattern) in enumerate(patterns):
+        combinable = _combinable(pattern)
+        if combinable and len(pending) < _SEGMENT_SIZE and \
+                (flags is None or pattern.flags == flags):
+            flags = pattern.flags
+            pending.append((group, index, pattern))
+            continue
+
+        if pending:
+            for segment in _combine(start, pending, flags):
+                yield segment
+            pending = []
+
+        start = number
+        if combinable:
+            flags = pattern.flags
+            pending.append((group, index, pattern))
+        else:
+            logger.debug("Regexp {0} of {1} can not be combined".format(
+                index, group))
+            flags = None
+            start = number + 1
+            yield _Segment(number, [_Single(group, index, pattern)])
+
+    if pending:
+        for segment in _combine(start, pending, flags):
+            yield segment
+
+
+def _combine(start, patterns, flags):
+    """Combines *patterns* into a single regexp if possible"""
+    singles = [_Single(group, index, pattern)
+               for group, index, pattern in patterns]
+    if len(patterns) == 1:
+        yield _Segment(start, singles)
+        return
+
+    end = _end(flags)
+
+    parts = []
+    alternatives = dict()
+    for number, (group, index, pattern) in enumerate(patterns):
+        prefix = "_{0}".format(number)
+        names = [(name, "{0}_{1}".format(prefix, name))
+                 for name in pattern.groupindex]
+
+        parts.append("(?P<{0}>{1}{2})".format(
+            prefix, _rename(pattern.pattern, prefix), end))
+        alternatives[prefix] = (group, index, names)
+
+    try:
+        regexp = re.compile("(?:{0})".format("|".join(parts)), flags)
+    except (re.error, AssertionError, OverflowError) as error:
+        logger.debug("Unable to combine regexps: {0}".format(error))
+        for number, single in enumerate(singles):
+            yield _Segment(start + number, [single])
+        return
+
+    yield _Segment(start, singles, regexp, alternatives)
+
+
+def _rename(pattern, prefix):
+    """Prefixes the names of all named groups in *pattern*"""
+
+    def _callback(match):
+        """Renames a single group, leaving escaped characters alone"""
+        if match.group(1):
+            return "(?P<{0}_{1}>".format(prefix, match.group(1))
+        return match.group(0)
+
+    return _NAMED_GROUP.sub(_callback, pattern)
+
+
+def _combinable(pattern):
+    """
+    Checks that *pattern* can be embedded into a larger regexp. Back
+    references and conditionals depend on the numbering of the groups and
+    inline flags must be at the start of a regexp.
+    """
+    if not isinstance(pattern.pattern, str):
+        return False
+
+    #Parse the pattern the way it will be embedded, treating the warnings
+    #older versions give for misplaced inline flags as errors
+    embedded = "(?:|{0}{1})".format(pattern.pattern, _end(pattern.flags))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            parsed = sre_parse.parse(embedded, pattern.flags)
+    except Exception:  # pylint: disable=W0703
+        return False
+
+    for opcode, _ in _walk(parsed):
+        if opcode in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return False
+
+    return True
+
+
+def _end(flags):
+    """Comments in verbose regexps run to the end of the line"""
+    return "\n" if flags & re.VERBOSE else ""
+
+
+def _walk(parsed):
+    """Yields all (opcode, argument) pairs of a parsed regexp recursively"""
+    for opcode, argument in parsed:
+        yield opcode, argument
+
+        for item in _flatten(argument):
+            for pair in _walk(item):
+                yield pair
+
+
+def _flatten(argument):
+    """Finds the sub patterns in the argument of an opcode"""
+    if isinstance(argument, sre_parse.SubPattern):
+        yield argument
+    elif isinstance(argument, (tuple, list)):
+        for item in argument:
+            for sub in _flatten(item):
+                yield sub
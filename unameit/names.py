@@ -22,8 +22,18 @@ Module managing file names and file names related functions.
 import re
 import logging
 
+from unameit.utils import LRUCache
+
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
+#Patterns are compiled once, they are used for every file processed
+_SEPARATORS = re.compile(r'(?<!\d)[\._]|[\._]$|^[\._]')
+_WORDS = re.compile(r"[A-Za-z]+('[A-Za-z]+)?")
+
+#Shared cache used by normalize_cached and normalize_many unless the caller
+#provides its own
+_CACHE = LRUCache(maxsize=4096)
+
 
 def clean_name(name):
     """
@@ -34,10 +44,10 @@ def clean_name(name):
     within decimal numbers.
     """
 
-    new_name, num_subs = re.subn(r'(?<!\d)[\._]|[\._]$|^[\._]', ' ', name)
-    if num_subs:
+    new_name = _engine[0](name)
+    if logger.isEnabledFor(logging.DEBUG) and new_name != name:
         logger.debug("Changed string {0} => {1}".format(name, new_name))
-    return new_name.strip()
+    return new_name
 
 
 def capitalize(string):
@@ -51,6 +61,63 @@ def capitalize(string):
     :param string: The string to be capitalized
     :return: The capitalized string
     """
+    return _engine[1](string)
+
+
+def set_engine(name):
+    """
+    :param name: The name of the engine to use, one of :data:`ENGINES`
+    :raise: ValueError if the engine is unknown
+
+    Selects the implementation used by :func:`clean_name` and
+    :func:`capitalize`. The *regex* engine is built on regular expressions
+    while the *scan* engine does the same work using plain string operations
+    and a hand written scan over the words. Both produce identical results.
+    """
+    global _engine  # pylint: disable=W0603
+
+    try:
+        _engine = ENGINES[name]
+    except KeyError:
+        raise ValueError("Unknown engine {0}".format(name))
+
+    logger.debug("Using the {0} engine for names".format(name))
+
+
+def _clean_name_regex(name):
+    """Regular expression based implementation of :func:`clean_name`"""
+    return _SEPARATORS.sub(' ', name).strip()
+
+
+def _clean_name_scan(name):
+    """Single pass implementation of :func:`clean_name`"""
+    translated = name.replace('.', ' ').replace('_', ' ')
+    if translated == name:
+        return name.strip()
+
+    #Put back the separators following a digit, unless they are at the very
+    #start or end of the name (a trailing newline counts as the end)
+    last = len(name) - 1
+    if name.endswith('\n'):
+        last -= 1
+
+    chars = None
+    for separator in '._':
+        index = name.find(separator, 1)
+        while 0 < index < last:
+            if name[index - 1].isdecimal():
+                if chars is None:
+                    chars = list(translated)
+                chars[index] = separator
+            index = name.find(separator, index + 1)
+
+    if chars is not None:
+        translated = ''.join(chars)
+    return translated.strip()
+
+
+def _capitalize_regex(string):
+    """Regular expression based implementation of :func:`capitalize`"""
 
     def _callback(match_object):
         """
@@ -63,4 +130,111 @@ def capitalize(string):
         else:
             return group[0].upper() + group[1:].lower()
 
-    return re.sub(r"[A-Za-z]+('[A-Za-z]+)?", _callback, string)
+    return _WORDS.sub(_callback, string)
+
+
+def _capitalize_scan(string):
+    """Single pass implementation of :func:`capitalize`"""
+    parts = string.split(' ')
+
+    for index, part in enumerate(parts):
+        #Most parts are plain words, only scan the ones that are not
+        if part.isalpha() and part.isascii():
+            if not part.isupper():
+                parts[index] = part.capitalize()
+        elif part:
+            parts[index] = _capitalize_words(part)
+
+    return ' '.join(parts)
+
+
+def _capitalize_words(string):
+    """Scans *string* for words and capitalizes them one by one"""
+    parts = []
+    length = len(string)
+    index = 0
+
+    while index < length:
+        start = index
+        if string[index] not in _LETTERS:
+            #Copy everything up to the next word as is
+            while index < length and string[index] not in _LETTERS:
+                index += 1
+            parts.append(string[start:index])
+            continue
+
+        while index < length and string[index] in _LETTERS:
+            index += 1
+
+        #A word may contain a single apostrophe followed by more letters
+        if index + 1 < length and string[index] == "'" and \
+                string[index + 1] in _LETTERS:
+            index += 2
+            while index < length and string[index] in _LETTERS:
+                index += 1
+
+        word = string[start:index]
+        if word.isupper():
+            parts.append(word)
+        else:
+            parts.append(word.capitalize())
+
+    return ''.join(parts)
+
+
+_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+#: The available name engines, see :func:`set_engine`
+ENGINES = {
+    "regex": (_clean_name_regex, _capitalize_regex),
+    "scan": (_clean_name_scan, _capitalize_scan),
+}
+
+_engine = ENGINES["regex"]  # pylint: disable=C0103
+
+
+def normalize(name):
+    """
+    :param name: The name to normalize
+    :return: The cleaned and capitalized name
+
+    Shorthand for running :func:`clean_name` followed by :func:`capitalize`.
+    """
+    return capitalize(clean_name(name))
+
+
+def normalize_many(names, cache=None):
+    """
+    :param names: An iterable of names to normalize
+    :param cache: An optional :class:`unameit.utils.LRUCache` to use
+    :return: A generator yielding the normalized names in order
+
+    Normalizes each name in *names* as done by :func:`normalize`. Results are
+    kept in a bounded LRU cache so names that are seen repeatedly only cost a
+    lookup. If no cache is provided, a module wide cache is used. The hit and
+    miss counters of the cache can be inspected to see how effective it was.
+    """
+    if cache is None:
+        cache = _CACHE
+
+    for name in names:
+        yield normalize_cached(name, cache)
+
+
+def normalize_cached(name, cache=None):
+    """
+    :param name: The name to normalize
+    :param cache: An optional :class:`unameit.utils.LRUCache` to use
+    :return: The cleaned and capitalized name
+
+    Normalizes a single name as done by :func:`normalize_many`, sharing the
+    same cache.
+    """
+    if cache is None:
+        cache = _CACHE
+
+    result = cache.get(name)
+    if result is None:
+        result = capitalize(clean_name(name))
+        cache.set(name, result)
+    return result
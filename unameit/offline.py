@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A lookup backend answering from a local database, for hosts without
+network access.
+
+The database is filled from a dump of the metadata, see
+:meth:`OfflineBackend.load`. Dumps are either CSV files with a header and
+the columns *id*, *series*, *season*, *episode* and *title*, one row for
+each episode, or JSON files with a list of shows like::
+
+    [{"id": 79349, "name": "Dexter",
+      "episodes": [{"season": 1, "episode": 1, "title": "Dexter"}]}]
+
+Shows are found by their cleaned name, see :func:`unameit.lookup.normalize`,
+and episodes by the id of their show and their season and episode numbers.
+Both are indexed, so lookups take a fraction of a millisecond.
+"""
+
+import csv
+import io
+import json
+import logging
+import sqlite3
+import threading
+
+from unameit.lookup import Backend, MetadataError, normalize
+
+__all__ = ['OfflineBackend']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#The version of the layout of the tables, stored as the user_version
+_SCHEMA_VERSION = 1
+
+
+class OfflineBackend(Backend):
+    """
+    Looks up shows and episodes in a local sqlite database.
+
+    :param path: The path of the database, created if missing
+    :raise: :class:`unameit.lookup.MetadataError` if the database can not
+            be opened
+
+    The backend can be used from several threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            _prepare(self._db)
+        except sqlite3.Error as error:
+            raise MetadataError("Unable to open {0}: {1}".format(path, error))
+
+    def series(self, name):
+        """
+        :param name: The name of a show
+        :return: A dictionary with the *id* and the canonical *name* of the
+                 show, or None if it is not in the database
+        """
+        row = self._query("SELECT id, name FROM series WHERE key = ? "
+                          "ORDER BY id LIMIT 1", (normalize(name),))
+        return {"id": row[0][0], "name": row[0][1]} if row else None
+
+    def season(self, series, season):
+        """
+        :param series: The id of a show, see :meth:`series`
+        :param season: The season number
+        :return: A list of dictionaries with the *episode* number and the
+                 *title* of each episode of the season, or None if the
+                 season is not in the database
+        """
+        rows = self._query("SELECT episode, title FROM episodes WHERE "
+                           "series = ? AND season = ? ORDER BY episode",
+                           (series, season))
+        return [{"episode": episode, "title": title}
+                for episode, title in rows] or None
+
+    def episode(self, series, season, episode):
+        """
+        :param series: The id of a show, see :meth:`series`
+        :param season: The season number
+        :param episode: The episode number
+        :return: A dictionary with the *title* of the episode, or None if it
+                 is not in the database
+        """
+        row = self._query("SELECT title FROM episodes WHERE series = ? AND "
+                          "season = ? AND episode = ?",
+                          (series, season, episode))
+        return {"title": row[0][0]} if row else None
+
+    def names(self):
+        """
+        :return: The canonical names of all shows in the database
+        """
+        return [row[0] for row in self._query("SELECT name FROM series", ())]
+
+    def load(self, path):
+        """
+        Imports a dump into the database, replacing the shows already in
+        it that are also in the dump, along with all their episodes.
+        Episodes no longer in the dump are dropped.
+
+        :param path: The path of a CSV or JSON dump, told apart by the
+                     extension
+        :return: The number of shows and the number of episodes imported
+        :raise: :class:`unameit.lookup.MetadataError` if the dump can not
+                be read
+        """
+        try:
+            if path.lower().endswith(".json"):
+                shows, episodes = _read_json(path)
+            else:
+                shows, episodes = _read_csv(path)
+        except (IOError, OSError, ValueError, KeyError, TypeError) as error:
+            raise MetadataError("Unable to read {0}: {1}".format(path, error))
+
+        with self._lock:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO series (id, "
+                                     "name, key) VALUES (?, ?, ?)",
+                                     [(number, name, normalize(name))
+                                      for number, name in shows.items()])
+                self._db.executemany("DELETE FROM episodes WHERE series = ?",
+                                     [(number,) for number in shows])
+                self._db.executemany("INSERT OR REPLACE INTO episodes "
+                                     "(series, season, episode, title) "
+                                     "VALUES (?, ?, ?, ?)", episodes)
+
+        logger.info("Imported {0} shows and {1} episodes from {2}".format(
+            len(shows), len(episodes), path))
+        return len(shows), len(episodes)
+
+    def close(self):
+        """Closes the database"""
+        with self._lock:
+            self._db.close()
+
+    def _query(self, query, arguments):
+        """Returns all rows of a query"""
+        with self._lock:
+            return self._db.execute(query, arguments).fetchall()
+
+
+def _read_csv(path):
+    """Returns the shows by id and the episodes of a CSV dump"""
+    shows = dict()
+    episodes = list()
+    with io.open(path, newline="", encoding="utf-8") as stream:
+        for row in csv.DictReader(stream):
+            number = int(row["id"])
+            shows[number] = row["series"]
+            episodes.append((number, int(row["season"]), int(row["episode"]),
+                             row["title"]))
+    return shows, episodes
+
+
+def _read_json(path):
+    """Returns the shows by id and the episodes of a JSON dump"""
+    with io.open(path, encoding="utf-8") as stream:
+        dump = json.load(stream)
+
+    shows = dict()
+    episodes = list()
+    for show in dump:
+        number = int(show["id"])
+        shows[number] = show["name"]
+        episodes.extend((number, int(item["season"]), int(item["episode"]),
+                         item["title"]) for item in show.get("episodes", ()))
+    return shows, episodes
+
+
+def _prepare(db):
+    """Creates the tables of a new database. A database created by another
+    version is emptied, the dump must then be imported again"""
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version != _SCHEMA_VERSION:
+        if version:
+            logger.warning("The offline database was created by another "
+                           "version and has to be imported again")
+        db.execute("DROP TABLE IF EXISTS series")
+        db.execute("DROP TABLE IF EXISTS episodes")
+        db.execute("PRAGMA user_version = {0:d}".format(_SCHEMA_VERSION))
+
+    db.execute("CREATE TABLE IF NOT EXISTS series (id INTEGER PRIMARY KEY, "
+               "name TEXT, key TEXT)")
+    db.execute("CREATE INDEX IF NOT EXISTS series_key ON series (key)")
+    db.execute("CREATE TABLE IF NOT EXISTS episodes (series INTEGER, "
+               "season INTEGER, episode INTEGER, title TEXT, "
+               "PRIMARY KEY (series, season, episode))")
+    db.commit()
@@ -20,14 +20,18 @@ A module for managing the command line options passed by the user.
 """
 
 import logging
-import collections
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 from unameit.utils import Borg
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
 
-class Options(collections.Mapping, Borg):
+class Options(Mapping, Borg):
     """
     A dictionary like object for storing command-line options using the Borg
     pattern to share state across instances.
@@ -26,6 +26,8 @@ import os
 import tempfile
 
 from unameit import __NAME__, version
+from unameit.names import ENGINES
+from unameit.pipeline import QUEUE_SIZE
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
@@ -86,4 +88,114 @@ def get_parser():
             help="Add a config file to use. Can be specified multiple times "\
                  "to add more files. Can be an absolute or relative path.")
 
+        group.add_option("--config-cache", action="store",
+            dest="config_cache", metavar="FILE", default=None,
+            help="Cache the parsed config files in FILE. The cache is "\
+                 "refreshed whenever a config file changes.")
+
+    with ParserGroup(parser, "Scanning") as group:
+        group.add_option("--scan-workers", action="store", type="int",
+            dest="scan_workers", metavar="N", default=1,
+            help="The number of directories to list concurrently. Useful "\
+                 "for input directories on network mounts. "\
+                 "[default: %default]")
+
+    with ParserGroup(parser, "Renaming") as group:
+        group.add_option("-n", "--dry-run", action="store_true",
+            dest="dry_run", default=False,
+            help="Only log the renames, do not carry them out.")
+
+        group.add_option("-j", "--journal", action="store", dest="journal",
+            metavar="FILE", default=None,
+            help="Record all renames in FILE. An interrupted run is "\
+                 "resumed by the next run using the same journal.")
+
+        group.add_option("--undo", action="store_true", dest="undo",
+            default=False,
+            help="Rename the files of the last run recorded in the "\
+                 "journal back and exit.")
+
+    with ParserGroup(parser, "Daemon") as group:
+        group.add_option("-d", "--daemon", action="store_true",
+            dest="daemon", default=False,
+            help="Keep running and rename files as they show up in the "\
+                 "input directories.")
+
+        group.add_option("--settle", action="store", type="float",
+            dest="settle", metavar="SECONDS", default=5.0,
+            help="The number of seconds a file must stay unchanged before "\
+                 "it is renamed. [default: %default]")
+
+        group.add_option("--interval", action="store", type="float",
+            dest="interval", metavar="SECONDS", default=1.0,
+            help="The number of seconds between checks for new files. "\
+                 "[default: %default]")
+
+        group.add_option("--poll", action="store_true", dest="polling",
+            default=False,
+            help="Poll the input directories instead of using inotify.")
+
+    with ParserGroup(parser, "Pipeline") as group:
+        group.add_option("--match-processes", action="store", type="int",
+            dest="match_processes", metavar="N", default=0,
+            help="The number of processes matching file names. If 0, "\
+                 "names are matched in a thread. [default: %default]")
+
+        group.add_option("--place-workers", action="store", type="int",
+            dest="place_workers", metavar="N", default=1,
+            help="The number of files moved or linked concurrently. "\
+                 "[default: %default]")
+
+        group.add_option("--lookup-workers", action="store", type="int",
+            dest="lookup_workers", metavar="N", default=8,
+            help="The largest number of metadata lookups done "\
+                 "concurrently. Fewer are done while the service fails or "\
+                 "limits the rate of requests. [default: %default]")
+
+        group.add_option("--queue-size", action="store", type="int",
+            dest="queue_size", metavar="N", default=QUEUE_SIZE,
+            help="The maximum number of files waiting in front of each "\
+                 "stage. [default: %default]")
+
+    with ParserGroup(parser, "Metadata") as group:
+        group.add_option("--metadata-cache", action="store",
+            dest="metadata_cache", metavar="FILE", default=None,
+            help="Keep looked up show names and episode titles in FILE "\
+                 "between runs. The names of the shows are also indexed "\
+                 "in FILE.trigrams, for finding shows by similar names.")
+
+        group.add_option("--cache-ttl", action="store", type="float",
+            dest="cache_ttl", metavar="DAYS", default=30.0,
+            help="The number of days looked up metadata is kept. "\
+                 "[default: %default]")
+
+        group.add_option("--negative-ttl", action="store", type="float",
+            dest="negative_ttl", metavar="DAYS", default=1.0,
+            help="The number of days shows and episodes that were not "\
+                 "found are remembered. [default: %default]")
+
+        group.add_option("--cache-size", action="store", type="int",
+            dest="cache_size", metavar="N", default=100000,
+            help="The maximum number of entries in the metadata cache. "\
+                 "[default: %default]")
+
+        group.add_option("--tvdb-key", action="store", dest="tvdb_key",
+            metavar="KEY", default=None,
+            help="The API key used for thetvdb.com lookups.")
+
+        group.add_option("--offline-db", action="store", dest="offline_db",
+            metavar="FILE", default=None,
+            help="The database used by groups with offline lookups.")
+
+        group.add_option("--import-metadata", action="store",
+            dest="import_metadata", metavar="DUMP", default=None,
+            help="Import a CSV or JSON dump of shows and episodes into the "\
+                 "offline database and exit. Requires --offline-db.")
+
+    with ParserGroup(parser, "Names") as group:
+        group.add_option("--name-engine", action="store", dest="name_engine",
+            type="choice", choices=sorted(ENGINES), default="regex",
+            help="The implementation used for cleaning and capitalizing "\
+                 "names. [default: %default]")
+
     return parser
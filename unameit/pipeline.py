@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for running work through a chain of stages.
+
+Each stage has its own pool of workers, threads for stages waiting on I/O
+or processes for stages that are CPU bound, and the stages are connected
+through bounded queues. A stage that falls behind fills its input queue,
+which blocks the stage before it, so the number of items in flight never
+grows beyond the size of the queues.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+
+import queue
+
+__all__ = ['Stage', 'Pipeline', 'QUEUE_SIZE']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#: The default maximum number of items waiting in front of each stage
+QUEUE_SIZE = 256
+
+#Tells the workers of a stage that there are no more items
+_DONE = object()
+
+
+class Stage(object):
+    """
+    A step of a :class:`Pipeline`.
+
+    :param name: The name of the stage, used when reporting
+    :param function: Called with each item, returns the result passed on to
+                     the next stage or None to drop the item
+    :param workers: The number of items handled concurrently
+    :param processes: If True, *function* is called in a pool of *workers*
+                      processes. The function, the items and the results
+                      must then be picklable
+    :param batch: If given, *function* is called with lists of up to
+                  *batch* items and returns an iterable of results instead.
+                  Items are always sent to processes in batches, see
+                  :data:`BATCH_SIZE`
+    :param initializer: Called with *initargs* when a process starts
+    :param initargs: The arguments for *initializer*
+    """
+
+    #: The number of items sent to a process at a time if *batch* is None
+    BATCH_SIZE = 64
+
+    def __init__(self, name, function, workers=1, processes=False, batch=None,
+                 initializer=None, initargs=()):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.processes = processes
+        self.batch = batch
+        self.initializer = initializer
+        self.initargs = initargs
+
+        #: The number of items taken, passed on and dropped, the time spent
+        #: by the workers and the largest and the summed size of the input
+        #: queue, sampled each time an item is taken
+        self.stats = {"taken": 0, "passed": 0, "dropped": 0, "busy": 0.0,
+                      "max_depth": 0, "depth": 0, "samples": 0}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Stage {0}>".format(self.name)
+
+    def _sample(self, taken, depth):
+        """Records the items taken and the depth of the input queue"""
+        with self._lock:
+            self.stats["taken"] += taken
+            self.stats["samples"] += 1
+            self.stats["depth"] += depth
+            self.stats["max_depth"] = max(self.stats["max_depth"], depth)
+
+    def _record(self, passed, dropped, busy):
+        """Records the outcome of a call"""
+        with self._lock:
+            self.stats["passed"] += passed
+            self.stats["dropped"] += dropped
+            self.stats["busy"] += busy
+
+
+class Pipeline(object):
+    """
+    Runs items through a list of stages.
+
+    :param stages: A list of :class:`Stage` objects, in order
+    :param queue_size: The maximum number of items waiting in front of each
+                       stage
+    :param fatal: A tuple of exception types that stop the pipeline
+
+    Results are produced as they are ready, so their order is only kept if
+    every stage has a single worker. Items raising an exception are logged
+    and dropped, unless the exception is one of *fatal*. The first such
+    exception stops the pipeline and is raised by :meth:`run`. The threads
+    of a run have all ended by the time :meth:`run` returns or raises.
+    """
+
+    def __init__(self, stages, queue_size=QUEUE_SIZE, fatal=()):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.fatal = tuple(fatal)
+        self.elapsed = 0.0
+        #: The number of items produced by the source
+        self.produced = 0
+        self._error = None
+        self._stopped = threading.Event()
+
+    def run(self, items):
+        """
+        :param items: An iterable of items for the first stage, consumed in
+                      a separate thread
+        :return: A generator yielding the results of the last stage
+        """
+        start = time.time()
+        self._error = None
+        self._stopped.clear()
+        queues = [queue.Queue(self.queue_size)
+                  for _ in range(len(self.stages) + 1)]
+        pools = [_pool(stage) for stage in self.stages]
+        threads = [_thread(self._feed, items, queues[0],
+                           self.stages[0].workers if self.stages else 1)]
+
+        for index, stage in enumerate(self.stages):
+            following = self.stages[index + 1].workers \
+                if index + 1 < len(self.stages) else 1
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                threads.append(_thread(self._work, stage, pools[index],
+                                       queues[index], queues[index + 1],
+                                       remaining, following, queues[-1]))
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self._stop(queues, threads)
+            for pool in pools:
+                if pool is None:
+                    continue
+                if self._error is None:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+            self.elapsed = time.time() - start
+
+        if self._error is not None:
+            raise self._error
+
+    def log_stats(self):
+        """Logs the throughput and queue depth of each stage"""
+        elapsed = self.elapsed or 1e-9
+        logger.info("Source produced {0} items in {1:.2f} s".format(
+            self.produced, self.elapsed))
+        for stage in self.stages:
+            stats = stage.stats
+            logger.info("Stage {0}: {1} in, {2} out, {3} dropped, "
+                        "{4:.1f} items/s, busy {5:.2f} s, queue depth "
+                        "{6:.1f} average, {7} max".format(
+                            stage.name, stats["taken"], stats["passed"],
+                            stats["dropped"], stats["taken"] / elapsed,
+                            stats["busy"],
+                            stats["depth"] / float(stats["samples"] or 1),
+                            stats["max_depth"]))
+
+    def _work(self, stage, pool, source, output, remaining, following,
+              results):
+        """
+        The loop of a worker, taking items from *source* and putting the
+        results in *output*. The last worker of a stage to finish passes on
+        one end marker for each worker of the following stage. A fatal error
+        ends the results right away.
+        """
+        size = stage.batch or (Stage.BATCH_SIZE if pool is not None else None)
+
+        while self._error is None and not self._stopped.is_set():
+            items, done = _take(source, size)
+            if items:
+                stage._sample(len(items), source.qsize())
+                try:
+                    _call(stage, pool, items, output, self.fatal)
+                except self.fatal as error:
+                    logger.error("Stage {0} stopped the pipeline: {1}".
+                    format(stage.name, error))
+                    self._error = error
+                    results.put(_DONE)
+                    return
+
+            if done:
+                break
+
+        with stage._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+
+        if last:
+            for _ in range(following):
+                output.put(_DONE)
+
+    def _feed(self, items, output, workers):
+        """Puts the items in the first queue, followed by one end marker
+        for each worker of the first stage"""
+        try:
+            for item in items:
+                if self._stopped.is_set():
+                    break
+                self.produced += 1
+                output.put(item)
+        except Exception:  # pylint: disable=W0703
+            logger.exception("Stopped reading items")
+        finally:
+            for _ in range(workers):
+                output.put(_DONE)
+
+    def _stop(self, queues, threads):
+        """
+        Waits for the threads of a run to end. If the run was cut short,
+        threads blocked on a full queue or waiting for items that will never
+        come are released by emptying the queues and putting end markers in
+        them until all threads have seen that the run is stopped.
+        """
+        self._stopped.set()
+        while True:
+            for thread in threads:
+                thread.join(0.01)
+            if not any(thread.is_alive() for thread in threads):
+                return
+
+            for items in queues:
+                try:
+                    while True:
+                        items.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    items.put_nowait(_DONE)
+                except queue.Full:
+                    pass
+
+
+def _thread(target, *args):
+    """Starts a daemon thread"""
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _pool(stage):
+    """Creates the process pool of a stage, if it uses processes"""
+    if not stage.processes:
+        return None
+    return multiprocessing.Pool(stage.workers, stage.initializer,
+                                stage.initargs)
+
+
+def _take(source, size):
+    """
+    Takes a single item from *source*, or if *size* is given, up to *size*
+    items without waiting for more once the first has arrived. Returns the
+    items and True if the end marker was seen
+    """
+    item = source.get()
+    if item is _DONE:
+        return [], True
+    if size is None:
+        return [item], False
+
+    items = [item]
+    while len(items) < size:
+        try:
+            item = source.get_nowait()
+        except queue.Empty:
+            break
+        if item is _DONE:
+            return items, True
+        items.append(item)
+    return items, False
+
+
+def _call(stage, pool, items, output, fatal):
+    """Calls the function of a stage and passes on the results"""
+    start = time.time()
+    try:
+        if pool is not None and stage.batch:
+            results = pool.apply(_apply_batch, (stage.function, items))
+        elif pool is not None:
+            results = pool.apply(_apply_each, (stage.function, items, fatal))
+        elif stage.batch:
+            results = list(stage.function(items))
+        else:
+            results = [stage.function(items[0])]
+    except fatal:
+        raise
+    except Exception:  # pylint: disable=W0703
+        logger.exception("Stage {0} failed on {1} items".format(stage.name,
+                                                               len(items)))
+        results = []
+
+    passed = [result for result in results if result is not None]
+    stage._record(len(passed), len(items) - len(passed), time.time() - start)
+
+    for result in passed:
+        output.put(result)
+
+
+def _apply_batch(function, items):
+    """Calls *function* with a batch of items, in a worker process"""
+    return list(function(items))
+
+
+def _apply_each(function, items, fatal):
+    """Calls *function* with each item, in a worker process. Items raising
+    an exception other than one of *fatal* are logged and dropped"""
+    results = []
+    for item in items:
+        try:
+            results.append(function(item))
+        except fatal:
+            raise
+        except Exception:  # pylint: disable=W0703
+            logger.exception("Failed on {0}".format(item))
+    return results
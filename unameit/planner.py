@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for working out where a file should go and for putting it there.
+"""
+
+import errno
+import logging
+import os
+
+from unameit import filesystem
+from unameit.lookup import MetadataError, normalize
+
+__all__ = ['Plan', 'CollisionError', 'plan', 'enrich', 'enrich_all',
+           'execute', 'targets', 'init_process', 'plan_path', 'COLLISIONS']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#: The ways to handle a target that already exists
+COLLISIONS = ("skip", "suffix", "fail")
+
+#The number of suffixed names tried before giving up
+_MAX_SUFFIX = 1000
+
+#The groups used by plan_path in a worker process
+_GROUPS = None
+
+
+class CollisionError(Exception):
+    """Raised if a target exists and the collision policy is *fail*"""
+
+
+class Plan(object):
+    """
+    A planned rename of a file.
+
+    :ivar source: The current path of the file
+    :ivar target: The new path of the file
+    :ivar group: The :class:`unameit.configuration.Group` of the file
+    :ivar match: The :class:`unameit.matcher.Match` of the file name
+    :ivar mode: How the file is placed at the target, see
+                :data:`unameit.filesystem.MODES`
+    :ivar collision: What to do if the target exists, see
+                     :data:`COLLISIONS`
+    """
+
+    def __init__(self, source, target, group, match, mode="move",
+                 collision="skip"):
+        self.source = source
+        self.target = target
+        self.group = group
+        self.match = match
+        self.mode = mode
+        self.collision = collision
+
+    def __repr__(self):
+        return "<Plan {0} => {1}>".format(self.source, self.target)
+
+
+def plan(groups, path):
+    """
+    :param groups: A :class:`unameit.configuration.Groups` collection
+    :param path: The path of the file to plan
+    :return: A :class:`Plan` or None
+
+    Finds the group of the file at *path* and renders its new name. The
+    groups whose input directory holds the file are tried in turn, starting
+    with the most specific one. Returns None if no group recognizes the
+    file.
+    """
+    name = os.path.basename(path)
+
+    for group in groups.router.route(path):
+        if not group.accepts(name):
+            continue
+
+        match = groups.matcher.parse(name, group)
+        if match is None:
+            continue
+
+        output = getattr(group, "output", None)
+        if not output:
+            logger.warning("{0} has no output directory, {1} is left as is".
+            format(group, path))
+            return None
+
+        target = _render(group, match.fields, path)
+        if target is None:
+            return None
+
+        return Plan(path, target, group, match, group.placement,
+                    group.collision)
+
+    logger.info("No group recognized {0}".format(path))
+    return None
+
+
+def enrich(rename, lookup):
+    """
+    :param rename: A :class:`Plan`
+    :param lookup: A :class:`unameit.lookup.Lookup`
+    :return: *rename*
+
+    Looks up the canonical name of the show and the titles of the episodes
+    of a planned rename and renders its target again with them, so they can
+    be used in the format of the group. If the show or an episode is not
+    found, or the lookup fails, the plan is left as it is.
+    """
+    return enrich_all([rename], lambda group: lookup)[0]
+
+
+def enrich_all(renames, lookups):
+    """
+    :param renames: A list of :class:`Plan` objects
+    :param lookups: A function returning the
+                    :class:`unameit.lookup.Lookup` of a group, or None if
+                    the group does not use lookups
+    :return: *renames*
+
+    Like :func:`enrich`, but the renames are grouped by show and season
+    first and each season is looked up once, with all its episodes.
+    """
+    seasons = dict()
+    for rename in renames:
+        match = rename.match
+        if not match.show or match.season is None or not match.episodes:
+            continue
+        lookup = lookups(rename.group)
+        if lookup is not None:
+            seasons.setdefault((lookup, normalize(match.show),
+                                int(match.season)), []).append(rename)
+
+    for (lookup, _, season), group in seasons.items():
+        show = group[0].match.show
+        try:
+            table = lookup.season(show, season, sum(
+                len(rename.match.episodes) for rename in group))
+        except MetadataError as error:
+            logger.warning("Unable to look up season {0} of {1}: {2}".format(
+                season, show, error))
+            continue
+
+        titles = table["titles"] if table else dict()
+        for rename in group:
+            found = [titles.get(int(episode))
+                     for episode in rename.match.episodes]
+            if None in found:
+                logger.info("No metadata found for {0}".format(rename.source))
+            else:
+                _retitle(rename, table["series"], found)
+
+    return renames
+
+
+def _retitle(rename, series, titles):
+    """Renders the target of *rename* again with the canonical name of the
+    show and the titles of the episodes"""
+    match = rename.match
+    fields = dict(match.fields, series=series, title=" & ".join(titles))
+    target = _render(rename.group, fields, rename.source)
+    if target is not None:
+        match.fields = fields
+        rename.target = target
+
+    return rename
+
+
+def _render(group, fields, path):
+    """Renders the target of the file at *path*, returns None on errors"""
+    fields = dict(fields, ext=os.path.splitext(path)[1])
+
+    try:
+        target = group.renderer.render(fields)
+    except (KeyError, ValueError, TypeError) as error:
+        logger.warning("Unable to render a name for {0}: {1}".
+        format(path, error))
+        return None
+
+    return os.path.join(group.output, target)
+
+
+def init_process(groups):
+    """
+    :param groups: A :class:`unameit.configuration.Groups` collection
+
+    Prepares a worker process for :func:`plan_path`.
+    """
+    global _GROUPS  # pylint: disable=W0603
+    _GROUPS = groups
+
+
+def plan_path(path):
+    """
+    :param path: The path of the file to plan
+    :return: A :class:`Plan` or None
+
+    Plans a file in a worker process, using the groups passed to
+    :func:`init_process`, see :func:`plan`.
+    """
+    return plan(_GROUPS, path)
+
+
+def execute(rename):
+    """
+    :param rename: The :class:`Plan` to carry out
+    :return: True if the file was placed at its target
+    :raise: :class:`CollisionError`
+
+    Moves or links the file to its target, creating any missing
+    directories, see :func:`unameit.filesystem.place`. Files are never
+    overwritten. If the target exists, the collision policy of the plan
+    decides what happens:
+
+    * *skip* leaves the file as is
+    * *suffix* places the file at the first free name with a number added,
+      like "Show - S01E01 (1).avi", and updates the target of the plan
+    * *fail* raises :class:`CollisionError`
+
+    The mode of the plan is updated if the file had to be copied instead.
+    """
+    if os.path.abspath(rename.source) == os.path.abspath(rename.target):
+        logger.debug("{0} is already named correctly".format(rename.source))
+        return False
+
+    directory = os.path.dirname(rename.target)
+    paths = targets(rename.target, rename.collision == "suffix")
+
+    try:
+        if directory:
+            #Other workers may be creating the same directory
+            os.makedirs(directory, exist_ok=True)
+
+        for target in paths:
+            try:
+                mode = filesystem.place(rename.source, target, rename.mode)
+                break
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+        else:
+            if rename.collision == "fail":
+                raise CollisionError("{0} already exists".format(
+                    rename.target))
+            logger.warning("{0} already exists, {1} is left as is".
+            format(rename.target, rename.source))
+            return False
+    except OSError as error:
+        logger.error("Unable to {0} {1}: {2}".format(rename.mode,
+                                                     rename.source, error))
+        return False
+
+    rename.target = target
+    rename.mode = mode
+
+    if mode == "move":
+        logger.info("Renamed {0} => {1}".format(rename.source, rename.target))
+    else:
+        logger.info("Placed {0} => {1} ({2})".format(rename.source,
+                                                     rename.target, mode))
+    return True
+
+
+def targets(target, suffix):
+    """
+    :param target: The planned target of a file
+    :param suffix: True if suffixed names are tried when the target is
+                   taken
+    :return: A generator of the paths tried by :func:`execute`, in order
+    """
+    yield target
+
+    if suffix:
+        root, ext = os.path.splitext(target)
+        for number in range(1, _MAX_SUFFIX):
+            yield "{0} ({1}){2}".format(root, number, ext)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for quickly ruling out regexps that can not match a file name.
+
+The literal strings every match of a regexp must contain are extracted when
+the regexps are loaded. All literals are then searched for in a single pass
+over the file name using an Aho-Corasick automaton and only the regexps
+whose literals were all found need to be evaluated.
+
+Literals are compared case insensitively, which makes the check a
+necessary, but not sufficient, condition for both case sensitive and case
+insensitive regexps.
+"""
+
+import logging
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse  # pylint: disable=F0401
+
+__all__ = ['required_literals', 'AhoCorasick', 'Prefilter']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#Non ASCII characters matching ASCII letters when ignoring case
+_FOLD = {0x130: u"i", 0x131: u"i", 0x17f: u"s", 0x212a: u"k"}
+
+#Opcodes whose content has to be matched at least once
+_REQUIRED = (sre_parse.SUBPATTERN, getattr(sre_parse, "ATOMIC_GROUP", None))
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+            getattr(sre_parse, "POSSESSIVE_REPEAT", None))
+
+
+def fold(string):
+    """
+    :param string: The string to fold
+    :return: The string in the form used when searching for literals
+    """
+    return string.translate(_FOLD).lower()
+
+
+def required_literals(pattern):
+    """
+    :param pattern: A compiled regexp
+    :return: A set of strings
+
+    Returns the literal strings that any match of *pattern* has to contain.
+    Only ASCII literals are considered and they are returned folded, see
+    :func:`fold`. The set is empty if nothing could be extracted.
+    """
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:  # pylint: disable=W0703
+        return set()
+
+    literals = set()
+    _collect(parsed, literals)
+    return literals
+
+
+def _collect(parsed, literals):
+    """Adds the runs of required literals found in *parsed* to *literals*"""
+    run = []
+
+    for opcode, argument in parsed:
+        if opcode is sre_parse.LITERAL and argument < 128:
+            run.append(chr(argument))
+            continue
+
+        if run:
+            literals.add(fold(u"".join(run)))
+            run = []
+
+        if opcode in _REQUIRED:
+            #Groups hold their content last in the argument
+            _collect(argument[-1] if opcode is sre_parse.SUBPATTERN
+                     else argument, literals)
+        elif opcode in _REPEATS and argument[0] >= 1:
+            _collect(argument[2], literals)
+
+    if run:
+        literals.add(fold(u"".join(run)))
+
+
+class AhoCorasick(object):
+    """
+    An Aho-Corasick automaton finding which of a set of words occur in a
+    string in a single pass.
+
+    :param words: An iterable of non empty strings
+    """
+
+    def __init__(self, words):
+        self.words = list(words)
+        self._goto = [dict()]
+        self._fail = [0]
+
+        outputs = [set()]
+        for number, word in enumerate(self.words):
+            state = 0
+            for char in word:
+                if char not in self._goto[state]:
+                    self._goto.append(dict())
+                    self._fail.append(0)
+                    outputs.append(set())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            outputs[state].add(number)
+
+        #Breadth first construction of the failure links
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, target in self._goto[state].items():
+                queue.append(target)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+
+                self._fail[target] = fail if fail != target else 0
+                outputs[target] |= outputs[self._fail[target]]
+
+        self._output = [frozenset(output) for output in outputs]
+
+    def search(self, text):
+        """
+        :param text: The string to search
+        :return: A set with the indexes of the words found in *text*
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+
+        return found
+
+
+class Prefilter(object):
+    """
+    Tells which of a list of regexps could possibly match a string.
+
+    :param patterns: A list of compiled regexps
+
+    Only the longest required literal of each regexp is searched for, it is
+    usually the most selective one, such as the name of a show.
+    """
+
+    def __init__(self, patterns):
+        words = dict()
+        self._users = dict()
+        self._always = []
+
+        for number, pattern in enumerate(patterns):
+            literals = required_literals(pattern)
+            if not literals:
+                self._always.append(number)
+                continue
+
+            literal = max(sorted(literals), key=len)
+            index = words.setdefault(literal, len(words))
+            self._users.setdefault(index, []).append(number)
+
+        self._automaton = AhoCorasick(sorted(words, key=words.get))
+
+        logger.debug("Prefilter with {0} literals for {1} regexps, {2} "
+                     "without literals".format(len(words), len(patterns),
+                                               len(self._always)))
+
+    def viable(self, string):
+        """
+        :param string: The string to check
+        :return: A sorted list with the indexes of the possible regexps
+        """
+        found = self._automaton.search(fold(string))
+        if not found:
+            return self._always
+
+        result = list(self._always)
+        for index in found:
+            result.extend(self._users[index])
+        result.sort()
+        return result
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for finding the groups a file belongs to based on its path.
+
+The input directories of all groups are stored in a trie keyed on the path
+components, so finding the groups watching a file only costs one lookup per
+directory level of the file, no matter how many groups there are.
+"""
+
+import logging
+import os
+
+__all__ = ['Router']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+
+class _Node(object):
+    """A node in the trie, holding the groups with the node as input"""
+
+    __slots__ = ("children", "groups")
+
+    def __init__(self):
+        self.children = dict()
+        self.groups = []
+
+
+class Router(object):
+    """
+    Routes files to the groups whose input directory they are found in.
+
+    :param groups: An iterable of :class:`unameit.configuration.Group`
+
+    Groups without an input directory are ignored.
+    """
+
+    def __init__(self, groups):
+        self._root = _Node()
+        self._inputs = []
+
+        for group in groups:
+            path = getattr(group, "input", None)
+            if not path:
+                continue
+
+            node = self._root
+            for component in _components(path):
+                node = node.children.setdefault(component, _Node())
+            node.groups.append(group)
+            self._inputs.append(_normalize(path))
+
+    def route(self, path):
+        """
+        :param path: The path of a file
+        :return: A list of groups, the most specific input directory first
+
+        Returns the groups whose input directory contains *path*. Groups
+        with nested input directories are all returned, starting with the
+        group with the deepest input directory.
+        """
+        candidates = list(self._root.groups)
+
+        node = self._root
+        for component in _components(path):
+            node = node.children.get(component)
+            if node is None:
+                break
+            candidates.extend(node.groups)
+
+        candidates.reverse()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Routing {0} to {1}".format(path, candidates))
+        return candidates
+
+    def roots(self):
+        """
+        :return: A sorted list of input directories
+
+        Returns the input directories not contained in the input directory
+        of another group. Scanning them is enough to find all files of all
+        groups exactly once.
+        """
+        roots = []
+        #Sorting on the components keeps directories next to their children
+        for path in sorted(set(self._inputs), key=_components):
+            if roots and _contains(roots[-1], path):
+                continue
+            roots.append(path)
+        return roots
+
+
+def _normalize(path):
+    """Returns the absolute, normalized form of *path*"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _components(path):
+    """Splits *path* into its components"""
+    drive, path = os.path.splitdrive(_normalize(path))
+    components = [component for component in path.split(os.sep) if component]
+    if drive:
+        components.insert(0, drive)
+    return components
+
+
+def _contains(directory, path):
+    """Checks if *path* is *directory* or found below it"""
+    return path == directory or \
+        path.startswith(directory.rstrip(os.sep) + os.sep)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for finding the files to process in the input directories of the
+configuration groups.
+
+Directories are walked lazily so the first files are available as soon as
+the first directory has been listed.
+"""
+
+import logging
+import os
+import queue
+from multiprocessing.pool import ThreadPool
+from os import scandir
+
+__all__ = ['scan', 'parallel_scan', 'extension_filter']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+
+def scan(path, include=None, exclude=None, listdir=scandir, skip=None):
+    """
+    :param path: The directory to scan
+    :param include: Optional iterable of file extensions to include
+    :param exclude: Optional iterable of file extensions to exclude
+    :param listdir: The function used to list a directory
+    :param skip: Optional iterable of directories not to descend into
+    :return: A generator yielding a directory entry for each file found
+
+    Recursively walks *path* and yields the entries for all files found. The
+    entries are the ones returned by :func:`os.scandir`, so any stat data
+    already fetched while walking is reused by :meth:`stat`.
+
+    If *include* is given, only files with one of the given extensions are
+    yielded. Files with an extension in *exclude* are always skipped.
+    Extensions are matched case insensitively and may be given with or
+    without the leading dot.
+
+    Symbolic links to directories are not followed, nor are the
+    directories in *skip*.
+    """
+    include = _extensions(include)
+    exclude = _extensions(exclude)
+    skip = _directories(skip)
+
+    directories = [path]
+    while directories:
+        directory = directories.pop()
+
+        try:
+            entries = listdir(directory)
+        except OSError as error:
+            logger.warning("Unable to list {0}: {1}".format(directory, error))
+            continue
+
+        subdirectories = []
+        try:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not _skipped(entry.path, skip):
+                        subdirectories.append(entry.path)
+                elif entry.is_file() and \
+                        _accepted(entry.name, include, exclude):
+                    yield entry
+        finally:
+            #Release the directory handle even if the caller stops early
+            if hasattr(entries, "close"):
+                entries.close()
+
+        #Reversed to visit the subdirectories in the order they were listed
+        directories.extend(reversed(subdirectories))
+
+
+def parallel_scan(path, include=None, exclude=None, workers=8,
+                  ordered=False, listdir=scandir, skip=None):
+    """
+    :param path: The directory to scan
+    :param include: Optional iterable of file extensions to include
+    :param exclude: Optional iterable of file extensions to exclude
+    :param workers: The number of directories to list concurrently
+    :param ordered: If True, files are yielded in a deterministic order
+    :param listdir: The function used to list a directory
+    :param skip: Optional iterable of directories not to descend into
+    :return: A generator yielding a directory entry for each file found
+
+    Works like :func:`scan` but lists directories concurrently using a pool
+    of *workers* threads. This pays off on file systems where each listing
+    has a high latency, such as network mounts.
+
+    By default files are yielded in the order their directories finish
+    listing. If *ordered* is True, the files of a directory are yielded
+    sorted by name, followed by the contents of its subdirectories in name
+    order. Subdirectories are still listed ahead of time in the background.
+    """
+    include = _extensions(include)
+    exclude = _extensions(exclude)
+    skip = _directories(skip)
+
+    pool = ThreadPool(workers)
+    try:
+        if ordered:
+            listings = _ordered_listings(pool, path, listdir, skip)
+        else:
+            listings = _unordered_listings(pool, path, listdir, skip)
+
+        for files in listings:
+            for entry in files:
+                if _accepted(entry.name, include, exclude):
+                    yield entry
+    finally:
+        pool.terminate()
+
+
+def _ordered_listings(pool, path, listdir, skip):
+    """Yields the files of each directory in a depth first, sorted order"""
+    pending = [pool.apply_async(_list, (path, listdir, skip))]
+    while pending:
+        files, subdirectories = pending.pop().get()
+
+        #Start listing the subdirectories before handing over the files
+        subdirectories.sort(key=_name, reverse=True)
+        pending.extend(pool.apply_async(_list, (entry.path, listdir, skip))
+                       for entry in subdirectories)
+
+        files.sort(key=_name)
+        yield files
+
+
+def _unordered_listings(pool, path, listdir, skip):
+    """Yields the files of each directory as soon as it has been listed"""
+    results = queue.Queue()
+
+    def _submit(directory):
+        """Starts listing *directory* in the pool"""
+        pool.apply_async(_list, (directory, listdir, skip),
+                         callback=results.put, error_callback=results.put)
+
+    _submit(path)
+    pending = 1
+    while pending:
+        result = results.get()
+        pending -= 1
+
+        if isinstance(result, Exception):
+            raise result
+
+        files, subdirectories = result
+        for entry in subdirectories:
+            _submit(entry.path)
+        pending += len(subdirectories)
+
+        yield files
+
+
+def _list(directory, listdir, skip):
+    """Lists *directory*, returning a list of files and of subdirectories
+    not in *skip*"""
+    files = []
+    subdirectories = []
+
+    try:
+        entries = listdir(directory)
+    except OSError as error:
+        logger.warning("Unable to list {0}: {1}".format(directory, error))
+        return files, subdirectories
+
+    try:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not _skipped(entry.path, skip):
+                    subdirectories.append(entry)
+            elif entry.is_file():
+                files.append(entry)
+    finally:
+        if hasattr(entries, "close"):
+            entries.close()
+
+    return files, subdirectories
+
+
+def _directories(values):
+    """Returns the normalized absolute paths of the directories in
+    *values*"""
+    return frozenset(os.path.normcase(os.path.abspath(value))
+                     for value in values or ())
+
+
+def _skipped(path, skip):
+    """Checks if the directory *path* is one of the directories in *skip*"""
+    return bool(skip) and os.path.normcase(os.path.abspath(path)) in skip
+
+
+def _name(entry):
+    """Sort key for directory entries"""
+    return entry.name
+
+
+def extension_filter(group):
+    """
+    :param group: A :class:`unameit.configuration.Group`
+    :return: A function taking a file name, returning True if it is accepted
+
+    Creates a filter for file names from the *include* and *exclude* lists
+    of *group*, see :func:`scan`.
+    """
+    include = _extensions(getattr(group, "include", None))
+    exclude = _extensions(getattr(group, "exclude", None))
+
+    return lambda name: _accepted(name, include, exclude)
+
+
+def _extensions(values):
+    """Normalizes a list of extensions into a tuple usable with endswith"""
+    if not values:
+        return None
+
+    if isinstance(values, str):
+        values = [values]
+
+    return tuple(value.lower() if value.startswith(".") else
+                 "." + value.lower() for value in values)
+
+
+def _accepted(name, include, exclude):
+    """Checks a file name against the include and exclude extensions"""
+    name = name.lower()
+
+    if include is not None and not name.endswith(include):
+        return False
+    if exclude is not None and name.endswith(exclude):
+        return False
+    return True
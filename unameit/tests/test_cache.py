@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unameit import cache as cache_module
+from unameit.cache import MISS, MetadataCache, key
+
+
+class Clock(object):
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        super(TestMetadataCache, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "metadata.db")
+        self.clock = Clock()
+        self.cache = self.create()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.root)
+        super(TestMetadataCache, self).tearDown()
+
+    def create(self, **kwargs):
+        return MetadataCache(self.path, ttl=100, negative_ttl=10,
+                             clock=self.clock, **kwargs)
+
+    def test_get_set(self):
+        """Stored values should be returned until they expire"""
+        self.assertTrue(self.cache.get("dexter") is MISS)
+        self.cache.set("dexter", {"id": 1, "name": "Dexter"})
+        self.assertEqual(self.cache.get("dexter"), {"id": 1, "name": "Dexter"})
+
+        self.clock.now += 100
+        self.assertTrue(self.cache.get("dexter") is MISS)
+        self.assertEqual(self.cache.stats, {"hits": 1, "negative": 0,
+                                            "misses": 2, "expired": 1})
+
+    def test_negative(self):
+        """Lookups finding nothing should be cached for a shorter time"""
+        self.cache.set("unknown", None)
+        self.assertEqual(self.cache.get("unknown"), None)
+        self.assertEqual(self.cache.stats["negative"], 1)
+
+        self.clock.now += 10
+        self.assertTrue(self.cache.get("unknown") is MISS)
+
+    def test_values(self):
+        """Values should be listed by the start of their keys"""
+        self.cache.set(key("tvdb", "series", "dexter"), "Dexter")
+        self.cache.set(key("tvdb", "series", "lost"), "Lost")
+        self.cache.set(key("tvdb", "series", "unknown"), None)
+        self.cache.set(key("tvdb", "series", "old"), "Old", ttl=1)
+        self.cache.set(key("tvdb", "episode", "dexter", 1, 1), "Dexter")
+        self.clock.now += 1
+
+        self.assertEqual(sorted(self.cache.values(key("tvdb", "series", ""))),
+                         ["Dexter", "Lost"])
+        self.assertEqual(len(self.cache.values()), 3)
+
+    def test_ttl(self):
+        """Entries can have their own TTL"""
+        self.cache.set("short", 1, ttl=1)
+        self.clock.now += 1
+        self.assertTrue(self.cache.get("short") is MISS)
+
+    def test_persistent(self):
+        """Entries should be kept between instances"""
+        self.cache.set("dexter", [1, 2])
+        self.cache.close()
+
+        self.cache = self.create()
+        self.assertEqual(self.cache.get("dexter"), [1, 2])
+
+    def test_lru(self):
+        """The least recently used entries should be evicted"""
+        self.cache.close()
+        self.cache = self.create(size=3)
+
+        for name in "abcd":
+            self.cache.set(name, name)
+            self.clock.now += 1
+        self.cache.get("a")
+        self.clock.now += 1
+        self.cache.set("e", "e")
+        self.cache.close()
+
+        self.cache = self.create(size=3)
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual([self.cache.get(name) is not MISS
+                          for name in "abcde"],
+                         [True, False, False, True, True])
+
+    def test_evict_while_running(self):
+        """The size should be checked regularly while storing entries"""
+        evict_every = cache_module._EVICT_EVERY
+        cache_module._EVICT_EVERY = 2
+        try:
+            cache = MetadataCache(size=2, clock=self.clock)
+            for number in range(10):
+                cache.set(str(number), number)
+                self.clock.now += 1
+            self.assertEqual(len(cache), 2)
+            cache.close()
+        finally:
+            cache_module._EVICT_EVERY = evict_every
+
+    def test_hit_rate(self):
+        """The hit rate should count cached values and cached misses"""
+        self.assertEqual(self.cache.hit_rate(), 0.0)
+        self.cache.set("a", 1)
+        self.cache.set("b", None)
+        for name in "abc":
+            self.cache.get(name)
+        self.assertAlmostEqual(self.cache.hit_rate(), 2 / 3.0)
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
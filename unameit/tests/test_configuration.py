@@ -17,11 +17,20 @@
 
 from __future__ import with_statement
 
+import json
+import logging
+import pickle
 import unittest
+import shutil
 import sys
 import os
+import tempfile
+import yaml
 
-from unameit.configuration import _merge, _read_file, read, ConfigError
+from unameit import configuration
+from unameit.formatter import DEFAULT_FORMAT
+from unameit.configuration import _merge, _read_file, read, ConfigError, \
+    Group, Groups, _Layered
 
 
 class WorkingDir(object):
@@ -93,6 +102,54 @@ class TestMerge(unittest.TestCase):
         self.assertEqual(_merge(2, 5), 5)
         self.assertEqual(_merge("hello", "world"), "world")
 
+    def test_not_modified(self):
+        """The merged values should not be modified"""
+        d1 = {"a": {"b": [1, 2]}, "c": 3}
+        d2 = {"a": {"b": [2, 3], "d": 4}}
+
+        result = _merge(d1, d2)
+        self.assertEqual(result, {"a": {"b": [1, 2, 3], "d": 4}, "c": 3})
+        self.assertEqual(d1, {"a": {"b": [1, 2]}, "c": 3})
+        self.assertEqual(d2, {"a": {"b": [2, 3], "d": 4}})
+
+    def test_list_order(self):
+        """Merged lists should keep the order of the items"""
+        self.assertEqual(_merge([3, 1, 2], [2, 5, 4, 1]), [3, 1, 2, 5, 4])
+
+    def test_unhashable(self):
+        """It should be possible to merge lists of unhashable items"""
+        l1 = [{"a": 1}, [1, 2], "foo"]
+        l2 = [[1, 2], {"b": 2}, "foo"]
+
+        self.assertEqual(_merge(l1, l2), [{"a": 1}, [1, 2], "foo", {"b": 2}])
+
+    def test_mixed_types(self):
+        """Values of different kinds should override each other"""
+        self.assertEqual(_merge({"a": [1]}, {"a": 2}), {"a": 2})
+        self.assertEqual(_merge({"a": 1}, {"a": {"b": 2}}), {"a": {"b": 2}})
+
+
+class TestLayered(unittest.TestCase):
+    """Tests the lazily merged view over several dictionaries"""
+
+    def test_layers(self):
+        """Later layers should take precedence"""
+        layers = [{"a": 1, "b": {"c": [1]}}, {"b": {"c": [2], "d": 3}},
+                  {"a": 4}]
+        data = _Layered(layers)
+
+        self.assertEqual(data["a"], 4)
+        self.assertEqual(data["b"]["c"], [1, 2])
+        self.assertEqual(data["b"]["d"], 3)
+        self.assertEqual(sorted(data), ["a", "b"])
+        self.assertEqual(len(data), 2)
+        self.assertRaises(KeyError, data.__getitem__, "foo")
+
+    def test_override(self):
+        """Values of other kinds should hide earlier dictionaries"""
+        data = _Layered([{"a": {"b": 1}}, {"a": 2}, {"a": {"c": 3}}])
+        self.assertEqual(data["a"], {"c": 3})
+
 
 class TestReadFile(unittest.TestCase):
     """test the reading of a single file"""
@@ -128,6 +185,49 @@ class TestReadFile(unittest.TestCase):
         self.assertRaises(AssertionError, _read_file, "first_conf.cfg")
 
 
+class TestReadFilePureLoader(TestReadFile):
+    """test the reading of a single file with the pure python loader"""
+
+    def setUp(self):
+        super(TestReadFilePureLoader, self).setUp()
+        self._loader = configuration._Loader
+        configuration._Loader = yaml.SafeLoader
+
+    def tearDown(self):
+        configuration._Loader = self._loader
+        super(TestReadFilePureLoader, self).tearDown()
+
+    def test_same_result(self):
+        """Both loaders should give the same result"""
+        config = os.path.join(self.data_path, "first_conf.cfg")
+        data = _read_file(config)
+
+        configuration._Loader = self._loader
+        self.assertEqual(_read_file(config), data)
+
+    def test_error_position(self):
+        """Both loaders should report the position of errors"""
+        config = os.path.join(self.data_path, "invalid.cfg")
+        messages = []
+
+        class _Handler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        handler = _Handler()
+        configuration.logger.addHandler(handler)
+        try:
+            for loader in (yaml.SafeLoader, self._loader):
+                configuration._Loader = loader
+                self.assertRaises(ConfigError, _read_file, config)
+        finally:
+            configuration.logger.removeHandler(handler)
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0], messages[1])
+        self.assertTrue(messages[0].startswith("Problem found in"))
+
+
 class TestReadFiles(unittest.TestCase):
     """Tests the reading of multiple files"""
 
@@ -172,6 +272,183 @@ class TestReadFiles(unittest.TestCase):
             self.assertEqual(len(data), 1)
 
 
+class ParsedFilesTestCase(unittest.TestCase):
+    """Copies the sample config files and counts the files parsed"""
+
+    def setUp(self):
+        super(ParsedFilesTestCase, self).setUp()
+        data_path = os.path.join(os.path.dirname(__file__), "data")
+
+        self.tmp = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmp, "cache")
+        self.first = os.path.join(self.tmp, "first_conf.cfg")
+        self.second = os.path.join(self.tmp, "second_conf.cfg")
+        shutil.copy(os.path.join(data_path, "first_conf.cfg"), self.first)
+        shutil.copy(os.path.join(data_path, "second_conf.cfg"), self.second)
+
+        self.parsed = []
+        self._read_file = configuration._read_file
+
+        def _counting_read_file(path):
+            self.parsed.append(path)
+            return self._read_file(path)
+        configuration._read_file = _counting_read_file
+
+    def tearDown(self):
+        configuration._read_file = self._read_file
+        shutil.rmtree(self.tmp)
+        super(ParsedFilesTestCase, self).tearDown()
+
+
+class TestCache(ParsedFilesTestCase):
+    """Tests the caching of parsed config files"""
+
+    def _names(self, files):
+        """Reads the files using the cache, returning the group names"""
+        return sorted(repr(group) for group in read(files, self.cache))
+
+    def test_cached(self):
+        """Unchanged files should not be parsed again"""
+        first = self._names([self.first, self.second])
+        self.assertEqual(len(self.parsed), 2)
+
+        second = self._names([self.first, self.second])
+        self.assertEqual(len(self.parsed), 2)
+        self.assertEqual(first, second)
+
+    def test_changed(self):
+        """Changing a file should invalidate the cache"""
+        self._names([self.first, self.second])
+
+        with open(self.second, "a") as config:
+            config.write('\n"dexter":\n    language: "sv"\n')
+
+        self.assertEqual(self._names([self.first, self.second]),
+                         ["<Group The big bang theory>", "<Group dexter>"])
+        self.assertEqual(len(self.parsed), 4)
+
+    def test_added_removed(self):
+        """Adding or removing a file should invalidate the cache"""
+        os.rename(self.second, self.second + ".bak")
+        self.assertEqual(len(self._names([self.first, self.second])), 1)
+
+        os.rename(self.second + ".bak", self.second)
+        self.assertEqual(len(self._names([self.first, self.second])), 2)
+
+        os.remove(self.second)
+        self.assertEqual(len(self._names([self.first, self.second])), 1)
+        self.assertEqual(len(self.parsed), 4)
+
+    def test_corrupt(self):
+        """A corrupt cache should be ignored"""
+        with open(self.cache, "w") as cache:
+            cache.write("garbage")
+
+        self.assertEqual(len(self._names(self.first)), 1)
+        self.assertEqual(len(self._names(self.first)), 1)
+        self.assertEqual(len(self.parsed), 1)
+
+    def test_not_pickled(self):
+        """Pickled caches should never be loaded"""
+        marker = os.path.join(self.tmp, "loaded")
+        with open(self.cache, "wb") as cache:
+            pickle.dump(_Touch(marker), cache)
+
+        self.assertEqual(len(self._names(self.first)), 1)
+        self.assertFalse(os.path.exists(marker))
+        with open(self.cache, "rt") as cache:
+            self.assertEqual(json.load(cache)[0][0],
+                             configuration._CACHE_VERSION)
+
+
+class _Touch(object):
+    """Creates a file when unpickled"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, "w"))
+
+
+class TestConfiguration(ParsedFilesTestCase):
+    """Tests the reloading of changed config files"""
+
+    def setUp(self):
+        super(TestConfiguration, self).setUp()
+        self.config = configuration.Configuration([self.first, self.second])
+
+    def _append(self, path, text):
+        """Appends *text* to a file, making sure its state changes"""
+        with open(path, "a") as config:
+            config.write(text)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
+    def test_unchanged(self):
+        """Nothing should be parsed again if no file changed"""
+        groups = self.config.groups
+        self.assertEqual(self.config.changed(), [])
+        self.assertFalse(self.config.reload())
+        self.assertTrue(self.config.groups is groups)
+        self.assertEqual(len(self.parsed), 2)
+
+    def test_reload(self):
+        """Only the changed file should be parsed again and merged with
+        the other files"""
+        groups = self.config.groups
+        self._append(self.second, '\n"dexter":\n    language: "sv"\n')
+
+        self.assertEqual(self.config.changed(), [self.second])
+        self.assertTrue(self.config.reload())
+        self.assertEqual(self.parsed, [self.first, self.second, self.second])
+
+        self.assertEqual(self.config.groups["dexter"].output, "/home/foo/")
+        #The defaults still take precedence
+        self.assertEqual(self.config.groups["dexter"].language, "en")
+        self.assertEqual(self.config.groups.names(),
+                         ["dexter", "The big bang theory"])
+
+        #The previous groups are left as they were
+        self.assertEqual(groups.names(), ["dexter", "The big bang theory"])
+        self.assertFalse(self.config.groups is groups)
+
+    def test_cache(self):
+        """The cache should be used when loading and updated on reloads"""
+        files = [self.first, self.second]
+        configuration.Configuration(files, self.cache)
+        config = configuration.Configuration(files, self.cache)
+        self.assertEqual(len(self.parsed), 4)
+
+        self._append(self.second, '\n"dexter":\n    language: "sv"\n')
+        self.assertTrue(config.reload())
+        self.assertEqual(len(self.parsed), 5)
+
+        config = configuration.Configuration(files, self.cache)
+        self.assertEqual(len(self.parsed), 5)
+        self.assertEqual(config.groups["dexter"].output, "/home/foo/")
+
+    def test_added_removed(self):
+        """Removed files should be dropped and added files read"""
+        os.rename(self.second, self.second + ".bak")
+        self.assertTrue(self.config.reload())
+        self.assertEqual(self.config.groups.names(), ["dexter"])
+
+        os.rename(self.second + ".bak", self.second)
+        self.assertTrue(self.config.reload())
+        self.assertEqual(len(self.config.groups), 2)
+        self.assertEqual(len(self.parsed), 3)
+
+    def test_invalid(self):
+        """The groups should be kept if a changed file can not be parsed"""
+        groups = self.config.groups
+        self._append(self.first, "\n  - [\n")
+
+        self.assertFalse(self.config.reload())
+        self.assertTrue(self.config.groups is groups)
+        self.assertEqual(self.config.changed(), [self.first])
+
+
 class TestGroup(unittest.TestCase):
     def setUp(self):
         super(TestGroup, self).setUp()
@@ -202,6 +479,119 @@ class TestGroup(unittest.TestCase):
     def test_representation(self):
         """The group representation should be properly formatted"""
 
+    def test_patterns(self):
+        """The regexps of a group should be compiled"""
+        group = Group("foo", {"regexp": [r"^(?P<show>\w+) # comment"]})
+
+        self.assertEqual(len(group.patterns), 1)
+        self.assertEqual(group.patterns[0].match("Dexter").group("show"),
+                         "Dexter")
+        self.assertEqual(Group("bar", {}).patterns, tuple())
+
+    def test_invalid_pattern(self):
+        """Invalid regexps should raise ConfigError"""
+        self.assertRaises(ConfigError, Group, "foo", {"regexp": ["(foo"]})
+
+    def test_renderer(self):
+        """The format of a group should be compiled"""
+        group = Group("foo", {"format": "{show} {season}x{episode:02}"})
+        self.assertEqual(group.renderer.render({"show": "the.wire",
+                                                "season": "1",
+                                                "episode": "5"}),
+                         "The Wire 1x05")
+
+        self.assertEqual(Group("bar", {"format": ""}).renderer.template,
+                         DEFAULT_FORMAT)
+
+    def test_accepts(self):
+        """The extension filter of a group should be built once"""
+        group = Group("foo", {"include": ["avi", "mkv"], "exclude": ["mkv"]})
+        self.assertTrue(group.accepts("dexter.s01e01.AVI"))
+        self.assertFalse(group.accepts("dexter.s01e01.mkv"))
+        self.assertFalse(group.accepts("dexter.s01e01.srt"))
+        self.assertTrue(Group("bar", {}).accepts("dexter.s01e01.srt"))
+
+    def test_invalid_format(self):
+        """Invalid formats should raise ConfigError"""
+        self.assertRaises(ConfigError, Group, "foo", {"format": "{foo}"})
+        self.assertRaises(ConfigError, Group, "foo", {"format": "{show"})
+
+    def test_placement(self):
+        """The placement should default to move and be validated"""
+        self.assertEqual(Group("foo", {}).placement, "move")
+        self.assertEqual(Group("foo", {"placement": "reflink"}).placement,
+                         "reflink")
+        self.assertRaises(ConfigError, Group, "foo", {"placement": "copy"})
+        self.assertRaises(ConfigError, Group, "foo", {"placement": ["move"]})
+
+    def test_collision(self):
+        """The collision policy should default to skip and be validated"""
+        self.assertEqual(Group("foo", {}).collision, "skip")
+        self.assertEqual(Group("foo", {"collision": "suffix"}).collision,
+                         "suffix")
+        self.assertRaises(ConfigError, Group, "foo", {"collision": "replace"})
+
+    def test_lookup(self):
+        """The lookup backend should be optional and validated"""
+        self.assertEqual(Group("foo", {}).lookup, None)
+        self.assertEqual(Group("foo", {"lookup": "tvdb"}).lookup, "tvdb")
+        self.assertEqual(Group("foo", {"lookup": "offline"}).lookup,
+                         "offline")
+        self.assertRaises(ConfigError, Group, "foo", {"lookup": "imdb"})
+
+    def test_resolved_fields(self):
+        """Frequently used fields should be plain attributes"""
+        group = Group("foo", {"input": "/in", "output": "/out",
+                              "include": ["avi"]})
+
+        self.assertEqual(group.name, "foo")
+        self.assertEqual(group.input, "/in")
+        self.assertEqual(group.output, "/out")
+        self.assertEqual(group.include, ["avi"])
+        self.assertFalse(hasattr(group, "format"))
+        self.assertFalse(hasattr(group, "__dict__"))
+
+    def test_pickle(self):
+        """It should be possible to pickle a group"""
+        group = Group("foo", {"input": "/in", "regexp": [r"^(?P<show>\w+)"]})
+        copy = pickle.loads(pickle.dumps(group))
+
+        self.assertEqual((copy.name, copy.input), ("foo", "/in"))
+        self.assertEqual(copy.patterns, group.patterns)
+
+
+class TestGroups(unittest.TestCase):
+    def setUp(self):
+        super(TestGroups, self).setUp()
+        self.first = Group("first", {"input": "/first"})
+        self.second = Group("second", {"input": "/second"})
+        self.groups = Groups([self.first, self.second])
+
+    def test_sequence(self):
+        """Groups should be accessible by position"""
+        self.assertEqual(len(self.groups), 2)
+        self.assertEqual(self.groups[1], self.second)
+        self.assertEqual(list(self.groups), [self.first, self.second])
+
+    def test_names(self):
+        """Groups should be accessible by name"""
+        self.assertEqual(self.groups["first"], self.first)
+        self.assertEqual(self.groups.get("second"), self.second)
+        self.assertEqual(self.groups.get("third"), None)
+        self.assertRaises(KeyError, self.groups.__getitem__, "third")
+        self.assertEqual(self.groups.names(), ["first", "second"])
+
+    def test_contains(self):
+        """It should be possible to check for groups and names"""
+        self.assertTrue("first" in self.groups)
+        self.assertTrue(self.second in self.groups)
+        self.assertFalse("third" in self.groups)
+        self.assertFalse(Group("first", {}) in self.groups)
+
+    def test_matcher(self):
+        """The groups should come with a matcher"""
+        self.assertEqual(self.groups.matcher.match("foo"), None)
+
 
 #Run all tests
 if __name__ == "__main__":
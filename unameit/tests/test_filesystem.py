@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import ctypes
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unameit import filesystem
+from unameit.filesystem import copy, move, place, rename
+
+#Large enough to need several chunks
+DATA = os.urandom(1024 * 1024 + 17)
+
+
+class FileSystemTestCase(unittest.TestCase):
+    def setUp(self):
+        super(FileSystemTestCase, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "source.avi")
+        self.target = os.path.join(self.root, "target.avi")
+        with open(self.source, "wb") as stream:
+            stream.write(DATA)
+        os.chmod(self.source, 0o640)
+        os.utime(self.source, (1000000000, 1000000000))
+
+        self._chunk_size = filesystem.CHUNK_SIZE
+        self._methods = filesystem._METHODS
+        self._rename = filesystem._rename
+        self._modes = dict(filesystem.MODES)
+        self._renameat2 = filesystem._renameat2
+        filesystem.CHUNK_SIZE = 64 * 1024
+
+    def tearDown(self):
+        filesystem.CHUNK_SIZE = self._chunk_size
+        filesystem._METHODS = self._methods
+        filesystem._rename = self._rename
+        filesystem.MODES.update(self._modes)
+        filesystem._renameat2 = self._renameat2
+        shutil.rmtree(self.root)
+        super(FileSystemTestCase, self).tearDown()
+
+    def assertCopied(self):
+        with open(self.target, "rb") as stream:
+            self.assertEqual(stream.read(), DATA)
+
+        status = os.stat(self.target)
+        self.assertEqual(status.st_mode & 0o777, 0o640)
+        self.assertEqual(int(status.st_mtime), 1000000000)
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ["source.avi", "target.avi"])
+
+
+class TestCopy(FileSystemTestCase):
+    def test_methods(self):
+        """All available copy methods should copy the data and metadata"""
+        for name, function in self._methods:
+            filesystem._METHODS = [(name, function)]
+            self.assertEqual(copy(self.source, self.target), name)
+            self.assertCopied()
+            os.remove(self.target)
+
+    def test_fallback(self):
+        """Unsupported methods should fall back to the next one"""
+        def unsupported(infd, outfd, size):
+            raise OSError(errno.EXDEV, "Cross device")
+
+        filesystem._METHODS = [("broken", unsupported),
+                               ("chunked", filesystem._chunked)]
+        self.assertEqual(copy(self.source, self.target), "chunked")
+        self.assertCopied()
+
+    def test_short_copy(self):
+        """A copy with the wrong size should be removed"""
+        filesystem._METHODS = [("short", lambda infd, outfd, size:
+                                filesystem._chunked(infd, outfd, size - 1))]
+        self.assertRaises(OSError, copy, self.source, self.target)
+        self.assertEqual(os.listdir(self.root), ["source.avi"])
+
+
+class TestMove(FileSystemTestCase):
+    def test_rename(self):
+        """Files on the same device should be renamed"""
+        inode = os.stat(self.source).st_ino
+        move(self.source, self.target)
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(os.stat(self.target).st_ino, inode)
+
+    def test_cross_device(self):
+        """Files on another device should be copied and then removed"""
+        renamed = list()
+
+        def rename(source, target):
+            #Only the temporary copy is on the same device as the target
+            if source == self.source:
+                raise OSError(errno.EXDEV, "Cross device")
+            renamed.append(source)
+            self._rename(source, target)
+
+        filesystem._rename = rename
+        move(self.source, self.target)
+
+        self.assertEqual(len(renamed), 1)
+        self.assertEqual(os.listdir(self.root), ["target.avi"])
+        with open(self.target, "rb") as stream:
+            self.assertEqual(stream.read(), DATA)
+
+    def test_error(self):
+        """Other errors should be raised"""
+        self.assertRaises(OSError, move, self.source,
+                          os.path.join(self.root, "missing", "target.avi"))
+        self.assertTrue(os.path.exists(self.source))
+
+
+class TestPlace(FileSystemTestCase):
+    def assertKept(self):
+        with open(self.source, "rb") as stream:
+            self.assertEqual(stream.read(), DATA)
+        with open(self.target, "rb") as stream:
+            self.assertEqual(stream.read(), DATA)
+
+    def test_move(self):
+        """Moving should not keep the original"""
+        self.assertEqual(place(self.source, self.target), "move")
+        self.assertFalse(os.path.exists(self.source))
+
+    def test_hardlink(self):
+        """Hard links should share the inode of the original"""
+        self.assertEqual(place(self.source, self.target, "hardlink"),
+                         "hardlink")
+        self.assertKept()
+        self.assertEqual(os.stat(self.source).st_ino,
+                         os.stat(self.target).st_ino)
+
+    def test_symlink(self):
+        """Symbolic links should point to the absolute path"""
+        self.assertEqual(place(self.source, self.target, "symlink"),
+                         "symlink")
+        self.assertKept()
+        self.assertEqual(os.readlink(self.target), self.source)
+
+    def test_reflink(self):
+        """Reflinks should be copied if the file system lacks support"""
+        self.assertTrue(place(self.source, self.target, "reflink") in
+                        ("reflink", "copy"))
+        self.assertKept()
+        self.assertEqual(os.stat(self.target).st_mode & 0o777, 0o640)
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ["source.avi", "target.avi"])
+
+    def test_fallback(self):
+        """Unsupported links should be replaced by copies"""
+        def cross_device(source, target):
+            raise OSError(errno.EXDEV, "Cross device")
+
+        filesystem.MODES["hardlink"] = cross_device
+        self.assertEqual(place(self.source, self.target, "hardlink"),
+                         "copy")
+        self.assertKept()
+
+    def test_existing(self):
+        """Links should never replace existing files"""
+        open(self.target, "w").close()
+        for mode in ("hardlink", "symlink"):
+            self.assertRaises(OSError, place, self.source, self.target, mode)
+            self.assertEqual(os.path.getsize(self.target), 0)
+
+class TestRename(FileSystemTestCase):
+    def unsupported(self, *args):
+        """A renameat2 replacement for file systems lacking support"""
+        ctypes.set_errno(errno.EINVAL)
+        return -1
+
+    def check(self):
+        """Checks renaming with and without a file in the way"""
+        open(self.target, "w").close()
+        try:
+            rename(self.source, self.target)
+        except OSError as error:
+            self.assertEqual(error.errno, errno.EEXIST)
+        else:
+            self.fail("The target was replaced")
+        self.assertEqual(os.path.getsize(self.target), 0)
+        self.assertTrue(os.path.exists(self.source))
+
+        os.remove(self.target)
+        rename(self.source, self.target)
+        self.assertFalse(os.path.exists(self.source))
+        with open(self.target, "rb") as stream:
+            self.assertEqual(stream.read(), DATA)
+
+    def test_rename(self):
+        """Existing files should never be replaced"""
+        self.check()
+
+    def test_unsupported(self):
+        """File systems without renameat2 support should use links"""
+        filesystem._renameat2 = self.unsupported
+        self.check()
+
+    def test_no_links(self):
+        """Without renameat2 and links the target should be checked"""
+        filesystem._renameat2 = None
+        filesystem._NO_LINKS.add(errno.EEXIST)
+        try:
+            self.check()
+        finally:
+            filesystem._NO_LINKS.discard(errno.EEXIST)
+
+    def test_move(self):
+        """Moves should not replace existing files either"""
+        open(self.target, "w").close()
+        self.assertRaises(OSError, move, self.source, self.target)
+        self.assertRaises(OSError, copy, self.source, self.target)
+        self.assertEqual(os.path.getsize(self.target), 0)
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ["source.avi", "target.avi"])
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+
+from unameit import names
+from unameit.formatter import Renderer, DEFAULT_FORMAT, sanitize
+
+FIELDS = {"show": "how.i.met.your.mother", "season": "1", "episode": "02",
+          "ext": ".avi"}
+
+
+class TestRenderer(unittest.TestCase):
+    def test_default(self):
+        """The default format should pad the season and episode"""
+        self.assertEqual(Renderer(DEFAULT_FORMAT).render(FIELDS),
+                         "How I Met Your Mother - S01E02.avi")
+
+    def test_directories(self):
+        """Path separators in the format should be kept"""
+        renderer = Renderer("{show}/Season {season}/{episode:03}{ext}")
+        self.assertEqual(renderer.render(FIELDS),
+                         "How I Met Your Mother/Season 1/002.avi")
+
+    def test_sanitize(self):
+        """Characters not allowed in file names should be removed"""
+        fields = dict(FIELDS, title='Part 1/2: "The End"?')
+        self.assertEqual(Renderer("{title}").render(fields),
+                         "Part 12 The End")
+        self.assertEqual(sanitize(" a\tb|c "), "abc")
+
+    def test_cached_show(self):
+        """Show names should be normalized through the shared cache"""
+        cache = names._CACHE  # pylint: disable=W0212
+        fields = dict(FIELDS, show="cached.show.name")
+        misses = cache.misses
+        for _ in range(2):
+            self.assertEqual(Renderer("{show}").render(fields),
+                             "Cached Show Name")
+        self.assertEqual(cache.misses, misses + 1)
+
+    def test_missing_number(self):
+        """Numbers that were not found should be left out or rejected"""
+        fields = dict(FIELDS, episodes=("02", None))
+        self.assertEqual(Renderer("{episode:02}").render(fields), "02")
+        self.assertRaises(ValueError, Renderer("{season}").render,
+                          dict(FIELDS, season=None))
+
+    def test_optional(self):
+        """A missing title should render as empty"""
+        self.assertEqual(Renderer("{show} - {title}").render(FIELDS),
+                         "How I Met Your Mother - ")
+
+    def test_episodes(self):
+        """All episodes of multi episode files should be rendered"""
+        fields = dict(FIELDS, episodes=("02", "03"))
+        self.assertEqual(Renderer("E{episode:02}").render(fields), "E02-03")
+
+    def test_invalid(self):
+        """Invalid formats should be rejected when compiled"""
+        for template in ["{foo}", "{show!r}", "{season:s}", "{show",
+                         "{}", "{0}", "{show.upper}"]:
+            self.assertRaises(ValueError, Renderer, template)
+
+    def test_missing(self):
+        """Rendering without a required field should raise KeyError"""
+        self.assertRaises(KeyError, Renderer("{season}").render, {})
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unameit.journal import Journal
+from unameit.planner import Plan, execute
+
+
+class CountingJournal(Journal):
+    """A journal counting the number of syncs"""
+
+    syncs = 0
+
+    def sync(self):
+        self.syncs += 1
+        super(CountingJournal, self).sync()
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "journal")
+        self.plans = list()
+        for index in range(5):
+            source = os.path.join(self.root, "in", "{0}.avi".format(index))
+            target = os.path.join(self.root, "out", "{0}.avi".format(index))
+            if not os.path.isdir(os.path.dirname(source)):
+                os.makedirs(os.path.dirname(source))
+            open(source, "w").close()
+            self.plans.append(Plan(source, target, None, None))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(TestJournal, self).tearDown()
+
+    def records(self):
+        """Returns the records of the journal"""
+        with open(self.path) as stream:
+            return [json.loads(line) for line in stream]
+
+    def assertRenamed(self, plans):
+        for rename in plans:
+            self.assertFalse(os.path.exists(rename.source))
+            self.assertTrue(os.path.exists(rename.target))
+
+    def assertNotRenamed(self, plans):
+        for rename in plans:
+            self.assertTrue(os.path.exists(rename.source))
+            self.assertFalse(os.path.exists(rename.target))
+
+    def test_record(self):
+        """Plans should be recorded before the renames, one sync for each
+        batch"""
+        with CountingJournal(self.path, batch=2) as journal:
+            journal.begin(execute)
+            self.assertEqual(journal.record(self.plans, execute), 5)
+            self.assertEqual(journal.syncs, 3)
+            journal.end()
+
+        self.assertRenamed(self.plans)
+
+        ops = [record["op"] for record in self.records()]
+        self.assertEqual(ops, ["begin"] + ["plan", "plan", "done", "done"] * 2
+                         + ["plan", "done", "end"])
+
+    def test_resume(self):
+        """An interrupted run should be completed by the next run"""
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            #Crash after the first rename, before recording it
+            journal.record(self.plans, lambda rename: False)
+            execute(self.plans[0])
+
+        with Journal(self.path) as journal:
+            executed = list()
+            journal.begin(lambda rename: executed.append(rename.source) or
+                          execute(rename))
+            self.assertEqual(executed, [rename.source for rename in
+                                        self.plans[1:]])
+            journal.end()
+
+        self.assertRenamed(self.plans)
+        records = self.records()
+        self.assertEqual(len(set(record["run"] for record in records)), 1)
+        self.assertEqual(len([record for record in records
+                              if record["op"] == "done"]), 5)
+
+    def test_undo(self):
+        """Undo should rename the files of the last run back"""
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans[:2], execute)
+            journal.end()
+
+            journal.begin(execute)
+            journal.record(self.plans[2:], execute)
+            journal.end()
+
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 3)
+        self.assertRenamed(self.plans[:2])
+        self.assertNotRenamed(self.plans[2:])
+
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 2)
+            self.assertEqual(journal.undo(execute), 0)
+        self.assertNotRenamed(self.plans)
+
+    def test_undo_interrupted(self):
+        """Undo should handle runs that were interrupted"""
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans[:3], execute)
+            journal.record(self.plans[3:], lambda rename: False)
+            execute(self.plans[3])
+
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 4)
+        self.assertNotRenamed(self.plans)
+
+    def test_links(self):
+        """Undoing links should remove them and keep the originals"""
+        for rename in self.plans:
+            rename.mode = "hardlink"
+
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans[:3], execute)
+            #Crash after linking, before recording the link
+            journal.record(self.plans[3:], lambda rename: False)
+            execute(self.plans[3])
+
+        with Journal(self.path) as journal:
+            executed = list()
+            journal.begin(lambda rename: executed.append(rename.mode) or
+                          execute(rename))
+            self.assertEqual(executed, ["hardlink"])
+            journal.end()
+
+        for rename in self.plans:
+            self.assertTrue(os.path.exists(rename.source))
+            self.assertTrue(os.path.exists(rename.target))
+
+        #Without the original the link is renamed back instead
+        os.remove(self.plans[0].source)
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 5)
+        self.assertNotRenamed(self.plans)
+
+    def test_skipped_link(self):
+        """Existing targets skipped by links should never be undone"""
+        for mode in ("hardlink", "symlink", "reflink"):
+            rename = Plan(self.plans[0].source, self.plans[0].target, None,
+                          None, mode)
+            if not os.path.isdir(os.path.dirname(rename.target)):
+                os.makedirs(os.path.dirname(rename.target))
+            with open(rename.target, "w") as stream:
+                stream.write("precious")
+
+            with Journal(self.path) as journal:
+                journal.begin(execute)
+                #Crash after the link was skipped as taken
+                journal.record([rename], lambda rename: False)
+                self.assertFalse(execute(rename))
+
+            with Journal(self.path) as journal:
+                journal.begin(execute)
+                journal.end()
+                self.assertEqual(journal.undo(execute), 0)
+
+            with open(rename.target) as stream:
+                self.assertEqual(stream.read(), "precious")
+            self.assertTrue(os.path.exists(rename.source))
+            os.remove(rename.target)
+
+    def test_suffix(self):
+        """The actual target of a suffixed rename should be recorded"""
+        os.makedirs(os.path.dirname(self.plans[0].target))
+        open(self.plans[0].target, "w").close()
+        self.plans[0].collision = "suffix"
+
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans[:1], execute)
+            journal.end()
+        self.assertTrue(self.plans[0].target.endswith("0 (1).avi"))
+
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 1)
+        self.assertTrue(os.path.exists(self.plans[0].source))
+        self.assertEqual(os.listdir(os.path.dirname(self.plans[0].target)),
+                         ["0.avi"])
+
+    def test_suffix_interrupted(self):
+        """A suffixed rename that was not recorded should be found"""
+        rename = self.plans[0]
+        rename.collision = "suffix"
+        target = rename.target
+        os.makedirs(os.path.dirname(target))
+        with open(target, "w") as stream:
+            stream.write("precious")
+
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            #Crash after the rename, before recording it
+            journal.record([rename], lambda rename: False)
+            self.assertTrue(execute(rename))
+
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.end()
+            self.assertEqual(journal.undo(execute), 1)
+
+        with open(target) as stream:
+            self.assertEqual(stream.read(), "precious")
+        self.assertTrue(os.path.exists(rename.source))
+        self.assertEqual(os.listdir(os.path.dirname(target)), ["0.avi"])
+
+    def test_torn_record(self):
+        """A partially written record should be ignored"""
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans, execute)
+        with open(self.path, "a") as stream:
+            stream.write('{"op": "do')
+
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 5)
+        self.assertNotRenamed(self.plans)
+
+    def test_torn_tail(self):
+        """Runs after a partially written record should be readable"""
+        with open(self.path, "w") as stream:
+            stream.write('{"op": "begin", "run": "a"}\n{"op": "do')
+
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans, execute)
+            journal.end()
+        self.assertRenamed(self.plans)
+
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.undo(execute), 5)
+        self.assertNotRenamed(self.plans)
+
+    def test_done_flushed(self):
+        """Completed renames should reach the file right away"""
+        with Journal(self.path) as journal:
+            journal.begin(execute)
+            journal.record(self.plans[:1], execute)
+            self.assertEqual(self.records()[-1]["op"], "done")
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
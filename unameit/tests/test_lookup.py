@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import threading
+import time
+import unittest
+
+from unameit import lookup
+from unameit.cache import MetadataCache
+from unameit.trigram import TrigramIndex
+from unameit.lookup import Backend, Limiter, Lookup, MetadataError, \
+    RateLimited
+
+SHOWS = {"dexter": {"id": 79349, "name": "Dexter"},
+         "the big bang theory": {"id": 80379,
+                                 "name": "The Big Bang Theory"}}
+EPISODES = {(79349, 1, 1): "Dexter", (79349, 1, 2): "Crocodile",
+            (80379, 2, 3): "The Barbarian Sublimation"}
+
+
+class FakeBackend(Backend):
+    """A backend answering from the tables above, counting the calls"""
+
+    def __init__(self):
+        self.calls = list()
+        self.fail = False
+
+    def series(self, name):
+        self.calls.append(("series", name))
+        if self.fail:
+            raise MetadataError("Service unavailable")
+        return SHOWS.get(name.lower().replace(".", " "))
+
+    def episode(self, series, season, episode):
+        self.calls.append(("episode", series, season, episode))
+        title = EPISODES.get((series, season, episode))
+        return {"title": title} if title else None
+
+    def season(self, series, season):
+        self.calls.append(("season", series, season))
+        episodes = [{"episode": key[2], "title": title}
+                    for key, title in sorted(EPISODES.items())
+                    if key[:2] == (series, season)]
+        return episodes or None
+
+
+class SlowBackend(FakeBackend):
+    """A backend taking a while to answer, rate limiting the first call"""
+
+    def __init__(self, delay=0.05, limited=0):
+        super(SlowBackend, self).__init__()
+        self.delay = delay
+        self.limited = limited
+
+    def series(self, name):
+        time.sleep(self.delay)
+        if self.limited:
+            self.limited -= 1
+            raise RateLimited("Too many requests", retry_after=0.01)
+        return super(SlowBackend, self).series(name)
+
+
+class SeasonBackend(Backend):
+    """A backend only looking up whole seasons"""
+
+    def season(self, series, season):
+        return [{"episode": 1, "title": "Pilot"}] if season == 1 else None
+
+
+class TestBackend(unittest.TestCase):
+    def test_episode(self):
+        """Episodes should be found in their season by default"""
+        backend = SeasonBackend()
+        self.assertEqual(backend.episode(1, 1, 1), {"title": "Pilot"})
+        self.assertEqual(backend.episode(1, 1, 2), None)
+        self.assertEqual(backend.episode(1, 2, 1), None)
+        self.assertRaises(NotImplementedError, backend.series, "lost")
+
+
+class TestLimiter(unittest.TestCase):
+    def test_increase(self):
+        """The limit should grow with successes up to the maximum"""
+        limiter = Limiter(4)
+        limiter.limit = 2.0
+        for _ in range(2):
+            limiter.release(limiter.acquire())
+        self.assertTrue(2.5 < limiter.limit < 3)
+        for _ in range(10):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 4)
+
+    def test_decrease(self):
+        """Failures should halve the limit once for the requests in flight"""
+        limiter = Limiter(8, backoff=0)
+        tokens = [limiter.acquire() for _ in range(3)]
+        for token in tokens:
+            limiter.release(token, MetadataError("failed"))
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.stats["failed"], 3)
+
+        limiter.release(limiter.acquire(), RateLimited("limited"))
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.stats["limited"], 1)
+
+    def test_minimum(self):
+        """The limit should not go below the minimum"""
+        limiter = Limiter(2, backoff=0)
+        for _ in range(4):
+            limiter.release(limiter.acquire(), MetadataError("failed"))
+        self.assertEqual(limiter.limit, 1)
+
+    def test_backoff(self):
+        """Failures in a row should pause new requests"""
+        limiter = Limiter(2, backoff=0.1)
+        limiter.release(limiter.acquire(), MetadataError("failed"))
+        start = time.time()
+        limiter.release(limiter.acquire(), MetadataError("failed"))
+        self.assertTrue(time.time() - start < 0.05)
+        limiter.release(limiter.acquire())
+        self.assertTrue(time.time() - start >= 0.09)
+
+    def test_concurrency(self):
+        """No more than limit requests should run at once"""
+        limiter = Limiter(3)
+        active = [0, 0]
+        lock = threading.Lock()
+
+        def request():
+            token = limiter.acquire()
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            limiter.release(token)
+
+        threads = [threading.Thread(target=request) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(active[1], 3)
+
+
+class TestLookup(unittest.TestCase):
+    def setUp(self):
+        super(TestLookup, self).setUp()
+        self.backend = FakeBackend()
+        self.lookup = Lookup(self.backend)
+
+    def test_episode(self):
+        """Episodes should be looked up with the canonical show"""
+        self.assertEqual(self.lookup.episode("dexter", "01", "2"),
+                         {"series": "Dexter", "title": "Crocodile"})
+        self.assertEqual(self.backend.calls, [("series", "dexter"),
+                                              ("episode", 79349, 1, 2)])
+
+    def test_cached(self):
+        """Repeated lookups should be answered by the cache"""
+        for name in ("the.big.bang.theory", "The Big Bang Theory"):
+            self.assertEqual(self.lookup.episode(name, 2, 3)["title"],
+                             "The Barbarian Sublimation")
+        self.assertEqual(len(self.backend.calls), 2)
+        self.assertEqual(self.lookup.cache.stats["hits"], 2)
+
+    def test_not_found(self):
+        """Unknown shows and episodes should be cached as not found"""
+        for _ in range(2):
+            self.assertEqual(self.lookup.episode("unknown", 1, 1), None)
+            self.assertEqual(self.lookup.episode("dexter", 9, 9), None)
+        self.assertEqual(len(self.backend.calls), 3)
+        self.assertEqual(self.lookup.cache.stats["negative"], 2)
+
+    def test_errors(self):
+        """Failed lookups should not be cached"""
+        self.backend.fail = True
+        self.assertRaises(MetadataError, self.lookup.series, "dexter")
+        self.backend.fail = False
+        self.assertEqual(self.lookup.series("dexter")["id"], 79349)
+
+    def test_namespace(self):
+        """Lookups sharing a cache should not see each other's entries"""
+        cache = MetadataCache()
+        english = Lookup(self.backend, cache, "tvdb:en")
+        german = Lookup(self.backend, cache, "tvdb:de")
+        english.series("dexter")
+        german.series("dexter")
+        self.assertEqual(len(self.backend.calls), 2)
+
+    def test_season(self):
+        """Seasons should be looked up and cached as a whole"""
+        for _ in range(2):
+            self.assertEqual(self.lookup.season("dexter", "1", 3), {
+                "series": "Dexter", "titles": {1: "Dexter", 2: "Crocodile"}})
+        self.assertEqual(self.backend.calls, [("series", "dexter"),
+                                              ("season", 79349, 1)])
+        self.assertEqual(self.lookup.stats["saved"], 2)
+
+    def test_season_not_found(self):
+        """Seasons not found should not count as saved lookups"""
+        for _ in range(2):
+            self.assertIsNone(self.lookup.season("dexter", "5", 3))
+        self.assertEqual(self.lookup.stats["saved"], 0)
+        self.assertEqual(self.lookup.season("dexter", 9), None)
+
+    def test_shared(self):
+        """Concurrent lookups of the same show should share one request"""
+        backend = SlowBackend()
+        found = Lookup(backend, limiter=Limiter(4))
+        results = list()
+        threads = [threading.Thread(
+            target=lambda: results.append(found.series("dexter")))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [SHOWS["dexter"]] * 5)
+        self.assertEqual(backend.calls, [("series", "dexter")])
+        self.assertEqual(found.stats["shared"], 4)
+
+    def test_rate_limited(self):
+        """Rate limited requests should be tried again"""
+        backend = SlowBackend(0, limited=2)
+        found = Lookup(backend, limiter=Limiter(4, backoff=0.01))
+        self.assertEqual(found.series("dexter"), SHOWS["dexter"])
+        self.assertEqual(found.stats["retried"], 2)
+        self.assertEqual(found.limiter.stats["limited"], 2)
+
+        backend.limited = 5
+        self.assertRaises(RateLimited, found.series, "the big bang theory")
+
+    def test_similar(self):
+        """Shows not found by name should be found by similar names"""
+        index = TrigramIndex()
+        index.add("Dexter")
+        found = Lookup(self.backend, index=index)
+        self.assertEqual(found.series("dextr"), SHOWS["dexter"])
+        self.assertEqual(found.series("unknown"), None)
+
+        self.assertEqual(found.series("The.Big.Bang.Theory"),
+                         SHOWS["the big bang theory"])
+        self.assertTrue("The Big Bang Theory" in index)
+
+    def test_fill_index(self):
+        """Shows in the cache and the backend should be indexed"""
+        self.lookup.series("dexter")
+        index = self.lookup.index = TrigramIndex()
+        self.lookup.backend.names = lambda: ["Lost"]
+
+        self.lookup.fill_index()
+        self.assertEqual(len(index), 2)
+        self.assertTrue("Dexter" in index and "Lost" in index)
+
+    def test_create(self):
+        """Unknown or unusable backends should raise MetadataError"""
+        self.assertRaises(MetadataError, lookup.create, "foo")
+        if lookup.tvdb_api is None:
+            self.assertRaises(MetadataError, lookup.create, "tvdb")
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
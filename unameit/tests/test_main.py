@@ -14,9 +14,14 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import argparse
+import os
+import shutil
+import tempfile
 import unittest
 import sys
-from unameit.main import main
+from unameit.configuration import Group, Groups
+from unameit.main import main, _paths
 
 class TestMain(unittest.TestCase):
     def test_main(self):
@@ -24,6 +29,47 @@ class TestMain(unittest.TestCase):
         result = main()
         self.assertEqual(result, 0)
 
+
+class TestPaths(unittest.TestCase):
+    def setUp(self):
+        super(TestPaths, self).setUp()
+        self.root = tempfile.mkdtemp()
+        for name in ("in/a.avi", "in/out/b.avi", "in/sub/c.avi"):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(TestPaths, self).tearDown()
+
+    def _paths(self, output, workers=1):
+        """Returns the sorted relative paths found with *output*"""
+        groups = Groups([Group("tv", {
+            "input": os.path.join(self.root, "in"),
+            "output": os.path.join(self.root, output)})])
+        options = argparse.Namespace(scan_workers=workers)
+        return sorted(os.path.relpath(path, self.root).replace(os.sep, "/")
+                      for path in _paths(groups, options))
+
+    def test_outputs_skipped(self):
+        """Output directories within an input should not be scanned"""
+        for workers in (1, 2):
+            self.assertEqual(self._paths("in/out", workers),
+                             ["in/a.avi", "in/sub/c.avi"])
+
+    def test_output_input(self):
+        """Inputs within an output should be listed before any file is
+        yielded"""
+        paths = _paths(Groups([Group("tv", {
+            "input": os.path.join(self.root, "in"),
+            "output": os.path.join(self.root, "in")})]),
+                       argparse.Namespace(scan_workers=1))
+        first = next(paths)
+        open(os.path.join(self.root, "in", "sub", "d.avi"), "w").close()
+        self.assertEqual(len([first] + list(paths)), 3)
+
 #Run all tests
 if __name__ == "__main__":
     sys.exit(unittest.main())
\ No newline at end of file
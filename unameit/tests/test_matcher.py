@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+
+from unameit.configuration import Group
+from unameit.matcher import Matcher
+
+SXXEYY = r"""
+    ^(?P<show>.+?)[._ ]    # The show name
+    s(?P<season>\d+)       # The season number
+    e(?P<episode>\d+)      # The episode number
+"""
+NXMM = r"^(?P<show>.+?)[._ ](?P<season>\d+)x(?P<episode>\d+)"
+NUMBERS = r"^(?P<show>.+?)[._ ](?P<season>\d)(?P<episode>\d\d)[._ ]"
+BACKREF = r"^(?P<show>(\w)\2+)[._ ]"
+INLINE = r"(?s)^(?P<show>dexter)"
+
+NAMES = ["dexter.s01e02.avi", "The_Wire_1x05.mkv", "lost.402.hdtv.avi",
+         "Dexter.S05E12.avi", "aaa.avi", "dexter.avi", "nothing here",
+         "lost 4x02", ""]
+
+
+def sequential(groups, name):
+    """Matches *name* against all regexps one by one"""
+    for group in groups:
+        for index, pattern in enumerate(group.patterns):
+            match = pattern.match(name)
+            if match:
+                return group, index, match.groupdict()
+    return None
+
+
+class TestMatcher(unittest.TestCase):
+    def setUp(self):
+        super(TestMatcher, self).setUp()
+        self.groups = [Group("first", {"regexp": [SXXEYY, NXMM]}),
+                       Group("second", {"regexp": [BACKREF, NUMBERS]}),
+                       Group("third", {"regexp": [INLINE]}),
+                       Group("fourth", {"regexp": []})]
+
+    def test_fields(self):
+        """The named groups of the matching regexp should be returned"""
+        match = Matcher(self.groups).match("dexter.s01e02.avi")
+
+        self.assertEqual(match.group, self.groups[0])
+        self.assertEqual(match.index, 0)
+        self.assertEqual((match.show, match.season, match.episode),
+                         ("dexter", "01", "02"))
+
+    def test_order(self):
+        """The first matching regexp in the configured order should win"""
+        groups = [Group("a", {"regexp": [NUMBERS]}),
+                  Group("b", {"regexp": [SXXEYY, NUMBERS]})]
+        match = Matcher(groups).match("lost.402.s01e02.avi")
+
+        self.assertEqual((match.group, match.index), (groups[0], 0))
+
+    def test_no_match(self):
+        """None should be returned if nothing matches"""
+        self.assertEqual(Matcher(self.groups).match("nothing here"), None)
+        self.assertEqual(Matcher([]).match("dexter.s01e02.avi"), None)
+
+    def test_fallback(self):
+        """Regexps that can not be combined should still be matched"""
+        matcher = Matcher(self.groups)
+
+        match = matcher.match("aaa.avi")
+        self.assertEqual((match.group, match.index, match.show),
+                         (self.groups[1], 0, "aaa"))
+
+        match = matcher.match("dexter.avi")
+        self.assertEqual((match.group, match.show), (self.groups[2], "dexter"))
+
+    def test_sequential(self):
+        """The result should be the same as trying each regexp in turn"""
+        for prefilter in (True, False):
+            matcher = Matcher(self.groups, prefilter=prefilter)
+
+            for name in NAMES:
+                match = matcher.match(name)
+                expected = sequential(self.groups, name)
+
+                if expected is None:
+                    self.assertEqual(match, None)
+                else:
+                    self.assertEqual((match.group, match.index, match.fields),
+                                     expected)
+
+    def test_statistics(self):
+        """Regexps ruled out by the prefilter should be counted, combined
+        regexps are evaluated once"""
+        groups = [Group("dexter", {"regexp": [r"^(?P<show>dexter)\."]}),
+                  Group("lost", {"regexp": [r"^(?P<show>lost)\.", BACKREF]}),
+                  Group("wire", {"regexp": [r"^(?P<show>the\.wire)\."]})]
+
+        matcher = Matcher(groups)
+        match = matcher.match("The.Wire.s01e01.avi")
+
+        self.assertEqual(match.group, groups[2])
+        self.assertEqual((matcher.stats["evaluations"],
+                          matcher.stats["skipped"]), (2, 2))
+
+        matcher = Matcher(groups, prefilter=False)
+        matcher.match("The.Wire.s01e01.avi")
+        self.assertEqual((matcher.stats["evaluations"],
+                          matcher.stats["skipped"]), (3, 0))
+
+
+class TestParse(unittest.TestCase):
+    def setUp(self):
+        super(TestParse, self).setUp()
+        self.groups = [Group("first", {"regexp": [NUMBERS]}),
+                       Group("second", {"regexp": [NXMM]})]
+        self.matcher = Matcher(self.groups)
+
+    def test_fast_path(self):
+        """Names should be recognized by the tokenizer for groups without
+        regexps"""
+        group = Group("third", {})
+        match = Matcher(self.groups + [group]).parse("dexter.s01e02e03.avi",
+                                                    group)
+
+        self.assertEqual((match.group, match.index), (group, None))
+        self.assertEqual((match.show, match.season, match.episodes),
+                         ("dexter", "01", ("02", "03")))
+
+    def test_regexps_decide(self):
+        """Names recognized by the tokenizer should still need a matching
+        regexp of the group"""
+        self.assertEqual(self.matcher.parse("dexter.s01e02.avi",
+                                            self.groups[0]), None)
+
+        groups = [Group("dexter", {"regexp": r"^(?P<show>dexter)\.s"}),
+                  Group("wire", {"regexp": r"^(?P<show>the\.wire)\.s"})]
+        matcher = Matcher(groups)
+        self.assertEqual(matcher.parse("dexter.s01e01.avi", groups[1]), None)
+        self.assertEqual(matcher.parse("random.show.s01e01.avi", groups[1]),
+                         None)
+
+        match = matcher.parse("dexter.s01e01e02.avi", groups[0])
+        self.assertEqual((match.group, match.index), (groups[0], 0))
+        self.assertEqual((match.show, match.season, match.episodes),
+                         ("dexter", "01", ("01", "02")))
+
+    def test_fallback(self):
+        """The regexps should be used if the tokenizer fails"""
+        match = self.matcher.parse("lost.402.hdtv.avi")
+        self.assertEqual((match.group, match.index), (self.groups[0], 0))
+        self.assertEqual(match.episodes, ("02",))
+
+        match = self.matcher.parse("lost.402.hdtv.avi", self.groups[1])
+        self.assertEqual(match, None)
+
+    def test_complete(self):
+        """Fields a regexp did not capture should come from the tokenizer"""
+        group = Group("first", {"regexp": r"^(?P<show>.+?)\.(?P<season>\d)x"})
+        match = Matcher([group]).parse("lost.4x02.avi", group)
+        self.assertEqual((match.show, match.season, match.episode),
+                         ("lost", "4", "02"))
+
+    def test_statistics(self):
+        """The path taken by each name should be counted"""
+        for name in ["dexter.s01e02.avi", "lost.4x02.avi", "lost.402.avi",
+                     "nothing"]:
+            self.matcher.parse(name)
+
+        stats = self.matcher.stats
+        self.assertEqual((stats["fast"], stats["regexp"], stats["unmatched"]),
+                         (1, 2, 1))
+
+    def test_disabled(self):
+        """It should be possible to disable the tokenizer"""
+        matcher = Matcher(self.groups, fast_path=False)
+        match = matcher.parse("lost.4x02.avi")
+
+        self.assertEqual((match.group, match.index), (self.groups[1], 0))
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -15,9 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import random
 import unittest
 import sys
 from unameit import names
+from unameit.utils import LRUCache
 
 
 class TestCleanName(unittest.TestCase):
@@ -65,5 +67,88 @@ class TestCapitalize(unittest.TestCase):
             "USA-EU Cooperation Is OK")
 
 
+class ScanEngineMixin(object):
+    """Runs the tests of a test case using the scan engine"""
+
+    def setUp(self):
+        super(ScanEngineMixin, self).setUp()
+        names.set_engine("scan")
+
+    def tearDown(self):
+        names.set_engine("regex")
+        super(ScanEngineMixin, self).tearDown()
+
+
+class TestCleanNameScan(ScanEngineMixin, TestCleanName):
+    pass
+
+
+class TestCapitalizeScan(ScanEngineMixin, TestCapitalize):
+    pass
+
+
+class TestEngines(unittest.TestCase):
+    def test_invalid_engine(self):
+        """Selecting an unknown engine should raise ValueError"""
+        self.assertRaises(ValueError, names.set_engine, "foo")
+
+    def test_equivalence(self):
+        """All engines should produce the same result for random input"""
+        rand = random.Random(1234)
+        alphabet = "abzABZ019._ '-\n\u00e9\u0663"
+
+        regex_clean, regex_capitalize = names.ENGINES["regex"]
+        scan_clean, scan_capitalize = names.ENGINES["scan"]
+
+        for _ in range(20000):
+            string = "".join(rand.choice(alphabet)
+                             for _ in range(rand.randint(0, 16)))
+
+            self.assertEqual(regex_clean(string), scan_clean(string))
+            self.assertEqual(regex_capitalize(string),
+                             scan_capitalize(string))
+
+
+class TestNormalizeMany(unittest.TestCase):
+    def test_single(self):
+        """Single names should be normalized through the cache"""
+        cache = LRUCache()
+        for _ in range(2):
+            self.assertEqual(names.normalize_cached("the.wire", cache),
+                             "The Wire")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_normalize(self):
+        """Names should be both cleaned and capitalized"""
+        result = list(names.normalize_many(["how.i.met.your.mother",
+                                            "born_in_the_USA"]))
+        self.assertEqual(result, ["How I Met Your Mother",
+                                  "Born In The USA"])
+
+    def test_order(self):
+        """Results should be yielded in the same order as the input"""
+        data = ["b.show", "a.show", "b.show", "c.show"]
+        result = list(names.normalize_many(data, cache=LRUCache()))
+        self.assertEqual(result, ["B Show", "A Show", "B Show", "C Show"])
+
+    def test_cache_statistics(self):
+        """Repeated names should be served from the cache"""
+        cache = LRUCache()
+        data = ["dexter", "dexter", "the.wire", "dexter"]
+        list(names.normalize_many(data, cache=cache))
+
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 2)
+
+    def test_lazy(self):
+        """Names should be processed on demand"""
+        def _names():
+            yield "first.name"
+            raise AssertionError("Consumed too far")
+
+        result = names.normalize_many(_names(), cache=LRUCache())
+        self.assertEqual(next(result), "First Name")
+
+
 if __name__ == "__main__":
     sys.exit(unittest.main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unameit import lookup
+from unameit.lookup import MetadataError
+from unameit.offline import OfflineBackend
+
+CSV = u"""id,series,season,episode,title
+79349,Dexter,1,1,Dexter
+79349,Dexter,1,2,Crocodile
+79349,Dexter,2,1,It's Alive!
+80379,The Big Bang Theory,2,3,The Barbarian Sublimation
+"""
+
+SHOWS = [{"id": 73739, "name": "Lost",
+          "episodes": [{"season": 1, "episode": 1, "title": "Pilot (1)"},
+                       {"season": 1, "episode": 2, "title": "Pilot (2)"}]}]
+
+
+class TestOfflineBackend(unittest.TestCase):
+    def setUp(self):
+        super(TestOfflineBackend, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "offline.db")
+        self.backend = OfflineBackend(self.path)
+        self.assertEqual(self.backend.load(self.dump("dump.csv", CSV)),
+                         (2, 4))
+
+    def tearDown(self):
+        super(TestOfflineBackend, self).tearDown()
+        self.backend.close()
+        shutil.rmtree(self.directory)
+
+    def dump(self, name, content):
+        """Writes a dump, returning its path"""
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as stream:
+            stream.write(content)
+        return path
+
+    def test_series(self):
+        """Shows should be found by their cleaned name"""
+        for name in ("the.big.bang.theory", "The Big Bang Theory"):
+            self.assertEqual(self.backend.series(name),
+                             {"id": 80379, "name": "The Big Bang Theory"})
+        self.assertEqual(self.backend.series("unknown"), None)
+
+    def test_episodes(self):
+        """Episodes should be found alone or by season"""
+        self.assertEqual(self.backend.episode(79349, 2, 1),
+                         {"title": "It's Alive!"})
+        self.assertEqual(self.backend.episode(79349, 2, 2), None)
+        self.assertEqual(self.backend.season(79349, 1),
+                         [{"episode": 1, "title": "Dexter"},
+                          {"episode": 2, "title": "Crocodile"}])
+        self.assertEqual(self.backend.season(79349, 3), None)
+
+    def test_names(self):
+        """All shows in the database should be listed"""
+        self.assertEqual(sorted(self.backend.names()),
+                         ["Dexter", "The Big Bang Theory"])
+
+    def test_json(self):
+        """JSON dumps should be imported too"""
+        self.backend.load(self.dump("dump.json", json.dumps(SHOWS)))
+        self.assertEqual(self.backend.series("lost")["id"], 73739)
+        self.assertEqual(self.backend.episode(73739, 1, 2)["title"],
+                         "Pilot (2)")
+
+    def test_replace(self):
+        """Imported episodes should replace the ones in the database"""
+        self.backend.load(self.dump("update.csv", CSV.replace(
+            "Crocodile", "Crocodile (2)")))
+        self.assertEqual(self.backend.episode(79349, 1, 2)["title"],
+                         "Crocodile (2)")
+
+    def test_dropped(self):
+        """Episodes missing from a newer dump of a show should be dropped,
+        other shows should be left alone"""
+        self.backend.load(self.dump("update.csv", CSV.replace(
+            "79349,Dexter,2,1,It's Alive!\n", "")))
+        self.assertEqual(self.backend.episode(79349, 2, 1), None)
+        self.assertEqual(self.backend.season(79349, 1),
+                         [{"episode": 1, "title": "Dexter"},
+                          {"episode": 2, "title": "Crocodile"}])
+
+        self.backend.load(self.dump("dump.json", json.dumps(SHOWS)))
+        self.assertEqual(self.backend.episode(79349, 1, 1),
+                         {"title": "Dexter"})
+
+    def test_persistent(self):
+        """The database should be kept between uses"""
+        self.backend.close()
+        self.backend = OfflineBackend(self.path)
+        self.assertEqual(self.backend.series("dexter")["id"], 79349)
+
+    def test_broken(self):
+        """Broken dumps should raise MetadataError"""
+        self.assertRaises(MetadataError, self.backend.load,
+                          self.dump("broken.csv", "id,series\nfoo,bar\n"))
+        self.assertRaises(MetadataError, self.backend.load,
+                          self.dump("broken.json", "[{"))
+        self.assertRaises(MetadataError, self.backend.load,
+                          os.path.join(self.directory, "missing.csv"))
+
+    def test_create(self):
+        """Groups should be able to use the offline backend"""
+        self.assertRaises(MetadataError, lookup.create, "offline")
+        found = lookup.create("offline", database=self.path)
+        self.assertEqual(found.episode("dexter", 1, 2),
+                         {"series": "Dexter", "title": "Crocodile"})
+        found.backend.close()
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
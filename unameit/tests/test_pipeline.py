@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import threading
+import time
+import unittest
+
+from unameit.pipeline import Pipeline, Stage
+
+
+def square(number):
+    """Squares a number, drops odd numbers. Picklable for processes"""
+    if number % 2:
+        return None
+    return number * number
+
+
+def fail_on_three(number):
+    """Fails for 3, passes everything else"""
+    if number == 3:
+        raise ValueError(number)
+    return number
+
+
+class TestPipeline(unittest.TestCase):
+    def test_stages(self):
+        """Items should pass through all stages in order"""
+        pipeline = Pipeline([Stage("double", lambda number: number * 2),
+                             Stage("add", lambda number: number + 1)])
+        self.assertEqual(list(pipeline.run(range(5))), [1, 3, 5, 7, 9])
+        self.assertEqual(pipeline.produced, 5)
+
+    def test_workers(self):
+        """Stages with several workers should handle all items"""
+        pipeline = Pipeline([Stage("double", lambda number: number * 2, 4),
+                             Stage("add", lambda number: number + 1, 3)])
+        self.assertEqual(sorted(pipeline.run(range(100))),
+                         [number * 2 + 1 for number in range(100)])
+
+    def test_dropped(self):
+        """Items returning None or raising should be dropped"""
+        stage = Stage("fail", fail_on_three)
+        pipeline = Pipeline([stage, Stage("square", square)])
+
+        self.assertEqual(list(pipeline.run(range(6))), [0, 4, 16])
+        self.assertEqual(stage.stats["taken"], 6)
+        self.assertEqual(stage.stats["passed"], 5)
+        self.assertEqual(stage.stats["dropped"], 1)
+
+    def test_batch(self):
+        """Batched stages should be called with lists of items"""
+        sizes = list()
+
+        def total(items):
+            sizes.append(len(items))
+            return [sum(items)]
+
+        pipeline = Pipeline([Stage("sum", total, batch=4)])
+        self.assertEqual(sum(pipeline.run(range(10))), 45)
+        self.assertTrue(max(sizes) <= 4)
+
+    def test_processes(self):
+        """Stages can run in processes"""
+        stage = Stage("square", square, 2, processes=True)
+        pipeline = Pipeline([stage])
+        self.assertEqual(sorted(pipeline.run(range(10))), [0, 4, 16, 36, 64])
+        self.assertEqual(stage.stats["dropped"], 5)
+
+    def test_fatal(self):
+        """Fatal errors should stop the pipeline and be raised"""
+        pipeline = Pipeline([Stage("fail", fail_on_three)],
+                            fatal=(ValueError,))
+        results = list()
+
+        def consume():
+            for result in pipeline.run(range(1000)):
+                results.append(result)
+
+        self.assertRaises(ValueError, consume)
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_fatal_threads(self):
+        """A fatal error should not leave threads blocked on full queues"""
+        before = set(threading.enumerate())
+        pipeline = Pipeline([Stage("pass", lambda number: number, 2),
+                             Stage("fail", fail_on_three)],
+                            queue_size=2, fatal=(ValueError,))
+
+        self.assertRaises(ValueError, list, pipeline.run(range(1000)))
+        self.assertEqual(set(threading.enumerate()) - before, set())
+
+    def test_closed(self):
+        """Closing the results early should end all threads"""
+        before = set(threading.enumerate())
+        pipeline = Pipeline([Stage("square", square, 2)], queue_size=2)
+        results = pipeline.run(range(1000))
+        next(results)
+        results.close()
+
+        self.assertEqual(set(threading.enumerate()) - before, set())
+
+    def test_backpressure(self):
+        """A slow stage should limit the number of items in flight"""
+        def slow(number):
+            time.sleep(0.001)
+            return number
+
+        produced = list()
+
+        def source():
+            for number in range(200):
+                produced.append(number)
+                yield number
+
+        stage = Stage("slow", slow)
+        pipeline = Pipeline([Stage("fast", lambda number: number), stage],
+                            queue_size=4)
+        for result in pipeline.run(source()):
+            #The source can only be a few queues ahead of the results
+            self.assertTrue(len(produced) - result <= 16)
+
+        self.assertTrue(stage.stats["max_depth"] <= 4)
+
+    def test_empty(self):
+        """An empty source should end the pipeline"""
+        pipeline = Pipeline([Stage("a", square, 3), Stage("b", square, 2)])
+        self.assertEqual(list(pipeline.run([])), [])
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from unameit.configuration import Group, Groups
+from unameit.lookup import Lookup
+from unameit.planner import CollisionError, enrich, enrich_all, plan, execute
+from unameit.tests.test_lookup import FakeBackend
+
+
+class PlannerTestCase(unittest.TestCase):
+    def setUp(self):
+        super(PlannerTestCase, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.input = os.path.join(self.root, "in")
+        self.output = os.path.join(self.root, "out")
+        os.makedirs(self.input)
+
+        regexps = [r"(?P<show>[a-z]+)_part(?P<season>\d+)_ep(?P<episode>\d+)",
+                   r"(?P<show>.+?)\.s(?P<season>\d+)e(?P<episode>\d+)"]
+        self.groups = Groups([
+            Group("tv", {"input": self.input, "output": self.output,
+                         "exclude": [".txt"], "regexp": regexps}),
+            Group("other", {"input": os.path.join(self.root, "other")})])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(PlannerTestCase, self).tearDown()
+
+    def touch(self, name):
+        """Creates an empty file in the input directory"""
+        path = os.path.join(self.input, name)
+        open(path, "w").close()
+        return path
+
+
+class TestPlan(PlannerTestCase):
+    def test_plan(self):
+        """A recognized file should get a target in the output directory"""
+        path = self.touch("dexter.s01e02.hdtv.avi")
+        result = plan(self.groups, path)
+
+        self.assertEqual(result.source, path)
+        self.assertEqual(result.target, os.path.join(self.output,
+                                                     "Dexter - S01E02.avi"))
+        self.assertEqual(result.group, self.groups["tv"])
+
+    def test_regexp(self):
+        """Names not handled by the tokenizer should use the regexps"""
+        path = self.touch("lost_part2_ep05.mkv")
+        result = plan(self.groups, path)
+        self.assertEqual(result.target, os.path.join(self.output,
+                                                     "Lost - S02E05.mkv"))
+        self.assertEqual(result.match.index, 0)
+
+    def test_unrecognized(self):
+        """Unknown names, excluded files and files outside all inputs
+        should not be planned"""
+        self.assertEqual(plan(self.groups, self.touch("notes.avi")), None)
+        self.assertEqual(plan(self.groups, self.touch("lost.s01e01.txt")),
+                         None)
+        self.assertEqual(plan(self.groups, os.path.join(self.root,
+                                                        "lost.s01e01.avi")),
+                         None)
+
+    def test_shared_input(self):
+        """Groups sharing an input should only plan the files their regexps
+        match, other files should be left alone"""
+        groups = Groups([
+            Group("dexter", {"input": self.input,
+                             "output": os.path.join(self.output, "dexter"),
+                             "regexp": r"^(?P<show>dexter)\.s(?P<season>\d+)"
+                                       r"e(?P<episode>\d+)"}),
+            Group("wire", {"input": self.input,
+                           "output": os.path.join(self.output, "wire"),
+                           "regexp": r"^(?P<show>the\.wire)\.s(?P<season>"
+                                     r"\d+)e(?P<episode>\d+)"})])
+
+        result = plan(groups, self.touch("dexter.s01e01.avi"))
+        self.assertEqual(result.target, os.path.join(
+            self.output, "dexter", "Dexter - S01E01.avi"))
+        result = plan(groups, self.touch("the.wire.s01e01.avi"))
+        self.assertEqual(result.group, groups["wire"])
+
+        path = self.touch("random.show.s01e01.avi")
+        self.assertEqual(plan(groups, path), None)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_missing_field(self):
+        """Files missing a field of the format should not be planned"""
+        groups = Groups([Group("tv", {
+            "input": self.input, "output": self.output,
+            "regexp": r"^(?P<show>[a-z]+)(\.s(?P<season>\d+))?\.e"
+                      r"(?P<episode>\d+)"})])
+        self.assertEqual(plan(groups, self.touch("lost.e01.avi")), None)
+
+    def test_no_output(self):
+        """Groups without an output directory should not be planned"""
+        path = os.path.join(self.root, "other", "lost.s01e01.avi")
+        self.assertEqual(plan(self.groups, path), None)
+
+
+class TestEnrich(PlannerTestCase):
+    def setUp(self):
+        super(TestEnrich, self).setUp()
+        self.groups = Groups([Group("tv", {
+            "input": self.input, "output": self.output,
+            "format": "{show} - {season}x{episode:02} - {title}{ext}"})])
+        self.lookup = Lookup(FakeBackend())
+
+    def test_enrich(self):
+        """The canonical name and the titles should be used"""
+        result = enrich(plan(self.groups, self.touch("DEXTER.S01E01E02.avi")),
+                        self.lookup)
+        self.assertEqual(os.path.basename(result.target),
+                         "Dexter - 1x01-02 - Dexter & Crocodile.avi")
+
+    def test_not_found(self):
+        """Plans should be left as they are if nothing is found"""
+        result = plan(self.groups, self.touch("dexter.s05e01.avi"))
+        target = result.target
+        self.assertEqual(enrich(result, self.lookup).target, target)
+
+
+    def test_enrich_all(self):
+        """Each season should be looked up once for all its files"""
+        renames = [plan(self.groups, self.touch(name)) for name in
+                   ("dexter.s01e01.avi", "Dexter.S01E02.mkv",
+                    "dexter.s05e01.avi")]
+        target = renames[2].target
+
+        self.assertEqual(enrich_all(renames, lambda group: self.lookup),
+                         renames)
+        self.assertEqual([os.path.basename(rename.target)
+                          for rename in renames[:2]],
+                         ["Dexter - 1x01 - Dexter.avi",
+                          "Dexter - 1x02 - Crocodile.mkv"])
+        self.assertEqual(renames[2].target, target)
+        self.assertEqual([call[0] for call in self.lookup.backend.calls],
+                         ["series", "season", "season"])
+        self.assertEqual(self.lookup.stats["saved"], 1)
+
+    def test_without_lookup(self):
+        """Groups without lookups should be left alone"""
+        rename = plan(self.groups, self.touch("dexter.s01e01.avi"))
+        target = rename.target
+        enrich_all([rename], lambda group: None)
+        self.assertEqual(rename.target, target)
+
+
+class TestExecute(PlannerTestCase):
+    def test_execute(self):
+        """The file should be moved and missing directories created"""
+        result = plan(self.groups, self.touch("dexter.s01e02.avi"))
+
+        self.assertTrue(execute(result))
+        self.assertFalse(os.path.exists(result.source))
+        self.assertTrue(os.path.isfile(result.target))
+
+    def test_threads(self):
+        """Files placed concurrently into a new directory should all be
+        placed"""
+        renames = [plan(self.groups, self.touch(
+            "dexter.s01e{0:02}.avi".format(episode)))
+                   for episode in range(1, 25)]
+        makedirs = os.makedirs
+
+        def slow_makedirs(*args, **kwargs):
+            """Widens the window between checking and creating"""
+            time.sleep(0.05)
+            return makedirs(*args, **kwargs)
+
+        pool = ThreadPool(8)
+        try:
+            os.makedirs = slow_makedirs
+            results = pool.map(execute, renames, chunksize=1)
+        finally:
+            os.makedirs = makedirs
+            pool.close()
+
+        self.assertEqual(results, [True] * len(renames))
+        self.assertEqual(len(os.listdir(self.output)), len(renames))
+
+    def test_existing(self):
+        """Existing files should never be overwritten"""
+        result = plan(self.groups, self.touch("dexter.s01e02.avi"))
+        os.makedirs(self.output)
+        with open(result.target, "w") as handle:
+            handle.write("keep")
+
+        self.assertFalse(execute(result))
+        self.assertTrue(os.path.exists(result.source))
+        with open(result.target) as handle:
+            self.assertEqual(handle.read(), "keep")
+
+
+    def test_suffix(self):
+        """Colliding files should get the first free suffixed name"""
+        os.makedirs(self.output)
+        for name in ("Dexter - S01E02.avi", "Dexter - S01E02 (1).avi"):
+            open(os.path.join(self.output, name), "w").close()
+
+        result = plan(self.groups, self.touch("dexter.s01e02.avi"))
+        result.collision = "suffix"
+
+        self.assertTrue(execute(result))
+        self.assertEqual(result.target, os.path.join(
+            self.output, "Dexter - S01E02 (2).avi"))
+        self.assertTrue(os.path.isfile(result.target))
+
+    def test_fail(self):
+        """Colliding files should raise CollisionError if requested"""
+        result = plan(self.groups, self.touch("dexter.s01e02.avi"))
+        os.makedirs(self.output)
+        open(result.target, "w").close()
+
+        result.collision = "fail"
+        self.assertRaises(CollisionError, execute, result)
+        self.assertTrue(os.path.exists(result.source))
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
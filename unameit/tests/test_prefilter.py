@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import re
+import sys
+import unittest
+
+from unameit.prefilter import required_literals, AhoCorasick, Prefilter
+
+
+class TestRequiredLiterals(unittest.TestCase):
+    def test_literals(self):
+        """Runs of literals should be extracted and folded"""
+        pattern = re.compile(r"^(?P<show>Dexter)[._ ]s(?P<season>\d+)"
+                             r"E(?P<episode>\d+)(?:ab)+x?")
+
+        self.assertEqual(required_literals(pattern),
+                         set(["dexter", "s", "e", "ab"]))
+
+    def test_verbose(self):
+        """Whitespace and comments in verbose regexps should be ignored"""
+        pattern = re.compile(r"""
+            ^(?P<show>the\ wire)   # The show
+            \.s(?P<season>\d+)     # The season
+        """, re.VERBOSE)
+
+        self.assertEqual(required_literals(pattern),
+                         set(["the wire", ".s"]))
+
+    def test_optional(self):
+        """Optional parts and alternatives should not be required"""
+        self.assertEqual(required_literals(re.compile(r"foo|bar")), set())
+        self.assertEqual(required_literals(re.compile(r"(?:foo)?x*")), set())
+        self.assertEqual(required_literals(re.compile(r"\d+")), set())
+
+
+class TestAhoCorasick(unittest.TestCase):
+    def test_search(self):
+        """All words, including overlapping ones, should be found"""
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+        self.assertEqual(automaton.search("ushers"), set([0, 1, 3]))
+        self.assertEqual(automaton.search("nothing"), set())
+
+    def test_random(self):
+        """The result should match searching for each word in turn"""
+        rand = random.Random(4321)
+
+        for _ in range(500):
+            words = list(set("".join(rand.choice("abc")
+                                     for _ in range(rand.randint(1, 4)))
+                             for _ in range(rand.randint(1, 8))))
+            text = "".join(rand.choice("abcd")
+                           for _ in range(rand.randint(0, 20)))
+
+            expected = set(index for index, word in enumerate(words)
+                           if word in text)
+            self.assertEqual(AhoCorasick(words).search(text), expected)
+
+
+class TestPrefilter(unittest.TestCase):
+    def test_viable(self):
+        """Only regexps with their longest literal present should be viable"""
+        patterns = [re.compile(r"^dexter\.s\d+", re.IGNORECASE),
+                    re.compile(r"^lost\.(\d)x"),
+                    re.compile(r"^(?P<show>.+)\.\d+")]
+        prefilter = Prefilter(patterns)
+
+        self.assertEqual(prefilter.viable("Dexter.S01E01"), [0, 2])
+        self.assertEqual(prefilter.viable("LOST.1x02"), [1, 2])
+        self.assertEqual(prefilter.viable("the.wire.102"), [2])
+        self.assertEqual(prefilter.viable("the wire"), [])
+
+    def test_folding(self):
+        """Characters matching ASCII letters when ignoring case count"""
+        prefilter = Prefilter([re.compile(r"dexter\.ſ", re.IGNORECASE)])
+
+        for name in ["dexter.s", "DEXTER.ſ", "dexter.ſ"]:
+            self.assertTrue(re.match(r"dexter\.ſ", name, re.IGNORECASE))
+            self.assertEqual(prefilter.viable(name), [0])
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
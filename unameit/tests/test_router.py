@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import unittest
+
+from unameit.configuration import Group
+from unameit.router import Router
+
+
+def path(*components):
+    """Builds an absolute path from *components*"""
+    return os.path.abspath(os.path.join(os.sep, *components))
+
+
+class TestRouter(unittest.TestCase):
+    def setUp(self):
+        super(TestRouter, self).setUp()
+        self.tv = Group("tv", {"input": path("media", "tv")})
+        self.dexter = Group("dexter", {"input": path("media", "tv", "dexter")
+                                       + os.sep})
+        self.movies = Group("movies", {"input": path("media", "movies")})
+        self.other = Group("other", {"input": ""})
+
+        self.router = Router([self.tv, self.dexter, self.movies, self.other])
+
+    def test_route(self):
+        """Files should be routed to the groups containing them"""
+        self.assertEqual(self.router.route(path("media", "tv", "lost.avi")),
+                         [self.tv])
+        self.assertEqual(self.router.route(path("media", "movies", "a",
+                                                "b.avi")), [self.movies])
+
+    def test_nested(self):
+        """The group with the deepest input should come first"""
+        result = self.router.route(path("media", "tv", "dexter", "d.avi"))
+        self.assertEqual(result, [self.dexter, self.tv])
+
+    def test_no_group(self):
+        """Files outside all inputs should not be routed"""
+        self.assertEqual(self.router.route(path("home", "foo.avi")), [])
+        self.assertEqual(self.router.route(path("media", "tvshow.avi")), [])
+
+    def test_roots(self):
+        """Only the outermost input directories should be returned"""
+        self.assertEqual(self.router.roots(), [path("media", "movies"),
+                                               path("media", "tv")])
+
+        router = Router([Group("a", {"input": path("a", "b-c")}),
+                         Group("b", {"input": path("a", "b", "c")}),
+                         Group("c", {"input": path("a", "b")})])
+        self.assertEqual(router.roots(), [path("a", "b"), path("a", "b-c")])
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
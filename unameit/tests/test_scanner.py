@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unameit.scanner import scan, parallel_scan
+
+FILES = ["a.avi", "b.MKV", "c.txt", "season1/d.avi", "season1/e.srt",
+         "season1/extra/f.mkv", "season2/g.avi"]
+
+
+def make_tree(root, files):
+    """Creates empty files with the relative paths in *files*"""
+    for name in files:
+        path = os.path.join(root, *name.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, "w").close()
+
+
+class ScanTestCase(unittest.TestCase):
+    """Creates a temporary tree of files for each test"""
+
+    def setUp(self):
+        super(ScanTestCase, self).setUp()
+        self.root = tempfile.mkdtemp()
+        make_tree(self.root, FILES)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(ScanTestCase, self).tearDown()
+
+    def _names(self, entries):
+        """Returns the sorted relative paths of the entries"""
+        return sorted(os.path.relpath(entry.path, self.root).
+                      replace(os.sep, "/") for entry in entries)
+
+
+class TestScan(ScanTestCase):
+    def test_scan(self):
+        """All files in the tree should be found"""
+        self.assertEqual(self._names(scan(self.root)), sorted(FILES))
+
+    def test_include(self):
+        """Only included extensions should be found"""
+        result = self._names(scan(self.root, include=["avi", ".mkv"]))
+        self.assertEqual(result, ["a.avi", "b.MKV", "season1/d.avi",
+                                  "season1/extra/f.mkv", "season2/g.avi"])
+
+    def test_exclude(self):
+        """Excluded extensions should be skipped"""
+        result = self._names(scan(self.root, include=["avi", "mkv"],
+                                  exclude=["mkv"]))
+        self.assertEqual(result, ["a.avi", "season1/d.avi",
+                                  "season2/g.avi"])
+
+    def test_lazy(self):
+        """Files should be available before the whole tree is walked"""
+        entries = scan(self.root)
+        entry = next(entries)
+        entries.close()
+
+        self.assertTrue(entry.is_file())
+
+    def test_missing_directory(self):
+        """Directories that can not be listed should be skipped"""
+        path = os.path.join(self.root, "missing")
+        self.assertEqual(list(scan(path)), [])
+
+    def test_skip(self):
+        """Skipped directories should not be descended into"""
+        result = self._names(scan(self.root, skip=[
+            os.path.join(self.root, "season1")]))
+        self.assertEqual(result, ["a.avi", "b.MKV", "c.txt", "season2/g.avi"])
+
+    def test_stat(self):
+        """It should be possible to get the stat data of an entry"""
+        for entry in scan(self.root):
+            self.assertEqual(entry.stat().st_size, 0)
+
+
+class TestParallelScan(ScanTestCase):
+    def test_unordered(self):
+        """All files in the tree should be found"""
+        result = self._names(parallel_scan(self.root, workers=4))
+        self.assertEqual(result, sorted(FILES))
+
+    def test_ordered(self):
+        """Files should be yielded depth first sorted by name"""
+        entries = parallel_scan(self.root, workers=4, ordered=True)
+        result = [os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+                  for entry in entries]
+
+        self.assertEqual(result, ["a.avi", "b.MKV", "c.txt", "season1/d.avi",
+                                  "season1/e.srt", "season1/extra/f.mkv",
+                                  "season2/g.avi"])
+
+    def test_filters(self):
+        """Extension filters should be applied"""
+        result = self._names(parallel_scan(self.root, include=["avi"],
+                                           exclude=["txt"], workers=2))
+        self.assertEqual(result, ["a.avi", "season1/d.avi", "season2/g.avi"])
+
+    def test_skip(self):
+        """Skipped directories should not be descended into"""
+        skip = [os.path.join(self.root, "season1", "extra")]
+        for ordered in (True, False):
+            result = self._names(parallel_scan(self.root, workers=2,
+                                               ordered=ordered, skip=skip))
+            self.assertEqual(result, ["a.avi", "b.MKV", "c.txt",
+                                      "season1/d.avi", "season1/e.srt",
+                                      "season2/g.avi"])
+
+    def test_listing_error(self):
+        """Directories that can not be listed should be skipped"""
+        def _listdir(path):
+            if path.endswith("season1"):
+                raise OSError("Permission denied")
+            return os.scandir(path)
+
+        for ordered in (True, False):
+            result = self._names(parallel_scan(self.root, ordered=ordered,
+                                               listdir=_listdir))
+            self.assertEqual(result, ["a.avi", "b.MKV", "c.txt",
+                                      "season2/g.avi"])
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+
+from unameit.tokenizer import parse
+
+
+class TestParse(unittest.TestCase):
+    def test_season_episode(self):
+        """Names like S01E02 should be recognized"""
+        self.assertEqual(parse("How.I.Met.Your.Mother.S01E02.720p.mkv"),
+                         {"show": "How.I.Met.Your.Mother", "season": "01",
+                          "episode": "02"})
+        self.assertEqual(parse("dexter s1e2"),
+                         {"show": "dexter", "season": "1", "episode": "2"})
+
+    def test_multiple_episodes(self):
+        """All episodes of multi episode files should be returned"""
+        self.assertEqual(parse("Dexter.S01E02E03.avi")["episodes"],
+                         ("02", "03"))
+        self.assertEqual(parse("Dexter - s01e02-e03 - Title.avi"),
+                         {"show": "Dexter", "season": "01", "episode": "02",
+                          "episodes": ("02", "03")})
+
+    def test_number_x_number(self):
+        """Names like 1x02 should be recognized"""
+        self.assertEqual(parse("The_Wire_1x05.mkv"),
+                         {"show": "The_Wire", "season": "1",
+                          "episode": "05"})
+
+    def test_unknown(self):
+        """None should be returned for other names"""
+        for name in ["S01E02.avi", "Show.1920x1080.avi", "Show.S01.E02",
+                     "Show.s01e02x264", "Show.402.avi", "", "Show.SE.avi",
+                     u"Show.S١E02.avi"]:
+            self.assertEqual(parse(name), None)
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unameit.trigram import TrigramIndex, trigrams
+
+SHOWS = ["Doctor Who (2005)", "Doctor Who", "Law & Order",
+         "Law & Order: Special Victims Unit", "The Office (US)",
+         "Marvel's Agents of S.H.I.E.L.D.", "Shameless (US)",
+         "Shameless (UK)"]
+
+
+class TestTrigrams(unittest.TestCase):
+    def test_trigrams(self):
+        """Names should be folded before they are split"""
+        self.assertEqual(trigrams("Law & Order"), trigrams("law and order"))
+        self.assertEqual(trigrams("Marvel's S.H.I.E.L.D."),
+                         trigrams("marvels s h i e l d"))
+        self.assertEqual(trigrams("?!"), set())
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        super(TestTrigramIndex, self).setUp()
+        self.index = TrigramIndex()
+        self.index.update(SHOWS)
+
+    def best(self, name):
+        """Returns the best candidate for *name*"""
+        return self.index.search(name, 1)[0][0]
+
+    def test_search(self):
+        """Names should be found despite years, "&" and punctuation"""
+        self.assertEqual(self.best("doctor who 2005"), "Doctor Who (2005)")
+        self.assertEqual(self.best("law and order"), "Law & Order")
+        self.assertEqual(self.best("the office us"), "The Office (US)")
+        self.assertEqual(self.best("marvels agents of s h i e l d"),
+                         "Marvel's Agents of S.H.I.E.L.D.")
+        self.assertEqual(self.best("doctr who"), "Doctor Who")
+
+    def test_ranked(self):
+        """Candidates should be ranked by similarity, then by age"""
+        candidates = self.index.search("shameless")
+        self.assertEqual([name for name, _ in candidates],
+                         ["Shameless (US)", "Shameless (UK)"])
+        self.assertEqual(candidates[0][1], candidates[1][1])
+
+        candidates = self.index.search("Doctor Who (2005)")
+        self.assertEqual(candidates[0], ("Doctor Who (2005)", 1.0))
+        self.assertTrue(candidates[1][1] < 1.0)
+
+    def test_threshold(self):
+        """Names that are not similar enough should not be candidates"""
+        self.assertEqual(self.index.search("breaking bad"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_add(self):
+        """Names should only be added once"""
+        self.index.changed = False
+        self.index.add("Doctor Who")
+        self.assertEqual(len(self.index), len(SHOWS))
+        self.assertFalse(self.index.changed)
+        self.index.add("Breaking Bad")
+        self.assertTrue("Breaking Bad" in self.index)
+        self.assertTrue(self.index.changed)
+
+    def test_persistent(self):
+        """Saved indexes should be loaded with all their names"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.trigrams")
+            self.index.save(path)
+            self.assertFalse(self.index.changed)
+
+            loaded = TrigramIndex.load(path)
+            self.assertEqual(len(loaded), len(SHOWS))
+            self.assertEqual(loaded.search("law and order", 1),
+                             self.index.search("law and order", 1))
+
+            with open(path, "wb") as stream:
+                stream.write(b"garbage")
+            self.assertEqual(len(TrigramIndex.load(path)), 0)
+            self.assertEqual(len(TrigramIndex.load(path + ".missing")), 0)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_not_pickled(self):
+        """Pickled indexes should never be loaded"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.trigrams")
+            marker = os.path.join(directory, "loaded")
+            with open(path, "wb") as stream:
+                pickle.dump(_Touch(marker), stream)
+
+            self.assertEqual(len(TrigramIndex.load(path)), 0)
+            self.assertFalse(os.path.exists(marker))
+        finally:
+            shutil.rmtree(directory)
+
+
+class _Touch(object):
+    """Creates a file when unpickled"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, "w"))
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+from multiprocessing.pool import ThreadPool
+from unameit.utils import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_set(self):
+        """It should be possible to store and retrieve values"""
+        cache = LRUCache()
+        cache.set("foo", "bar")
+
+        self.assertEqual(cache.get("foo"), "bar")
+        self.assertEqual(cache.get("laba"), None)
+        self.assertEqual(cache.get("laba", 42), 42)
+
+    def test_eviction(self):
+        """The least recently used entry should be evicted first"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertTrue("a" in cache)
+        self.assertFalse("b" in cache)
+        self.assertTrue("c" in cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_statistics(self):
+        """Hits and misses should be counted"""
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
+
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+    def test_threads(self):
+        """The cache should stay consistent when shared between threads"""
+        cache = LRUCache(maxsize=8)
+
+        def _use(number):
+            for key in range(number % 16, number % 16 + 64):
+                if cache.get(key) is None:
+                    cache.set(key, key)
+
+        pool = ThreadPool(8)
+        try:
+            pool.map(_use, range(64))
+        finally:
+            pool.close()
+
+        self.assertEqual(len(cache), 8)
+        self.assertEqual(cache.hits + cache.misses, 64 * 64)
+
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from unameit import watch
+from unameit.watch import Debouncer, InotifyWatcher, PollingWatcher
+
+
+class Clock(object):
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class WatchTestCase(unittest.TestCase):
+    def setUp(self):
+        super(WatchTestCase, self).setUp()
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(WatchTestCase, self).tearDown()
+
+    def write(self, name, data=""):
+        """Writes *data* to a file below the root, returns its path"""
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "a") as handle:
+            handle.write(data)
+        return path
+
+
+class TestDebouncer(WatchTestCase):
+    def setUp(self):
+        super(TestDebouncer, self).setUp()
+        self.clock = Clock()
+        self.debouncer = Debouncer(5, clock=self.clock)
+
+    def test_settle(self):
+        """Files should only be released once they stop changing"""
+        path = self.write("a.avi", "a")
+        self.debouncer.add(path)
+        self.assertEqual(self.debouncer.ready(), [])
+
+        self.clock.now = 3
+        self.write("a.avi", "more")
+        self.assertEqual(self.debouncer.ready(), [])
+
+        self.clock.now = 7
+        self.assertEqual(self.debouncer.ready(), [])
+
+        self.clock.now = 8
+        self.assertEqual(self.debouncer.ready(), [path])
+        self.assertEqual(len(self.debouncer), 0)
+
+    def test_released_once(self):
+        """Unchanged files should not be released again"""
+        path = self.write("a.avi", "a")
+        self.debouncer.add(path)
+        self.clock.now = 5
+        self.assertEqual(self.debouncer.ready(), [path])
+
+        self.debouncer.add(path)
+        self.clock.now = 10
+        self.assertEqual(self.debouncer.ready(), [])
+
+        self.debouncer.forget(path)
+        self.debouncer.add(path)
+        self.clock.now = 15
+        self.assertEqual(self.debouncer.ready(), [path])
+
+    def test_removed(self):
+        """Files removed before settling should be dropped"""
+        path = self.write("a.avi", "a")
+        self.debouncer.add(path)
+        os.remove(path)
+        self.clock.now = 5
+        self.assertEqual(self.debouncer.ready(), [])
+        self.assertEqual(len(self.debouncer), 0)
+
+
+class WatcherTests(object):
+    """Tests shared by all watchers"""
+
+    def create(self, paths):
+        raise NotImplementedError
+
+    def test_changes(self):
+        """New and changed files should be reported, also in new
+        directories"""
+        existing = self.write("a.avi", "a")
+        watcher = self.create([self.root])
+        try:
+            watcher.changes(0)
+
+            added = self.write("b.avi", "b")
+            nested = self.write("season1/c.avi", "c")
+            self.assertTrue(set([added, nested]) <= self.collect(watcher))
+
+            self.write("a.avi", "changed")
+            self.assertTrue(existing in self.collect(watcher))
+        finally:
+            watcher.close()
+
+    def collect(self, watcher):
+        """Collects the changes until nothing more is reported"""
+        changed = set()
+        while True:
+            changes = watcher.changes(0.05)
+            if not changes:
+                return changed
+            changed.update(changes)
+
+
+class TestPollingWatcher(WatcherTests, WatchTestCase):
+    def create(self, paths):
+        return PollingWatcher(paths)
+
+    def test_initial(self):
+        """The first call should report all existing files"""
+        path = self.write("a.avi")
+        self.assertEqual(PollingWatcher([self.root]).changes(0), set([path]))
+
+
+@unittest.skipIf(watch._libc() is None, "inotify is not available")
+class TestInotifyWatcher(WatcherTests, WatchTestCase):
+    def create(self, paths):
+        return InotifyWatcher(paths)
+
+
+class TestWatch(WatchTestCase):
+    def test_watch(self):
+        """Existing and new files should be handled once each"""
+        first = self.write("a.avi", "a")
+        handled = list()
+        stop = threading.Event()
+
+        def handler(path):
+            handled.append(path)
+            if len(handled) == 2:
+                stop.set()
+            return False
+
+        thread = threading.Thread(target=watch.watch,
+                                  args=([self.root], handler),
+                                  kwargs={"settle": 0, "interval": 0.05,
+                                          "stop": stop})
+        thread.daemon = True
+        thread.start()
+        second = self.write("b.avi", "b")
+        thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(handled), [first, second])
+
+
+    def test_tick(self):
+        """The loop should end once the tick function returns True"""
+        ticks = list()
+        watch.watch([self.root], lambda path: False, settle=0, interval=0,
+                    polling=True, tick=lambda: ticks.append(1) or
+                    len(ticks) == 3)
+        self.assertEqual(len(ticks), 3)
+
+#Run all tests
+if __name__ == "__main__":
+    sys.exit(unittest.main())
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A hand written tokenizer recognizing the most common episode naming
+conventions without using regular expressions:
+
+* ``Show.Name.S01E02``, also with several episodes as in ``S01E02E03`` or
+  ``S01E02-E03``
+* ``Show.Name.1x02``
+
+The show name is everything in front of the episode token.
+"""
+
+__all__ = ['parse']
+
+#Characters separating the tokens of a file name
+_SEPARATORS = "._ "
+
+
+def parse(name):
+    """
+    :param name: The file name to parse
+    :return: A dictionary or None
+
+    Looks for the first episode token in *name*. If one is found, a
+    dictionary with the *show*, *season* and *episode* is returned, where
+    *episode* is the first episode. For files with several episodes, all of
+    them are also available as a tuple under *episodes*.
+
+    Returns None if *name* does not follow any of the known conventions.
+
+    >>> parse("Dexter.S01E02E03.avi")["episodes"]
+    ('02', '03')
+    >>> parse("The_Wire_1x05.mkv")["show"]
+    'The_Wire'
+    """
+    tokens = name
+    for separator in _SEPARATORS[1:]:
+        tokens = tokens.replace(separator, _SEPARATORS[0])
+    tokens = tokens.split(_SEPARATORS[0])
+
+    #Separators are single characters, so offsets in the tokens are the
+    #same as in the name
+    offset = len(tokens[0]) + 1
+    for token in tokens[1:]:
+        episodes = _season_episode(token) or _number_x_number(token)
+        if episodes is not None:
+            show = name[:offset - 1].rstrip(_SEPARATORS + "-")
+            if not show:
+                return None
+
+            fields = {"show": show, "season": episodes[0],
+                      "episode": episodes[1]}
+            if len(episodes) > 2:
+                fields["episodes"] = tuple(episodes[1:])
+            return fields
+
+        offset += len(token) + 1
+
+    return None
+
+
+def _season_episode(token):
+    """Parses tokens like S01E02, S01E02E03 and S01E02-E03"""
+    if len(token) < 4 or token[0] not in "sS":
+        return None
+
+    parts = token[1:].upper().replace("-E", "E").split("E")
+    if len(parts) < 2 or not _number(parts[0], 1, 4):
+        return None
+
+    for part in parts[1:]:
+        if not _number(part, 1, 3):
+            return None
+
+    return parts
+
+
+def _number_x_number(token):
+    """Parses tokens like 1x02"""
+    parts = token.upper().split("X")
+    if len(parts) != 2 or not _number(parts[0], 1, 2) or \
+            not _number(parts[1], 2, 3):
+        return None
+
+    return parts
+
+
+def _number(string, shortest, longest):
+    """Checks that *string* is an ASCII number of the given length"""
+    return shortest <= len(string) <= longest and string.isdigit() and \
+        string.isascii()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for finding the canonical names of shows that are close to a name
+found in a file name.
+
+Names are split into trigrams, the sequences of three characters of each
+word padded with spaces, after lower casing them, spelling out "&" and
+dropping punctuation. The similarity of two names is the number of
+trigrams they share divided by the number of distinct trigrams in both, so
+"Doctor Who" still matches "Doctor Who (2005)" and "Law & Order" matches
+"law and order".
+"""
+
+import heapq
+from collections import Counter
+from itertools import chain
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+
+__all__ = ['TrigramIndex', 'trigrams']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#The version of the layout of saved indexes
+_VERSION = 2
+
+_APOSTROPHES = re.compile(u"['’]")
+_PUNCTUATION = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def trigrams(name):
+    """
+    :param name: A name
+    :return: The set of trigrams of the name
+
+    >>> sorted(trigrams("Who?"))
+    ['  w', ' wh', 'ho ', 'who']
+    """
+    name = _APOSTROPHES.sub("", name.lower().replace("&", " and "))
+    grams = set()
+    for word in _PUNCTUATION.sub(" ", name).split():
+        word = "  " + word + " "
+        grams.update(word[index:index + 3]
+                     for index in range(len(word) - 2))
+    return grams
+
+
+class TrigramIndex(object):
+    """
+    An index of the canonical names of shows.
+
+    :param threshold: The lowest similarity of a candidate, between 0 and 1
+
+    Names are added with :meth:`add` and searched with :meth:`search`. The
+    index can be used from several threads and saved between runs, see
+    :meth:`save` and :meth:`load`.
+    """
+
+    def __init__(self, threshold=0.4):
+        self.threshold = threshold
+        #: True if names were added since the index was loaded or saved
+        self.changed = False
+        self._names = list()
+        self._sizes = list()
+        self._known = set()
+        self._postings = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._known
+
+    def add(self, name):
+        """
+        Adds a name to the index, unless it is already in it.
+
+        :param name: The canonical name of a show
+        """
+        if name in self._known:
+            return
+
+        grams = trigrams(name)
+        with self._lock:
+            if name in self._known or not grams:
+                return
+            number = len(self._names)
+            self._names.append(name)
+            self._sizes.append(len(grams))
+            self._known.add(name)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(number)
+            self.changed = True
+
+    def update(self, names):
+        """Adds each of *names*, see :meth:`add`"""
+        for name in names:
+            self.add(name)
+
+    def search(self, name, limit=5):
+        """
+        :param name: A name, for instance found in a file name
+        :param limit: The largest number of candidates
+        :return: A list of up to *limit* pairs of a canonical name and its
+                 similarity to *name*, the most similar first. Only names
+                 at least as similar as the threshold are included
+        """
+        grams = trigrams(name)
+        if not grams:
+            return []
+
+        #A name at least as similar as the threshold shares at least
+        #*least* trigrams, so it shares one of the rarest trigrams that
+        #remain when the *least* - 1 most common are left out. Only names
+        #sharing one of those are candidates, and they are only checked for
+        #the common trigrams if sharing them could make them similar enough
+        least = max(1, int(math.ceil(self.threshold * len(grams) - 1e-9)))
+        with self._lock:
+            postings = [self._postings.get(gram, ()) for gram in grams]
+            postings.sort(key=len)
+            shared = Counter(chain.from_iterable(
+                postings[:len(postings) - least + 1]))
+
+            common = postings[len(postings) - least + 1:]
+            sizes = self._sizes
+            total = len(grams)
+            threshold = self.threshold
+            scored = list()
+            for number, count in shared.items():
+                size = sizes[number]
+                best = count + len(common)
+                if best > size:
+                    best = size
+                if best < threshold * (total + size - best):
+                    continue
+                for numbers in common:
+                    if number in numbers:
+                        count += 1
+                score = float(count) / (total + size - count)
+                if score >= threshold:
+                    scored.append((score, -number))
+
+            return [(self._names[-number], score) for score, number in
+                    heapq.nlargest(limit, scored)]
+
+    def save(self, path):
+        """
+        Writes the index to *path* as JSON through a temporary file which
+        is then renamed, so readers never see a partially written index.
+        Failures are logged but otherwise ignored.
+
+        :param path: The path of the index file
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        temporary = None
+        try:
+            with self._lock:
+                postings = dict((gram, sorted(numbers)) for gram, numbers
+                                in self._postings.items())
+                data = [_VERSION, self._names, self._sizes, postings]
+                handle, temporary = tempfile.mkstemp(dir=directory)
+                with os.fdopen(handle, "wt") as stream:
+                    json.dump(data, stream)
+                self.changed = False
+            os.replace(temporary, path)
+        except (IOError, OSError) as error:
+            logger.warning("Unable to write index {0}: {1}".format(path,
+                                                                  error))
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+            return
+
+        logger.debug("Stored {0} show names in {1}".format(len(self), path))
+
+    @classmethod
+    def load(cls, path, threshold=0.4):
+        """
+        :param path: The path of an index written by :meth:`save`
+        :param threshold: The lowest similarity of a candidate
+        :return: The index, or an empty index if the file is missing,
+                 unreadable or was written by another version
+
+        The index is plain JSON, so loading it never runs any code.
+        """
+        index = cls(threshold)
+        try:
+            with open(path, "rt") as stream:
+                version, names, sizes, postings = json.load(stream)
+            if version != _VERSION:
+                logger.debug("Index {0} was written by another version".
+                format(path))
+                return index
+            if len(names) != len(sizes):
+                raise ValueError("the names and their sizes differ")
+            postings = dict((gram, set(numbers)) for gram, numbers
+                            in postings.items())
+        except Exception as error:  # pylint: disable=W0703
+            logger.debug("Unable to load index {0}: {1}".format(path, error))
+            return index
+
+        index._names, index._sizes = names, sizes
+        index._known, index._postings = set(names), postings
+        logger.debug("Loaded {0} show names from {1}".format(len(index),
+                                                            path))
+        return index
@@ -20,6 +20,9 @@ A utility module wrapping up those odd bits and pieces that don't fit
 elsewhere and should not be exposed in the public interface of the package.
 """
 
+import threading
+from collections import OrderedDict
+
 
 class Borg(object):
     """
@@ -29,6 +32,67 @@ class Borg(object):
     _state = {}
 
     def __new__(cls, *p, **kwargs):
-        self = object.__new__(cls, *p, **kwargs)
+        self = object.__new__(cls)
         self.__dict__ = cls._state
         return self
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that discards the least recently used entries once it
+    grows beyond *maxsize*. Keeps track of the number of hits and misses to
+    make it possible to tell how well the cache is doing. The cache can be
+    shared between threads.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key: The key to look for
+        :param default: Returned if *key* is not in the cache
+        :return: The cached value or *default*
+
+        Looks up *key* and marks it as the most recently used entry.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Stores *value* under *key*, evicting the oldest entry if needed"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries and resets the statistics"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "<LRUCache hits={0} misses={1} size={2}/{3}>".format(
+            self.hits, self.misses, len(self._data), self.maxsize)
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson, develop@bjornlarsson.net
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A module for watching input directories for new and changed files.
+
+On Linux the directories are watched through inotify, elsewhere, or if
+inotify can not be used, the directories are polled at a fixed interval.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+from unameit.scanner import scan
+
+__all__ = ['InotifyWatcher', 'PollingWatcher', 'Debouncer', 'create_watcher',
+           'watch']
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+#Constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE |
+         IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+_BUFFER_SIZE = 64 * 1024
+
+
+def _libc():
+    """Loads the C library, returns None if inotify is not available"""
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, "inotify_init1"):
+        return None
+
+    return libc
+
+
+class InotifyWatcher(object):
+    """
+    Watches directory trees through inotify.
+
+    :param paths: The directories to watch, including all sub directories
+    :raise OSError: If inotify is not available or a directory can not be
+                    watched, for instance if the watch limit is reached
+    """
+
+    def __init__(self, paths):
+        self._libc = _libc()
+        if self._libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise _error()
+
+        self._paths = list(paths)
+        self._watches = dict()
+
+        try:
+            for path in self._paths:
+                self._add_tree(path)
+        except OSError:
+            self.close()
+            raise
+
+        logger.debug("Watching {0} directories through inotify".
+        format(len(self._watches)))
+
+    def changes(self, timeout):
+        """
+        :param timeout: The number of seconds to wait for changes
+        :return: A set with the paths of files that might have changed
+
+        Waits until at least one event is available or *timeout* seconds
+        have passed.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            data = os.read(self._fd, _BUFFER_SIZE)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        return self._parse(data)
+
+    def close(self):
+        """Stops watching and releases the inotify instance"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _parse(self, data):
+        """Turns a buffer of inotify events into a set of file paths"""
+        changed = set()
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("The inotify queue overflowed, rescanning")
+                for path in self._paths:
+                    changed.update(_files(path))
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+
+            if mask & IN_IGNORED:
+                del self._watches[wd]
+                continue
+
+            if not name:
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    #Files could have been added before the watch was
+                    self._add_tree(path)
+                    changed.update(_files(path))
+            else:
+                changed.add(path)
+
+        return changed
+
+    def _add_tree(self, path):
+        """Adds watches for a directory and all of its sub directories"""
+        for directory, _, _ in os.walk(path):
+            wd = self._libc.inotify_add_watch(self._fd,
+                                              os.fsencode(directory),
+                                              _MASK | IN_ONLYDIR)
+            if wd < 0:
+                error = _error()
+                #The directory might already have been removed again
+                if error.errno == errno.ENOENT:
+                    continue
+                raise error
+
+            self._watches[wd] = directory
+
+
+class PollingWatcher(object):
+    """
+    Watches directory trees by scanning them for changes.
+
+    :param paths: The directories to watch, including all sub directories
+    """
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._snapshot = None
+
+    def changes(self, timeout):
+        """
+        :param timeout: The number of seconds to wait before scanning
+        :return: A set with the paths of files that are new or have changed
+
+        The first call reports all files found.
+        """
+        if self._snapshot is None:
+            self._snapshot = dict()
+        else:
+            time.sleep(timeout)
+
+        snapshot = dict()
+        for path in self._paths:
+            for entry in scan(path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime)
+
+        changed = set(path for path, state in snapshot.items()
+                      if self._snapshot.get(path) != state)
+        self._snapshot = snapshot
+
+        return changed
+
+    def close(self):
+        """Stops watching"""
+        self._snapshot = None
+
+
+class Debouncer(object):
+    """
+    Holds back files until they are no longer written to.
+
+    :param settle: The number of seconds the size and modification time of
+                   a file must stay the same before it is released
+    :param clock: A function returning the current time in seconds
+
+    Files that have already been released are not released again unless
+    they change.
+    """
+
+    def __init__(self, settle, clock=time.time):
+        self._settle = settle
+        self._clock = clock
+        self._pending = dict()
+        self._released = dict()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, path):
+        """
+        :param path: The path of a file that might have changed
+        """
+        state = _state(path)
+        if state is None or self._released.get(path) == state:
+            return
+
+        previous = self._pending.get(path)
+        if previous is None or previous[0] != state:
+            self._pending[path] = (state, self._clock())
+
+    def ready(self):
+        """
+        :return: A sorted list with the paths of all files that have settled
+        """
+        now = self._clock()
+        ready = list()
+
+        for path, (state, since) in list(self._pending.items()):
+            current = _state(path)
+            if current is None:
+                del self._pending[path]
+            elif current != state:
+                self._pending[path] = (current, now)
+            elif now - since >= self._settle:
+                del self._pending[path]
+                self._released[path] = state
+                ready.append(path)
+
+        return sorted(ready)
+
+    def forget(self, path):
+        """
+        :param path: A path that is no longer handled
+
+        Allows a released file to be released again, for instance if it has
+        been renamed away and a new file shows up with the same name.
+        """
+        self._released.pop(path, None)
+
+
+def create_watcher(paths, polling=False):
+    """
+    :param paths: The directories to watch
+    :param polling: If True, never use inotify
+    :return: An :class:`InotifyWatcher` or, if that is not possible, a
+             :class:`PollingWatcher`
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(paths)
+        except OSError as error:
+            logger.info("Unable to use inotify ({0}), polling instead".
+            format(error))
+
+    return PollingWatcher(paths)
+
+
+def watch(paths, handler, settle=5.0, interval=1.0, polling=False,
+          stop=None, tick=None):
+    """
+    :param paths: The directories to watch
+    :param handler: A function called with the path of each settled file,
+                    returning True if the file was handled
+    :param settle: The number of seconds a file must stay unchanged before
+                   it is handled
+    :param interval: The number of seconds between checks
+    :param polling: If True, poll the directories instead of using inotify
+    :param stop: An optional :class:`threading.Event` ending the loop
+    :param tick: An optional function called between checks, the loop ends
+                 if it returns True
+
+    Handles all files already in *paths* and then every file that is added
+    or changed, until *stop* is set or *tick* returns True.
+    """
+    watcher = create_watcher(paths, polling)
+    debouncer = Debouncer(settle)
+
+    #Existing files are not reported by inotify
+    if isinstance(watcher, InotifyWatcher):
+        for path in paths:
+            for name in _files(path):
+                debouncer.add(name)
+
+    try:
+        while stop is None or not stop.is_set():
+            #Wake up in time to release pending files
+            timeout = min(interval, settle) if len(debouncer) else interval
+            for path in watcher.changes(timeout):
+                debouncer.add(path)
+
+            for path in debouncer.ready():
+                if handler(path):
+                    debouncer.forget(path)
+
+            if tick is not None and tick():
+                break
+    finally:
+        watcher.close()
+
+
+def _files(path):
+    """Returns the paths of all files in a directory tree"""
+    return [entry.path for entry in scan(path)]
+
+
+def _state(path):
+    """Returns the size and modification time of a file, or None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+def _error():
+    """Creates an OSError from the current errno"""
+    number = ctypes.get_errno()
+    return OSError(number, os.strerror(number))